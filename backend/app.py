@@ -1,11 +1,48 @@
+# Imported first so it can time every import below and the boot phases (see /api/stats)
+from startup import startup
+
+import json
+import logging
+import math
 import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed, wait
+
 import requests
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 
+from aqi import POLLUTANTS, compute_aqi, get_standard
+from attribution import SourceAttributionIndex
+from cache import (
+    MISSING, SharedSingleFlight, SingleFlight, SQLiteCache, StaleWhileRevalidateCache, TieredCache, TTLCache,
+    normalize_key,
+)
+from fusion import fuse_readings, waqi_concentrations, waqi_observed_at
+from grid import KM_PER_DEGREE, cell_centers, idw_grid
+from health import HealthTipsTable
+from history import HistoryStore
+from http_client import ProviderClient
+from inventory import InventoryStore
+from live import LiveHub
+from logging_config import configure_logging
+from metrics import HTTP_SECONDS, REPORTS_COALESCED, STAGE_SECONDS, registry, span
+from prefetch import PrefetchScheduler, PrefetchTask
+from quota import QuotaStore
+from responses import Body, BodyCache, prepare
+from reverse_geocode import ReverseGeocoder
+
 load_dotenv()
 
+# LOG_FORMAT=json emits one JSON object per line for log shippers
+configure_logging(os.getenv('LOG_LEVEL', 'INFO'), os.getenv('LOG_FORMAT', 'text'))
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 CORS(app)
 
@@ -16,338 +53,420 @@ IQAIR_API_KEY = os.getenv('IQAIR_API_KEY', 'your_iqair_key_here')
 NEWS_API_KEY = os.getenv('NEWS_API_KEY', 'your_newsapi_key_here')
 
 # Configuration
-WEATHER_API_URL = 'https://api.weatherapi.com/v1/current.json'
-OPEN_WEATHER_AQI_URL = 'https://api.openweathermap.org/data/2.5/air_pollution'
-IQAIR_URL = 'https://api.waqi.info/feed'
-NEWS_API_URL = 'https://newsapi.org/v2/everything'
-
-# Sample pollution sources database - can be replaced with actual government data
-POLLUTION_SOURCES = {
-    'default': [
-        {'source': 'Vehicle Emissions', 'percentage': 35, 'impact': 'high'},
-        {'source': 'Industrial Emissions', 'percentage': 25, 'impact': 'high'},
-        {'source': 'Power Plants', 'percentage': 15, 'impact': 'high'},
-        {'source': 'Construction & Dust', 'percentage': 15, 'impact': 'medium'},
-        {'source': 'Biomass Burning', 'percentage': 10, 'impact': 'medium'},
-    ]
+# Provider endpoints; overridable so benchmarks can point them at local stub servers
+WEATHER_API_URL = os.getenv('WEATHER_API_URL', 'https://api.weatherapi.com/v1/current.json')
+OPEN_WEATHER_AQI_URL = os.getenv('OPEN_WEATHER_AQI_URL', 'https://api.openweathermap.org/data/2.5/air_pollution')
+IQAIR_URL = os.getenv('IQAIR_URL', 'https://api.waqi.info/feed')
+NEWS_API_URL = os.getenv('NEWS_API_URL', 'https://newsapi.org/v2/everything')
+NOMINATIM_URL = os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org/search')
+
+# Local state - the SQLite files under CACHE_DIR are shared by all gunicorn workers on the host
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+
+# Upstream request budgets as token buckets that every worker draws from. Defaults follow the
+# free tiers; override with e.g. NEWSAPI_QUOTA_PER_DAY=1000 (0 removes a limit)
+QUOTA_ENABLED = os.getenv('QUOTA_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+quota_store = QuotaStore(os.path.join(CACHE_DIR, 'quota.sqlite3')) if QUOTA_ENABLED else None
+
+# Pooled keep-alive clients, one per provider, each with its own retry policy, circuit breaker and quota
+PROVIDER_CLIENTS = {
+    'weatherapi': ProviderClient('weatherapi', quota_store=quota_store, quotas={'per_day': 30000}),
+    'openweather': ProviderClient('openweather', quota_store=quota_store, quotas={'per_minute': 60, 'per_day': 30000}),
+    'waqi': ProviderClient('waqi', quota_store=quota_store, quotas={'per_second': 1000}),
+    'newsapi': ProviderClient('newsapi', quota_store=quota_store, quotas={'per_day': 100}),
+    # Nominatim's usage policy is 1 request per second, so calls wait briefly for their turn
+    'nominatim': ProviderClient('nominatim', headers={
+        'User-Agent': 'PollutionTracker/1.0 (Educational Project)'
+    }, quota_store=quota_store, quotas={'per_second': 1, 'max_wait': 2.0}),
 }
 
-# City-specific pollution sources data (based on government reports and research)
-CITY_POLLUTION_DATA = {
-    # India - CPCB (Central Pollution Control Board) data
-    'Delhi': {
-        'sources': [
-            {'source': 'Vehicle Emissions', 'percentage': 40, 'impact': 'high'},
-            {'source': 'Industrial Emissions', 'percentage': 20, 'impact': 'high'},
-            {'source': 'Power Plants', 'percentage': 15, 'impact': 'high'},
-            {'source': 'Construction & Dust', 'percentage': 18, 'impact': 'medium'},
-            {'source': 'Biomass Burning', 'percentage': 7, 'impact': 'medium'},
-        ],
-        'country': 'India',
-        'source': 'CPCB National Emission Inventory'
-    },
-    'Mumbai': {
-        'sources': [
-            {'source': 'Vehicle Emissions', 'percentage': 38, 'impact': 'high'},
-            {'source': 'Industrial Emissions', 'percentage': 22, 'impact': 'high'},
-            {'source': 'Power Plants', 'percentage': 16, 'impact': 'high'},
-            {'source': 'Port Activities', 'percentage': 14, 'impact': 'medium'},
-            {'source': 'Construction & Dust', 'percentage': 10, 'impact': 'medium'},
-        ],
-        'country': 'India',
-        'source': 'CPCB & Port Authority Data'
-    },
-    'Bangalore': {
-        'sources': [
-            {'source': 'Vehicle Emissions', 'percentage': 42, 'impact': 'high'},
-            {'source': 'Industrial Emissions', 'percentage': 18, 'impact': 'high'},
-            {'source': 'Power Plants', 'percentage': 12, 'impact': 'high'},
-            {'source': 'Construction & Dust', 'percentage': 20, 'impact': 'medium'},
-            {'source': 'Other Sources', 'percentage': 8, 'impact': 'medium'},
-        ],
-        'country': 'India',
-        'source': 'CPCB Regional Office'
-    },
-    'Kolkata': {
-        'sources': [
-            {'source': 'Vehicle Emissions', 'percentage': 36, 'impact': 'high'},
-            {'source': 'Industrial Emissions', 'percentage': 28, 'impact': 'high'},
-            {'source': 'Power Plants', 'percentage': 18, 'impact': 'high'},
-            {'source': 'Construction & Dust', 'percentage': 12, 'impact': 'medium'},
-            {'source': 'Biomass Burning', 'percentage': 6, 'impact': 'medium'},
-        ],
-        'country': 'India',
-        'source': 'CPCB Regional Office'
-    },
-    'Chennai': {
-        'sources': [
-            {'source': 'Vehicle Emissions', 'percentage': 35, 'impact': 'high'},
-            {'source': 'Industrial Emissions', 'percentage': 25, 'impact': 'high'},
-            {'source': 'Port Activities', 'percentage': 18, 'impact': 'high'},
-            {'source': 'Power Plants', 'percentage': 14, 'impact': 'high'},
-            {'source': 'Construction & Dust', 'percentage': 8, 'impact': 'medium'},
-        ],
-        'country': 'India',
-        'source': 'CPCB & Port Authority Data'
-    },
-    'Bhubaneswar': {
-        'sources': [
-            {'source': 'Vehicle Emissions', 'percentage': 38, 'impact': 'high'},
-            {'source': 'Industrial Emissions', 'percentage': 22, 'impact': 'high'},
-            {'source': 'Power Plants', 'percentage': 18, 'impact': 'high'},
-            {'source': 'Construction & Dust', 'percentage': 16, 'impact': 'medium'},
-            {'source': 'Biomass Burning', 'percentage': 6, 'impact': 'medium'},
-        ],
-        'country': 'India',
-        'source': 'CPCB Regional Office & Odisha Pollution Control Board'
-    },
-    
-    # USA - EPA (Environmental Protection Agency) data
-    'New York': {
-        'sources': [
-            {'source': 'On-Road Vehicles', 'percentage': 28, 'impact': 'high'},
-            {'source': 'Non-Road Equipment', 'percentage': 18, 'impact': 'high'},
-            {'source': 'Industrial Sources', 'percentage': 17, 'impact': 'high'},
-            {'source': 'Power Generation', 'percentage': 16, 'impact': 'high'},
-            {'source': 'Commercial/Residential', 'percentage': 21, 'impact': 'medium'},
-        ],
-        'country': 'United States',
-        'source': 'EPA National Emissions Inventory'
-    },
-    'Los Angeles': {
-        'sources': [
-            {'source': 'On-Road Vehicles', 'percentage': 35, 'impact': 'high'},
-            {'source': 'Industrial Sources', 'percentage': 20, 'impact': 'high'},
-            {'source': 'Non-Road Equipment', 'percentage': 16, 'impact': 'high'},
-            {'source': 'Power Generation', 'percentage': 14, 'impact': 'high'},
-            {'source': 'Commercial/Residential', 'percentage': 15, 'impact': 'medium'},
-        ],
-        'country': 'United States',
-        'source': 'EPA & South Coast AQMD'
-    },
-    'Chicago': {
-        'sources': [
-            {'source': 'On-Road Vehicles', 'percentage': 26, 'impact': 'high'},
-            {'source': 'Power Generation', 'percentage': 22, 'impact': 'high'},
-            {'source': 'Industrial Sources', 'percentage': 19, 'impact': 'high'},
-            {'source': 'Non-Road Equipment', 'percentage': 17, 'impact': 'high'},
-            {'source': 'Other Sources', 'percentage': 16, 'impact': 'medium'},
-        ],
-        'country': 'United States',
-        'source': 'EPA National Emissions Inventory'
-    },
-    'Houston': {
-        'sources': [
-            {'source': 'Oil & Gas Refining', 'percentage': 32, 'impact': 'high'},
-            {'source': 'On-Road Vehicles', 'percentage': 24, 'impact': 'high'},
-            {'source': 'Industrial Sources', 'percentage': 21, 'impact': 'high'},
-            {'source': 'Non-Road Equipment', 'percentage': 14, 'impact': 'high'},
-            {'source': 'Other Sources', 'percentage': 9, 'impact': 'medium'},
-        ],
-        'country': 'United States',
-        'source': 'EPA & Texas TCEQ'
-    },
-    
-    # China - Ministry of Ecology and Environment data
-    'Beijing': {
-        'sources': [
-            {'source': 'Industrial Emissions', 'percentage': 35, 'impact': 'high'},
-            {'source': 'Vehicle Emissions', 'percentage': 28, 'impact': 'high'},
-            {'source': 'Power Plants', 'percentage': 22, 'impact': 'high'},
-            {'source': 'Construction & Dust', 'percentage': 12, 'impact': 'medium'},
-            {'source': 'Other Sources', 'percentage': 3, 'impact': 'low'},
-        ],
-        'country': 'China',
-        'source': 'MEE & Beijing Municipal Bureau'
-    },
-    'Shanghai': {
-        'sources': [
-            {'source': 'Industrial Emissions', 'percentage': 32, 'impact': 'high'},
-            {'source': 'Vehicle Emissions', 'percentage': 30, 'impact': 'high'},
-            {'source': 'Port Activities', 'percentage': 18, 'impact': 'high'},
-            {'source': 'Power Plants', 'percentage': 15, 'impact': 'high'},
-            {'source': 'Construction & Dust', 'percentage': 5, 'impact': 'medium'},
-        ],
-        'country': 'China',
-        'source': 'MEE & Shanghai Municipal Bureau'
-    },
-    'Chongqing': {
-        'sources': [
-            {'source': 'Industrial Emissions', 'percentage': 38, 'impact': 'high'},
-            {'source': 'Vehicle Emissions', 'percentage': 25, 'impact': 'high'},
-            {'source': 'Power Plants', 'percentage': 20, 'impact': 'high'},
-            {'source': 'Construction & Dust', 'percentage': 14, 'impact': 'medium'},
-            {'source': 'Other Sources', 'percentage': 3, 'impact': 'low'},
-        ],
-        'country': 'China',
-        'source': 'MEE & Chongqing Municipal Bureau'
-    },
-    
-    # Europe & Others
-    'London': {
-        'sources': [
-            {'source': 'On-Road Vehicles', 'percentage': 40, 'impact': 'high'},
-            {'source': 'Non-Road Equipment', 'percentage': 20, 'impact': 'high'},
-            {'source': 'Industrial Sources', 'percentage': 15, 'impact': 'high'},
-            {'source': 'Power Generation', 'percentage': 12, 'impact': 'high'},
-            {'source': 'Other Sources', 'percentage': 13, 'impact': 'medium'},
-        ],
-        'country': 'United Kingdom',
-        'source': 'UK Environment Agency'
-    },
-    'Paris': {
-        'sources': [
-            {'source': 'On-Road Vehicles', 'percentage': 38, 'impact': 'high'},
-            {'source': 'Industrial Sources', 'percentage': 18, 'impact': 'high'},
-            {'source': 'Power Generation', 'percentage': 16, 'impact': 'high'},
-            {'source': 'Non-Road Equipment', 'percentage': 15, 'impact': 'high'},
-            {'source': 'Other Sources', 'percentage': 13, 'impact': 'medium'},
-        ],
-        'country': 'France',
-        'source': 'Airparif & ADEME'
-    },
+# Upstream concurrency - provider lookups for a request share one deadline budget
+UPSTREAM_MAX_WORKERS = int(os.getenv('UPSTREAM_MAX_WORKERS', '16'))
+REQUEST_DEADLINE_SECONDS = float(os.getenv('REQUEST_DEADLINE_SECONDS', '12'))
+# How long the primary AQI provider gets before the fallback is hedged in
+AQI_HEDGE_DELAY_SECONDS = float(os.getenv('AQI_HEDGE_DELAY_SECONDS', '1.5'))
+# Opt-in reading fusion (fusion=true on a request, or AQI_FUSION=true for all): WeatherAPI,
+# OpenWeather and WAQI are queried at once and combined, weighted by FUSION_RELIABILITY and
+# halved in weight every FUSION_HALF_LIFE_SECONDS of reading age. A request never waits for
+# more than one reading; the others are fused in once they are cached
+AQI_FUSION = os.getenv('AQI_FUSION', 'false').lower() in ('1', 'true', 'yes')
+FUSION_HALF_LIFE_SECONDS = float(os.getenv('FUSION_HALF_LIFE_SECONDS', '3600'))
+FUSION_RELIABILITY = {
+    provider.strip(): float(weight)
+    for provider, _, weight in (
+        item.partition('=') for item in os.getenv(
+            'FUSION_RELIABILITY', 'weatherapi=1.0,openweather=0.8,waqi=1.2'
+        ).split(',') if '=' in item
+    )
 }
 
-# Country-specific pollution data (fallback if city not found)
-COUNTRY_POLLUTION_DATA = {
-    'India': {
-        'sources': [
-            {'source': 'Vehicle Emissions', 'percentage': 35, 'impact': 'high'},
-            {'source': 'Industrial Emissions', 'percentage': 25, 'impact': 'high'},
-            {'source': 'Power Plants', 'percentage': 15, 'impact': 'high'},
-            {'source': 'Construction & Dust', 'percentage': 15, 'impact': 'medium'},
-            {'source': 'Biomass Burning', 'percentage': 10, 'impact': 'medium'},
-        ]
-    },
-    'United States': {
-        'sources': [
-            {'source': 'Vehicle Emissions', 'percentage': 40, 'impact': 'high'},
-            {'source': 'Power Plants', 'percentage': 20, 'impact': 'high'},
-            {'source': 'Industrial Emissions', 'percentage': 20, 'impact': 'high'},
-            {'source': 'Oil & Gas Production', 'percentage': 12, 'impact': 'high'},
-            {'source': 'Other Sources', 'percentage': 8, 'impact': 'medium'},
-        ]
-    },
-    'China': {
-        'sources': [
-            {'source': 'Industrial Emissions', 'percentage': 40, 'impact': 'high'},
-            {'source': 'Power Plants', 'percentage': 25, 'impact': 'high'},
-            {'source': 'Vehicle Emissions', 'percentage': 20, 'impact': 'high'},
-            {'source': 'Construction & Dust', 'percentage': 10, 'impact': 'medium'},
-            {'source': 'Other Sources', 'percentage': 5, 'impact': 'medium'},
-        ]
-    }
+upstream_executor = ThreadPoolExecutor(max_workers=UPSTREAM_MAX_WORKERS, thread_name_prefix='upstream')
+
+# Batch requests resolve their locations on a separate pool so they cannot starve upstream lookups
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '200'))
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', '8'))
+BATCH_DEADLINE_SECONDS = float(os.getenv('BATCH_DEADLINE_SECONDS', '30'))
+
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix='batch')
+
+# Identical /api/pollution-data requests in flight (same location, standard, fusion and fields)
+# share one report. REPORT_COALESCING_SHARED=true also shares it between the workers on the
+# host, through a lock file and a SQLite table under CACHE_DIR (POSIX only)
+REPORT_COALESCING = os.getenv('REPORT_COALESCING', 'true').lower() in ('1', 'true', 'yes')
+REPORT_COALESCING_SHARED = os.getenv('REPORT_COALESCING_SHARED', 'false').lower() in ('1', 'true', 'yes')
+# How long a worker waits for another worker's identical report before building its own
+REPORT_COALESCING_WAIT_SECONDS = float(os.getenv('REPORT_COALESCING_WAIT_SECONDS', str(REQUEST_DEADLINE_SECONDS)))
+
+report_flights = SingleFlight()
+shared_report_flights = None
+if REPORT_COALESCING and REPORT_COALESCING_SHARED:
+    try:
+        shared_report_flights = SharedSingleFlight(
+            os.path.join(CACHE_DIR, 'report_flights.lock'),
+            SQLiteCache(os.path.join(CACHE_DIR, 'report_flights.sqlite3'), table='report_flights'),
+            wait_seconds=REPORT_COALESCING_WAIT_SECONDS,
+        )
+    except RuntimeError as e:
+        logger.warning("Reports are only coalesced within each worker", extra={'error': str(e)})
+
+# Local caches, in memory and in SQLite files under CACHE_DIR
+GEOCODE_CACHE_SIZE = int(os.getenv('GEOCODE_CACHE_SIZE', '4096'))
+GEOCODE_CACHE_TTL_SECONDS = int(os.getenv('GEOCODE_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+# Unresolved names are cached for less time in case Nominatim learns them
+GEOCODE_NEGATIVE_TTL_SECONDS = int(os.getenv('GEOCODE_NEGATIVE_TTL_SECONDS', str(24 * 3600)))
+
+with startup.phase('geocode_cache'):
+    geocode_cache = TieredCache(
+        TTLCache(maxsize=GEOCODE_CACHE_SIZE, ttl=GEOCODE_CACHE_TTL_SECONDS),
+        SQLiteCache(os.path.join(CACHE_DIR, 'geocode.sqlite3'), table='geocode'),
+    )
+
+# Standard readings are scored on unless a request asks for another:
+# us_epa, india_naqi, china or eu_caqi
+AQI_STANDARD = get_standard(os.getenv('AQI_STANDARD', 'us_epa')).name
+
+# AQI readings are cached per grid cell; nearby lookups within a cell share a reading
+AQI_GRID_DEGREES = float(os.getenv('AQI_GRID_DEGREES', '0.01'))
+AQI_CACHE_SIZE = int(os.getenv('AQI_CACHE_SIZE', '20000'))
+# Freshness follows each provider's update cadence: WeatherAPI ~15 min, OpenWeather ~30 min
+AQI_CACHE_TTL_SECONDS = {
+    'weatherapi': int(os.getenv('WEATHER_API_CACHE_TTL_SECONDS', '900')),
+    'openweather': int(os.getenv('OPEN_WEATHER_CACHE_TTL_SECONDS', '1800')),
+    'waqi': int(os.getenv('WAQI_CACHE_TTL_SECONDS', '1800')),
 }
+# Past its TTL a reading is still served for this long while it is refreshed in the background
+AQI_CACHE_STALE_SECONDS = int(os.getenv('AQI_CACHE_STALE_SECONDS', '1800'))
+
+# Readings are also written to aqi.sqlite3 under CACHE_DIR, so one worker's fetch (or the
+# prefetching worker's refresh) is served by every worker on the host
+aqi_cache = StaleWhileRevalidateCache(
+    maxsize=AQI_CACHE_SIZE,
+    ttl=AQI_CACHE_TTL_SECONDS['weatherapi'],
+    stale_ttl=AQI_CACHE_STALE_SECONDS,
+    executor=upstream_executor,
+    shared=SQLiteCache(os.path.join(CACHE_DIR, 'aqi.sqlite3'), table='aqi'),
+)
+
+# Every upstream AQI reading is appended to a local time series served by /api/pollution-history
+HISTORY_ENABLED = os.getenv('HISTORY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+with startup.phase('history'):
+    history = HistoryStore(
+        os.path.join(CACHE_DIR, 'history.sqlite3'),
+        flush_interval=float(os.getenv('HISTORY_FLUSH_SECONDS', '2')),
+        raw_retention_days=int(os.getenv('HISTORY_RAW_RETENTION_DAYS', '7')),
+        hourly_retention_days=int(os.getenv('HISTORY_HOURLY_RETENTION_DAYS', '90')),
+        daily_retention_days=int(os.getenv('HISTORY_DAILY_RETENTION_DAYS', '1825')),
+    )
+
+# News is cached per city so it does not dominate endpoint latency
+# Articles are kept only if the title or description mentions one of these keywords
+NEWS_KEYWORDS = [k.strip() for k in os.getenv('NEWS_KEYWORDS', 'pollution').split(',') if k.strip()]
+NEWS_KEYWORD_PATTERN = re.compile('|'.join(re.escape(keyword) for keyword in NEWS_KEYWORDS), re.IGNORECASE)
+# The news queries for one lookup run on their own small pool; lookups already occupy upstream workers
+NEWS_MAX_WORKERS = int(os.getenv('NEWS_MAX_WORKERS', '6'))
+NEWS_CACHE_SIZE = int(os.getenv('NEWS_CACHE_SIZE', '2048'))
+NEWS_CACHE_TTL_SECONDS = int(os.getenv('NEWS_CACHE_TTL_SECONDS', '1800'))
+NEWS_CACHE_STALE_SECONDS = int(os.getenv('NEWS_CACHE_STALE_SECONDS', '3600'))
+
+news_cache = StaleWhileRevalidateCache(
+    maxsize=NEWS_CACHE_SIZE,
+    ttl=NEWS_CACHE_TTL_SECONDS,
+    stale_ttl=NEWS_CACHE_STALE_SECONDS,
+    executor=upstream_executor,
+    shared=SQLiteCache(os.path.join(CACHE_DIR, 'news.sqlite3'), table='news'),
+)
+news_executor = ThreadPoolExecutor(max_workers=NEWS_MAX_WORKERS, thread_name_prefix='news')
+
+# Live AQI pushes to /api/pollution-stream: each subscribed grid cell is read once per
+# interval (through the AQI cache) and changes are fanned out to all its subscribers
+LIVE_POLL_SECONDS = float(os.getenv('LIVE_POLL_SECONDS', '60'))
+LIVE_KEEPALIVE_SECONDS = float(os.getenv('LIVE_KEEPALIVE_SECONDS', '15'))
+LIVE_MAX_LOCATIONS = int(os.getenv('LIVE_MAX_LOCATIONS', '10'))
+LIVE_QUEUE_SIZE = 100
+# Each open stream holds one of the worker's threads (GUNICORN_THREADS), so a worker takes at most
+# this many and keeps the rest for the API; further streams get 503 and the client retries
+LIVE_MAX_STREAMS = int(os.getenv('LIVE_MAX_STREAMS', '4'))
+live_streams_lock = threading.Lock()
+live_streams_open = 0
+
+# Interpolated AQI grids for map heatmaps (/api/pollution-grid): readings from the AQI cache and
+# the history store no older than GRID_MAX_AGE_SECONDS are spread over the cells within
+# GRID_RADIUS_KM by inverse-distance weighting
+GRID_DEFAULT_SIZE = int(os.getenv('GRID_DEFAULT_SIZE', '100'))
+GRID_MAX_SIZE = int(os.getenv('GRID_MAX_SIZE', '500'))
+GRID_RADIUS_KM = float(os.getenv('GRID_RADIUS_KM', '50'))
+GRID_MAX_RADIUS_KM = 500
+GRID_MAX_AGE_SECONDS = int(os.getenv('GRID_MAX_AGE_SECONDS', str(3 * 3600)))
+GRID_IDW_POWER = float(os.getenv('GRID_IDW_POWER', '2'))
+
+# Background refresh of hot locations; the interval should stay under the AQI TTLs
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+PREFETCH_INTERVAL_SECONDS = float(os.getenv('PREFETCH_INTERVAL_SECONDS', '600'))
+# Minimum gap between two refreshes (Nominatim allows 1 request per second)
+PREFETCH_MIN_SPACING_SECONDS = float(os.getenv('PREFETCH_MIN_SPACING_SECONDS', '1.0'))
+# News is refreshed on its own, much slower cycle: NewsAPI allows 100 requests a day and a
+# refresh costs up to 3. Prefetching stops while less than this share of its quota is left
+PREFETCH_NEWS_INTERVAL_SECONDS = float(os.getenv('PREFETCH_NEWS_INTERVAL_SECONDS', str(6 * 3600)))
+PREFETCH_NEWS_RESERVE = float(os.getenv('PREFETCH_NEWS_RESERVE', '0.5'))
+PREFETCH_MAX_OBSERVED = int(os.getenv('PREFETCH_MAX_OBSERVED', '50'))
+
+# HTTP response caching: JSON bodies from COMPRESS_MIN_BYTES up are sent gzip (or br) encoded
+# when the client accepts it, and GET responses carry ETags so repeat requests get a 304
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+# Cache-Control max-age for responses that only change when the inventory is edited
+STATIC_MAX_AGE_SECONDS = int(os.getenv('STATIC_MAX_AGE_SECONDS', '3600'))
+# Upper bound on a report's max-age, which is what is left of its AQI reading's cache TTL
+POLLUTION_DATA_MAX_AGE_SECONDS = int(os.getenv('POLLUTION_DATA_MAX_AGE_SECONDS', '300'))
+static_bodies = BodyCache()
+
+# Emissions inventory (default, country and city source breakdowns based on government
+# reports and research). Edit data/inventory.json; it is compiled to a memory-mapped file
+# under CACHE_DIR that all workers share, and reloaded without a restart when it changes.
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+INVENTORY_FILE = os.getenv('INVENTORY_FILE', os.path.join(DATA_DIR, 'inventory.json'))
+INVENTORY_RELOAD_SECONDS = float(os.getenv('INVENTORY_RELOAD_SECONDS', '5'))
+
+with startup.phase('inventory'):
+    inventory = InventoryStore(
+        INVENTORY_FILE,
+        os.path.join(CACHE_DIR, 'inventory.bin'),
+        check_interval=INVENTORY_RELOAD_SECONDS,
+    )
+
+# Read-only name -> record mappings over the inventory
+POLLUTION_SOURCES = inventory.defaults
+CITY_POLLUTION_DATA = inventory.cities
+COUNTRY_POLLUTION_DATA = inventory.countries
+
+# Lookup index from request names, aliases and geocoded coordinates to the cities and countries above
+PLACES_FILE = os.getenv('PLACES_FILE', os.path.join(DATA_DIR, 'places.json'))
+SOURCE_MATCH_RADIUS_KM = float(os.getenv('SOURCE_MATCH_RADIUS_KM', '50'))
+
+
+SOURCE_MATCHES = registry.counter(
+    'pollution_source_matches', 'Reports by the level of source data used', ('level',)
+)
+
+
+def build_source_index():
+    """(Re)build the attribution index for the cities and countries currently in the inventory"""
+    global source_index
+    source_index = SourceAttributionIndex.from_file(
+        PLACES_FILE,
+        known_cities=set(CITY_POLLUTION_DATA),
+        known_countries=set(COUNTRY_POLLUTION_DATA),
+        radius_km=SOURCE_MATCH_RADIUS_KM,
+    )
+
+
+with startup.phase('source_index'):
+    build_source_index()
+inventory.on_reload(build_source_index)
+inventory.on_reload(static_bodies.clear)
+
+# Offline reverse geocoding for coordinate requests: city points and country outlines bundled in
+# REGIONS_FILE. A point within REVERSE_GEOCODE_RADIUS_KM of a city takes that city's name
+REGIONS_FILE = os.getenv('REGIONS_FILE', os.path.join(DATA_DIR, 'regions.json'))
+REVERSE_GEOCODE_RADIUS_KM = float(os.getenv('REVERSE_GEOCODE_RADIUS_KM', '50'))
+with startup.phase('reverse_geocoder'):
+    reverse_geocoder = ReverseGeocoder.from_file(REGIONS_FILE, radius_km=REVERSE_GEOCODE_RADIUS_KM)
+
+# Health advice per AQI level, locale and dominant pollutant. Other standards' category labels
+# map onto the US EPA levels the tips are written for
+HEALTH_TIPS_FILE = os.getenv('HEALTH_TIPS_FILE', os.path.join(DATA_DIR, 'health_tips.json'))
+with startup.phase('health_tips'):
+    health_tips = HealthTipsTable.from_file(HEALTH_TIPS_FILE)
+
+
+def score_reading(reading, standard=None):
+    """AQI reading for pollutant concentrations in µg/m³, scored on the given (or default) AQI standard"""
+    scored = compute_aqi(reading, standard or AQI_STANDARD)
+    return {
+        'aqi': scored['aqi'] or 0,
+        **{pollutant: reading.get(pollutant) for pollutant in POLLUTANTS},
+        'dominant_pollutant': scored['dominant_pollutant'],
+        'sub_indices': scored['sub_indices'],
+        'aqi_standard': scored['standard'],
+    }
+
+
+def weather_api_params(query):
+    """WeatherAPI query parameters for a location name or "lat,lon" string"""
+    return {
+        'key': WEATHER_API_KEY,
+        'q': query,
+        'aqi': 'yes'
+    }
+
+
+def observed(reading, observed_at):
+    """Add the provider's own measurement time (epoch seconds), when it gave one, to a reading"""
+    if isinstance(observed_at, (int, float)):
+        reading['observed_at'] = int(observed_at)
+    return reading
+
+
+def parse_weather_api_aqi(data):
+    """Extract an AQI reading from a WeatherAPI current.json response"""
+    if 'current' in data and 'air_quality' in data['current']:
+        air_quality = data['current']['air_quality']
+        return observed(score_reading({
+            'pm25': air_quality.get('pm2_5'),
+            'pm10': air_quality.get('pm10'),
+            'o3': air_quality.get('o3'),
+            'no2': air_quality.get('no2'),
+            'so2': air_quality.get('so2'),
+            'co': air_quality.get('co'),
+        }), data['current'].get('last_updated_epoch'))
+    
+    return None
 
 
 def get_aqi_from_weather_api(location):
     """Fetch AQI data from WeatherAPI"""
     try:
-        params = {
-            'key': WEATHER_API_KEY,
-            'q': location,
-            'aqi': 'yes'
-        }
-        response = requests.get(WEATHER_API_URL, params=params, timeout=10)
+        response = PROVIDER_CLIENTS['weatherapi'].get(WEATHER_API_URL, params=weather_api_params(location))
         response.raise_for_status()
-        data = response.json()
-        
-        if 'current' in data and 'air_quality' in data['current']:
-            air_quality = data['current']['air_quality']
-            # Calculate AQI from PM2.5 using standard EPA formula
-            # AQI = (PM2.5 - 0) / (35.5 - 0) * (100 - 0) + 0 for Good category (0-50)
-            pm25 = air_quality.get('pm2_5', 0)
-            aqi = pm25 * 2.5 if pm25 < 35.5 else (pm25 - 35.5) * 5 / 42 + 100 if pm25 < 60 else pm25
-            
-            return {
-                'aqi': int(aqi),
-                'pm25': air_quality.get('pm2_5', 0),
-                'pm10': air_quality.get('pm10', 0),
-                'o3': air_quality.get('o3', 0),
-                'no2': air_quality.get('no2', 0),
-                'so2': air_quality.get('so2', 0),
-                'co': air_quality.get('co', 0),
-            }
+        return parse_weather_api_aqi(response.json())
     except requests.RequestException as e:
-        print(f"Error fetching from WeatherAPI: {e}")
+        logger.warning("WeatherAPI lookup failed", extra={'provider': 'weatherapi', 'location': location, 'error': str(e)})
     
     return None
 
 
+def snap_to_grid(lat, lon):
+    """Snap coordinates to the centre of their AQI cache cell"""
+    step = AQI_GRID_DEGREES
+    return round(round(lat / step) * step, 6), round(round(lon / step) * step, 6)
+
+
+def cached_aqi_reading(provider, lat, lon, fetch, refresh=False):
+    """Serve a provider's AQI reading from the grid-cell cache, fetching upstream on a miss
+
+    With refresh=True the reading is always fetched upstream and the cache updated.
+    """
+    key = (provider,) + snap_to_grid(lat, lon)
+    lookup = aqi_cache.refresh if refresh else aqi_cache.get_or_fetch
+    aqi_data = lookup(
+        key, lambda: record_reading(provider, lat, lon, fetch(lat, lon)), ttl=AQI_CACHE_TTL_SECONDS[provider]
+    )
+    return dict(aqi_data) if aqi_data else None
+
+
+def record_reading(provider, lat, lon, aqi_data):
+    """Queue a freshly fetched reading for the history store and pass it through"""
+    if aqi_data and HISTORY_ENABLED:
+        history.append(provider, *snap_to_grid(lat, lon), aqi_data)
+    return aqi_data
+
+
 def get_aqi_from_weather_api_coords(lat, lon):
+    """Fetch AQI data from WeatherAPI using coordinates, cached per grid cell"""
+    return cached_aqi_reading('weatherapi', lat, lon, fetch_aqi_from_weather_api_coords)
+
+
+def get_aqi_from_openweather(lat, lon):
+    """Fallback AQI data from OpenWeatherMap, cached per grid cell"""
+    return cached_aqi_reading('openweather', lat, lon, fetch_aqi_from_openweather)
+
+
+def fetch_aqi_from_weather_api_coords(lat, lon):
     """Fetch AQI data from WeatherAPI using coordinates"""
     try:
-        params = {
-            'key': WEATHER_API_KEY,
-            'q': f"{lat},{lon}",
-            'aqi': 'yes'
-        }
-        response = requests.get(WEATHER_API_URL, params=params, timeout=10)
+        response = PROVIDER_CLIENTS['weatherapi'].get(WEATHER_API_URL, params=weather_api_params(f"{lat},{lon}"))
         response.raise_for_status()
-        data = response.json()
-        
-        if 'current' in data and 'air_quality' in data['current']:
-            air_quality = data['current']['air_quality']
-            pm25 = air_quality.get('pm2_5', 0)
-            aqi = pm25 * 2.5 if pm25 < 35.5 else (pm25 - 35.5) * 5 / 42 + 100 if pm25 < 60 else pm25
-            
-            return {
-                'aqi': int(aqi),
-                'pm25': air_quality.get('pm2_5', 0),
-                'pm10': air_quality.get('pm10', 0),
-                'o3': air_quality.get('o3', 0),
-                'no2': air_quality.get('no2', 0),
-                'so2': air_quality.get('so2', 0),
-                'co': air_quality.get('co', 0),
-            }
+        return parse_weather_api_aqi(response.json())
     except requests.RequestException as e:
-        print(f"Error fetching from WeatherAPI with coords: {e}")
+        logger.warning("WeatherAPI lookup failed", extra={'provider': 'weatherapi', 'lat': lat, 'lon': lon, 'error': str(e)})
     
     return None
 
 
-def get_aqi_from_openweather(lat, lon):
+def openweather_params(lat, lon):
+    """OpenWeatherMap air pollution query parameters"""
+    return {
+        'lat': lat,
+        'lon': lon,
+        'appid': OPEN_WEATHER_API_KEY
+    }
+
+
+def parse_openweather_aqi(data):
+    """Extract an AQI reading from an OpenWeatherMap air_pollution response"""
+    if 'list' in data and len(data['list']) > 0:
+        components = data['list'][0]['components']
+        return observed(score_reading({
+            'pm25': components.get('pm2_5'),
+            'pm10': components.get('pm10'),
+            'o3': components.get('o3'),
+            'no2': components.get('no2'),
+            'so2': components.get('so2'),
+            'co': components.get('co'),
+        }), data['list'][0].get('dt'))
+    
+    return None
+
+
+def fetch_aqi_from_openweather(lat, lon):
     """Fallback AQI data from OpenWeatherMap"""
     try:
-        params = {
-            'lat': lat,
-            'lon': lon,
-            'appid': OPEN_WEATHER_API_KEY
-        }
-        response = requests.get(OPEN_WEATHER_AQI_URL, params=params, timeout=10)
+        response = PROVIDER_CLIENTS['openweather'].get(OPEN_WEATHER_AQI_URL, params=openweather_params(lat, lon))
         response.raise_for_status()
-        data = response.json()
-        
-        if 'list' in data and len(data['list']) > 0:
-            components = data['list'][0]['components']
-            pm25 = components.get('pm2_5', 0)
-            # Convert EPA index (1-5) to AQI (0-500+)
-            # EPA: 1=Good, 2=Fair, 3=Moderate, 4=Poor, 5=Very Poor
-            epa_index = data['list'][0].get('main', {}).get('aqi', 3)
-            
-            # Better conversion: calculate from PM2.5
-            if pm25 < 12.1:
-                aqi = pm25 * 50 / 12
-            elif pm25 < 35.5:
-                aqi = 50 + (pm25 - 12.1) * 50 / 23.4
-            elif pm25 < 55.5:
-                aqi = 100 + (pm25 - 35.5) * 50 / 20
-            elif pm25 < 150.5:
-                aqi = 150 + (pm25 - 55.5) * 50 / 95
-            else:
-                aqi = 200 + (pm25 - 150.5)
-            
-            return {
-                'aqi': int(aqi),
-                'pm25': pm25,
-                'pm10': components.get('pm10', 0),
-                'o3': components.get('o3', 0),
-                'no2': components.get('no2', 0),
-                'so2': components.get('so2', 0),
-                'co': components.get('co', 0),
-            }
+        return parse_openweather_aqi(response.json())
+    except requests.RequestException as e:
+        logger.warning("OpenWeather lookup failed", extra={'provider': 'openweather', 'lat': lat, 'lon': lon, 'error': str(e)})
+    
+    return None
+
+
+def get_aqi_from_waqi(lat, lon):
+    """AQI data from the nearest WAQI station, cached per grid cell (used by reading fusion)"""
+    return cached_aqi_reading('waqi', lat, lon, fetch_aqi_from_waqi)
+
+
+def waqi_geo_url(lat, lon):
+    """WAQI feed URL for the station nearest a coordinate"""
+    return f"{IQAIR_URL}/geo:{lat};{lon}/"
+
+
+def parse_waqi_aqi(data):
+    """Extract an AQI reading from a WAQI feed response, converting its sub-indices to µg/m³"""
+    if data.get('status') == 'ok' and isinstance(data.get('data'), dict):
+        concentrations = waqi_concentrations(data['data'].get('iaqi') or {})
+        if concentrations:
+            return observed(score_reading(concentrations), waqi_observed_at(data['data'].get('time')))
+    
+    return None
+
+
+def fetch_aqi_from_waqi(lat, lon):
+    """Fetch AQI data from the nearest WAQI station"""
+    try:
+        response = PROVIDER_CLIENTS['waqi'].get(waqi_geo_url(lat, lon), params={'token': IQAIR_API_KEY})
+        response.raise_for_status()
+        return parse_waqi_aqi(response.json())
     except requests.RequestException as e:
-        print(f"Error fetching from OpenWeather: {e}")
+        logger.warning("WAQI lookup failed", extra={'provider': 'waqi', 'lat': lat, 'lon': lon, 'error': str(e)})
     
     return None
 
@@ -362,7 +481,7 @@ def get_pollution_sources_from_iqair(city, country):
         }
         # Remove spaces for URL encoding
         url = f"{IQAIR_URL}/{query.replace(' ', '%20')}/"
-        response = requests.get(url, params=params, timeout=10)
+        response = PROVIDER_CLIENTS['waqi'].get(url, params=params)
         response.raise_for_status()
         data = response.json()
         
@@ -370,10 +489,10 @@ def get_pollution_sources_from_iqair(city, country):
             station_data = data['data']
             # WAQI provides attribution and city info
             # We'll use standard source breakdown for the country
-            print(f"IQAir/WAQI data found for {query}")
+            logger.debug("WAQI station data found", extra={'provider': 'waqi', 'query': query})
             return station_data.get('iaqi', {})
     except Exception as e:
-        print(f"Error fetching from IQAir/WAQI: {e}")
+        logger.warning("WAQI lookup failed", extra={'provider': 'waqi', 'error': str(e)})
     
     return None
 
@@ -383,135 +502,164 @@ def get_pollution_sources_for_country(country):
     return COUNTRY_POLLUTION_DATA.get(country, POLLUTION_SOURCES['default'])
 
 
-def get_aqi_level(aqi_value):
+def get_aqi_level(aqi_value, standard=None):
     """Convert AQI value to level description"""
-    if aqi_value <= 50:
-        return 'Good'
-    elif aqi_value <= 100:
-        return 'Moderate'
-    elif aqi_value <= 150:
-        return 'Unhealthy for Sensitive Groups'
-    elif aqi_value <= 200:
-        return 'Unhealthy'
-    elif aqi_value <= 300:
-        return 'Very Unhealthy'
-    else:
-        return 'Hazardous'
+    return get_standard(standard or AQI_STANDARD).category(aqi_value)
+
 
+def get_pollution_news(city, country=None, limit=5, refresh=False):
+    """Pollution news for a city, served from the per-city news cache"""
+    key = (normalize_key(city), country, limit)
+    lookup = news_cache.refresh if refresh else news_cache.get_or_fetch
+    return list(lookup(key, lambda: fetch_pollution_news(city, country, limit)) or [])
 
-def get_pollution_news(city, country=None, limit=5):
-    """Fetch recent news for ANY city - only return if it contains 'pollution' keyword"""
+
+def news_search_queries(city, country=None):
+    """NewsAPI search queries for a city, most specific first"""
+    # Search for news for any city
+    search_queries = [
+        f'"{city}" (air quality OR pollution OR emissions OR AQI)',
+        f'{city} pollution',
+    ]
     
-    try:
-        # Search for news for any city
-        search_queries = [
-            f'"{city}" (air quality OR pollution OR emissions OR AQI)',
-            f'{city} pollution',
-        ]
-        
-        if country:
-            search_queries.append(f'"{city}" {country} pollution')
+    if country:
+        search_queries.append(f'"{city}" {country} pollution')
+    
+    return search_queries
+
+
+def news_query_params(query, limit):
+    """NewsAPI /everything parameters for one query"""
+    return {
+        'q': query,
+        'apiKey': NEWS_API_KEY,
+        'sortBy': 'publishedAt',
+        'language': 'en',
+        'pageSize': limit * 3,
+    }
+
+
+def parse_news_articles(data):
+    """Raw articles from a NewsAPI response"""
+    if data.get('status') == 'ok':
+        return data.get('articles') or []
+    return []
+
+
+def collect_news_articles(articles, news_items, seen_urls, limit):
+    """Add keyword-matching, not yet seen articles to news_items; returns True once limit is reached"""
+    for article in articles:
+        url = article.get('url') or ''
+        if url in seen_urls:
+            continue
         
-        news_items = []
+        content = f"{article.get('title') or ''} {article.get('description') or ''}"
+        if not NEWS_KEYWORD_PATTERN.search(content):
+            continue
         
-        for query in search_queries:
-            if len(news_items) >= limit:
-                break
-                
+        seen_urls.add(url)
+        news_items.append({
+            'title': article.get('title', ''),
+            'description': article.get('description', ''),
+            'url': url,
+            'image': article.get('urlToImage', ''),
+            'source': (article.get('source') or {}).get('name', ''),
+            'published_at': article.get('publishedAt', ''),
+        })
+        if len(news_items) >= limit:
+            return True
+    return False
+
+
+def fetch_news_articles(query, limit):
+    """Run one NewsAPI query and return its raw articles"""
+    with span('news_query'):
+        response = PROVIDER_CLIENTS['newsapi'].get(NEWS_API_URL, params=news_query_params(query, limit))
+        response.raise_for_status()
+        return parse_news_articles(response.json())
+
+
+def fetch_pollution_news(city, country=None, limit=5):
+    """Fetch recent news for ANY city - only return articles matching the news keywords
+
+    The search queries run concurrently and collection stops as soon as `limit`
+    matching articles are found. Returns None if every query failed, so the
+    failure is not cached.
+    """
+    search_queries = news_search_queries(city, country)
+    futures = {news_executor.submit(fetch_news_articles, query, limit): query for query in search_queries}
+    news_items = []
+    seen_urls = set()
+    failed = 0
+    
+    try:
+        for future in as_completed(futures):
             try:
-                params = {
-                    'q': query,
-                    'apiKey': NEWS_API_KEY,
-                    'sortBy': 'publishedAt',
-                    'language': 'en',
-                    'pageSize': limit * 3,
-                }
-                
-                response = requests.get(NEWS_API_URL, params=params, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get('status') == 'ok' and 'articles' in data:
-                    articles = data['articles']
-                    
-                    for article in articles:
-                        if len(news_items) >= limit:
-                            break
-                        
-                        title = article.get('title', '').lower()
-                        description = article.get('description', '').lower()
-                        content = f"{title} {description}"
-                        
-                        # SIMPLE CHECK: Only include if "pollution" keyword is present
-                        if 'pollution' in content:
-                            # Avoid duplicates
-                            url_exists = any(item['url'] == article.get('url', '') for item in news_items)
-                            
-                            if not url_exists:
-                                news_items.append({
-                                    'title': article.get('title', ''),
-                                    'description': article.get('description', ''),
-                                    'url': article.get('url', ''),
-                                    'image': article.get('urlToImage', ''),
-                                    'source': article.get('source', {}).get('name', ''),
-                                    'published_at': article.get('publishedAt', ''),
-                                })
+                articles = future.result()
             except Exception as e:
-                print(f"Error with query '{query}': {e}")
+                failed += 1
+                logger.warning("News query failed", extra={'provider': 'newsapi', 'query': futures[future], 'error': str(e)})
                 continue
-        
-        if news_items:
-            print(f"Found {len(news_items)} articles with 'pollution' keyword for {city}")
-            return news_items[:limit]
-        else:
-            print(f"No articles containing 'pollution' found for {city}")
-            return []
             
-    except Exception as e:
-        print(f"Error fetching news for {city}: {e}")
+            if collect_news_articles(articles, news_items, seen_urls, limit):
+                logger.debug("News limit reached", extra={'city': city, 'articles': limit})
+                return news_items
+    finally:
+        # Drop queries that have not started yet once we have enough (or are done)
+        for future in futures:
+            future.cancel()
     
-    return []
+    if failed == len(search_queries):
+        return None
+    
+    if news_items:
+        logger.debug("News collected", extra={'city': city, 'articles': len(news_items)})
+    else:
+        logger.info("No articles matching news keywords", extra={'city': city})
+    return news_items
 
 
+def nominatim_params(location):
+    """Nominatim search parameters for a location"""
+    # Try with limit=1 to get the most relevant result
+    return {'q': location, 'format': 'json', 'limit': 1, 'addressdetails': 1}
 
-def get_country_from_location(location):
-    """Try to determine country from location using geocoding"""
-    try:
-        geo_url = 'https://nominatim.openstreetmap.org/search'
-        headers = {
-            'User-Agent': 'PollutionTracker/1.0 (Educational Project)'
-        }
-        # Try with limit=1 to get the most relevant result
-        params = {'q': location, 'format': 'json', 'limit': 1, 'addressdetails': 1}
-        response = requests.get(geo_url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        if response.json():
-            results = response.json()
-            # Get the first result (most relevant)
-            data = results[0]
-            address = data.get('address', {})
-            country = address.get('country', '')
-            state = address.get('state', '')
-            city = address.get('city', '') or address.get('town', '') or address.get('village', '')
-            display_name = data.get('display_name', location)  # Full address
-            lat = float(data.get('lat', 0))
-            lon = float(data.get('lon', 0))
-            
-            location_data = {
-                'country': country,
-                'state': state,
-                'city': city,
-                'address': display_name,
-                'lat': lat,
-                'lon': lon
-            }
-            
-            print(f"Geocoded '{location}' to ({lat}, {lon}) in {country}, state: {state}")
-            return location_data
-    except Exception as e:
-        print(f"Error getting country from location: {e}")
+
+def parse_geocode_results(results, location):
+    """Location details from Nominatim search results, or None when nothing matched"""
+    if not results:
+        return None
+    
+    # Get the first result (most relevant)
+    data = results[0]
+    address = data.get('address', {})
+    country = address.get('country', '')
+    state = address.get('state', '')
+    city = address.get('city', '') or address.get('town', '') or address.get('village', '')
+    display_name = data.get('display_name', location)  # Full address
+    lat = float(data.get('lat', 0))
+    lon = float(data.get('lon', 0))
     
+    logger.info("Geocoded location", extra={'location': location, 'lat': lat, 'lon': lon, 'country': country, 'state': state})
+    return {
+        'country': country,
+        'state': state,
+        'city': city,
+        'address': display_name,
+        'lat': lat,
+        'lon': lon
+    }
+
+
+def geocode_location(location):
+    """Look up a location on Nominatim; returns None when nothing matches, raises on request failure"""
+    response = PROVIDER_CLIENTS['nominatim'].get(NOMINATIM_URL, params=nominatim_params(location))
+    response.raise_for_status()
+    return parse_geocode_results(response.json(), location)
+
+
+def unresolved_location(location):
+    """Location details for a place we could not geocode"""
     return {
         'country': None,
         'state': None,
@@ -522,137 +670,1078 @@ def get_country_from_location(location):
     }
 
 
-@app.route('/api/pollution-data', methods=['GET'])
-def get_pollution_data():
-    """Main endpoint to get pollution data for a location"""
-    location = request.args.get('location', '')
+def get_country_from_location(location):
+    """Try to determine country from location using geocoding, served from the geocode cache when possible"""
+    key = normalize_key(location)
+    cached = geocode_cache.get(key)
+    if cached is not MISSING:
+        return dict(cached) if cached else unresolved_location(location)
     
-    if not location:
-        return jsonify({'error': 'Location parameter is required'}), 400
+    try:
+        location_data = geocode_location(location)
+    except Exception as e:
+        # Transient failures are not cached so the next request retries upstream
+        logger.warning("Geocoding failed", extra={'provider': 'nominatim', 'location': location, 'error': str(e)})
+        return unresolved_location(location)
     
-    # Get location details (country, state, address, coordinates)
+    return store_geocode_result(location, location_data)
+
+
+def store_geocode_result(location, location_data):
+    """Cache a Nominatim answer (None caches a negative result) and return the location details"""
+    key = normalize_key(location)
+    if location_data:
+        geocode_cache.set(key, location_data, GEOCODE_CACHE_TTL_SECONDS)
+        return dict(location_data)
+    
+    logger.info("No geocoding match, caching negative result", extra={'location': location})
+    geocode_cache.set(key, None, GEOCODE_NEGATIVE_TTL_SECONDS)
+    return unresolved_location(location)
+
+
+def refresh_location_aqi(location):
+    """Refresh cached geocoding and AQI for one location (a prefetch task)"""
     location_data = get_country_from_location(location)
+    lat, lon = location_data.get('lat'), location_data.get('lon')
+    if lat is not None and lon is not None:
+        if not cached_aqi_reading('weatherapi', lat, lon, fetch_aqi_from_weather_api_coords, refresh=True):
+            cached_aqi_reading('openweather', lat, lon, fetch_aqi_from_openweather, refresh=True)
+
+
+def refresh_location_news(location):
+    """Refresh cached news for one location (a prefetch task)"""
+    get_pollution_news(location.strip(), get_country_from_location(location).get('country'), 5, refresh=True)
+
+
+def news_prefetch_allowed():
+    """Whether NewsAPI has more than PREFETCH_NEWS_RESERVE of every quota window left"""
+    quota = PROVIDER_CLIENTS['newsapi'].quota
+    if quota is None:
+        return True
+    remaining = quota.remaining()
+    return all(remaining.get(bucket, 0) > limit * PREFETCH_NEWS_RESERVE for bucket, limit in quota.limits.items())
+
+
+prefetcher = PrefetchScheduler(
+    [
+        PrefetchTask('aqi', refresh_location_aqi, PREFETCH_INTERVAL_SECONDS, PREFETCH_MIN_SPACING_SECONDS),
+        PrefetchTask('news', refresh_location_news, PREFETCH_NEWS_INTERVAL_SECONDS, PREFETCH_MIN_SPACING_SECONDS,
+                     allowed=news_prefetch_allowed),
+    ],
+    seeds=CITY_POLLUTION_DATA.keys(),
+    max_observed=PREFETCH_MAX_OBSERVED,
+    lock_path=os.path.join(CACHE_DIR, 'prefetch.lock'),
+)
+
+
+def live_reading(lat, lon):
+    """Cached AQI reading for a grid cell, as pushed to live subscribers"""
+    return get_aqi_from_weather_api_coords(lat, lon) or get_aqi_from_openweather(lat, lon)
+
+
+live_hub = LiveHub(live_reading, interval=LIVE_POLL_SECONDS, executor=upstream_executor)
+
+
+class RequestPipeline:
+    """Runs provider lookups for one request concurrently against a single deadline"""
+
+    def __init__(self, deadline_seconds=None):
+        if deadline_seconds is None:
+            deadline_seconds = REQUEST_DEADLINE_SECONDS
+        self.started = time.monotonic()
+        self.deadline = self.started + deadline_seconds
+        self._calls = {}
+
+    def remaining(self):
+        """Seconds left in the request's deadline budget"""
+        return max(0.0, self.deadline - time.monotonic())
+
+    def submit(self, name, func, *args):
+        """Start a provider lookup on the shared upstream pool"""
+        call = {'status': 'pending', 'started': time.monotonic(), 'elapsed_ms': None}
+        self._calls[name] = call
+
+        def run():
+            try:
+                result = func(*args)
+            except Exception:
+                call['status'] = 'error'
+                raise
+            else:
+                call['status'] = 'ok' if result else 'no_data'
+                return result
+            finally:
+                elapsed = time.monotonic() - call['started']
+                call['elapsed_ms'] = round(elapsed * 1000, 1)
+                STAGE_SECONDS.observe(elapsed, stage=name, outcome=call['status'])
+
+        future = upstream_executor.submit(run)
+        call['future'] = future
+        return future
+
+    def result(self, future, default=None):
+        """Wait for a lookup within the remaining budget, returning default on timeout or error"""
+        try:
+            return future.result(timeout=self.remaining())
+        except FutureTimeoutError:
+            return default
+        except Exception as e:
+            logger.warning("Provider lookup failed", extra={'error': str(e)})
+            return default
+
+    def call(self, name, func, *args, default=None):
+        """Run a single lookup and wait for it within the budget"""
+        return self.result(self.submit(name, func, *args), default)
+
+    def report(self):
+        """Per-provider status and latency; lookups still running are timed out or abandoned"""
+        now = time.monotonic()
+        report = {}
+        for name, call in self._calls.items():
+            status = call['status']
+            elapsed_ms = call['elapsed_ms']
+            if status == 'pending':
+                call['future'].cancel()
+                status = 'timeout' if now >= self.deadline else 'abandoned'
+                elapsed_ms = round((now - call['started']) * 1000, 1)
+            report[name] = {'status': status, 'elapsed_ms': elapsed_ms}
+        return report
+
+
+def fetch_aqi_hedged(pipeline, lat, lon):
+    """Query WeatherAPI by coordinates, hedging with OpenWeather if it is slow or fails"""
+    primary = pipeline.submit('weatherapi', get_aqi_from_weather_api_coords, lat, lon)
+    wait([primary], timeout=min(AQI_HEDGE_DELAY_SECONDS, pipeline.remaining()))
+    if primary.done():
+        aqi_data = pipeline.result(primary)
+        if aqi_data:
+            return aqi_data
+        pending = set()
+    else:
+        pending = {primary}
+
+    pending.add(pipeline.submit('openweather', get_aqi_from_openweather, lat, lon))
+
+    # First successful answer wins; WeatherAPI is preferred when both land together
+    while pending and pipeline.remaining() > 0:
+        done, pending = wait(pending, timeout=pipeline.remaining(), return_when=FIRST_COMPLETED)
+        for future in sorted(done, key=lambda f: f is not primary):
+            aqi_data = pipeline.result(future)
+            if aqi_data:
+                return aqi_data
+
+    return None
+
+
+# Coordinate AQI lookups combined in fusion mode
+FUSION_PROVIDERS = {
+    'weatherapi': get_aqi_from_weather_api_coords,
+    'openweather': get_aqi_from_openweather,
+    'waqi': get_aqi_from_waqi,
+}
+
+
+def fetch_aqi_fused(pipeline, lat, lon):
+    """Fuse the coordinate providers' readings without waiting longer than for a single one
+
+    Providers with a reading cached for the cell, fresh or stale, answer from the
+    cache and the others are fetched. Cached readings are fused right away;
+    without any, the first reading to arrive is used. Fetches still running land
+    in the AQI cache, where the next request for the cell fuses them in.
+    """
+    cell = snap_to_grid(lat, lon)
+    readings = {}
+    fetches = {}
+    for name, get in FUSION_PROVIDERS.items():
+        if aqi_cache.peek((name,) + cell) is MISSING:
+            fetches[pipeline.submit(name, get, lat, lon)] = name
+            continue
+        reading = pipeline.call(name, get, lat, lon)
+        if reading:
+            readings[name] = reading
+    pending = set(fetches)
+    while not readings and pending and pipeline.remaining() > 0:
+        done, pending = wait(pending, timeout=pipeline.remaining(), return_when=FIRST_COMPLETED)
+        for future in done:
+            reading = pipeline.result(future)
+            if reading:
+                readings[fetches[future]] = reading
+    return fused_reading(readings, lat, lon)
+
+
+def fused_reading(readings, lat, lon):
+    """One scored reading from several providers' readings of a grid cell, with how it was fused
+
+    A reading's age runs from the provider's observation time, or from when it
+    was fetched if the provider gave none.
+    """
+    now = time.time()
+    aged = {}
+    for provider, reading in readings.items():
+        observed_at = reading.get('observed_at')
+        if observed_at is None:
+            entry = aqi_cache.peek((provider,) + snap_to_grid(lat, lon))
+            observed_at = entry[1] if entry is not MISSING else now
+        aged[provider] = (reading, now - observed_at)
+    concentrations, details = fuse_readings(
+        aged, FUSION_RELIABILITY, FUSION_HALF_LIFE_SECONDS, expected=FUSION_PROVIDERS
+    )
+    if not concentrations:
+        return None
+    aqi_data = score_reading(concentrations)
+    aqi_data['fusion'] = {
+        'providers': sorted(readings),
+        'confidence': details['pollutant_confidence'].get(aqi_data['dominant_pollutant'], 0.0),
+        **details,
+    }
+    return aqi_data
+
+
+def fusion_requested(value):
+    """Whether a request's fusion flag asks for fused readings; AQI_FUSION decides when it is absent"""
+    if value is None:
+        return AQI_FUSION
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+# Top-level fields of a pollution report, selectable with fields= (or include=). Leaving out
+# aqi_data and aqi_level skips the AQI lookup, pollution_news the news search, and
+# pollution_sources and source_data_attribution the source matching
+REPORT_FIELDS = (
+    'location', 'country', 'state', 'address', 'coordinates', 'aqi_data', 'aqi_level',
+    'pollution_sources', 'source_data_attribution', 'pollution_news', 'providers', 'timestamp',
+)
+
+
+def parse_fields(values):
+    """Report fields selected by fields=/include= values (comma-separated or repeated), or None for all
+
+    location is always kept so batch results can be told apart. Raises ValueError on unknown names.
+    """
+    names = {name.strip() for value in values for name in str(value).split(',') if name.strip()}
+    if not names:
+        return None
+    unknown = names.difference(REPORT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}; choose from {', '.join(REPORT_FIELDS)}")
+    return frozenset(names | {'location'})
+
+
+def wants(fields, *names):
+    """Whether any of the named report fields is selected (fields=None selects them all)"""
+    return fields is None or any(name in fields for name in names)
+
+
+def select_fields(payload, fields):
+    """The report with only the selected top-level fields"""
+    if fields is None:
+        return payload
+    return {key: value for key, value in payload.items() if key in fields}
+
+
+def assemble_report(location, location_data, aqi_data, pollution_news, providers, aqi_standard=None, fields=None):
+    """Build the /api/pollution-data response body from the provider results
+
+    Source matching runs only when its fields are selected; aqi_data=None or
+    pollution_news=None leaves those fields out. The cheap location fields are
+    always present, so callers can still work out caching before select_fields.
+    """
+    country = location_data.get('country')
+    report = {
+        'location': location,
+        'country': country,
+        'state': location_data.get('state'),
+        'address': location_data.get('address'),
+        'coordinates': {
+            'latitude': location_data.get('lat'),
+            'longitude': location_data.get('lon')
+        },
+    }
+    
+    if aqi_data is not None:
+        # Cached readings are scored on the default standard; rescore if another was requested
+        aqi_standard = aqi_standard or AQI_STANDARD
+        if aqi_data.get('aqi_standard') != aqi_standard:
+            aqi_data = dict(aqi_data, **score_reading(aqi_data, aqi_standard))
+        report['aqi_data'] = aqi_data
+        report['aqi_level'] = get_aqi_level(aqi_data.get('aqi', 0), aqi_standard)
+    
+    if wants(fields, 'pollution_sources', 'source_data_attribution'):
+        pollution_sources, attribution = match_pollution_sources(location, location_data)
+        report['pollution_sources'] = pollution_sources
+        report['source_data_attribution'] = attribution
+    
+    if pollution_news is not None:
+        report['pollution_news'] = pollution_news
+    report['providers'] = providers
+    report['timestamp'] = __import__('datetime').datetime.now().isoformat()
+    return report
+
+
+def match_pollution_sources(location, location_data):
+    """(sources, attribution) for the best matching city, else country, else the default breakdown"""
+    country = location_data.get('country')
+    
+    # Get pollution sources - try city first, then country, then default
+    with span('sources') as stage:
+        matched_city = source_index.match_city(location, location_data)
+        matched_country = source_index.country_by_name(country)
+        
+        # Try to find city-specific data
+        if matched_city in CITY_POLLUTION_DATA:
+            pollution_source_data = CITY_POLLUTION_DATA[matched_city]
+            pollution_sources = pollution_source_data['sources']
+            stage.update(source_level='city', match=matched_city)
+        # Fallback to country-specific data
+        elif matched_country in COUNTRY_POLLUTION_DATA:
+            pollution_source_data = COUNTRY_POLLUTION_DATA[matched_country]
+            pollution_sources = pollution_source_data['sources']
+            stage.update(source_level='country', match=matched_country)
+        # Final fallback to default
+        else:
+            pollution_sources = POLLUTION_SOURCES['default']['sources']
+            pollution_source_data = {'sources': pollution_sources, 'source': 'Default'}
+            stage.update(source_level='default', match=None)
+    SOURCE_MATCHES.inc(level=stage['source_level'])
+    return pollution_sources, pollution_source_data.get('source', 'Government/Research Data')
+
+
+def build_pollution_report(location, coordinates=None, deadline_seconds=None, aqi_standard=None, fusion=False,
+                           fields=None):
+    """Assemble pollution data for a location name, or for known (lat, lon) coordinates
+
+    With fusion=True the AQI reading combines every provider instead of taking the first.
+    fields (see parse_fields) limits the lookups to those the selected fields need.
+
+    Returns (payload, status_code) so the single and batch endpoints share it.
+    """
+    pipeline = RequestPipeline(deadline_seconds)
+    city_name = location.strip()
+    
+    # Get location details (country, state, address, coordinates); known coordinates are
+    # reverse geocoded offline instead of asking Nominatim
+    if coordinates:
+        location_data = reverse_geocoder.resolve(*coordinates)
+        city_name = location_data.get('city')
+    else:
+        location_data = pipeline.call(
+            'nominatim', get_country_from_location, location, default=unresolved_location(location)
+        )
     country = location_data.get('country')
-    state = location_data.get('state')
-    address = location_data.get('address')
     lat = location_data.get('lat')
     lon = location_data.get('lon')
     
+    # News only needs the geocoded country, so it runs alongside the AQI lookup.
+    # Coordinates away from any known city have no place name to search news for.
+    news_future = None
+    if city_name and wants(fields, 'pollution_news'):
+        news_future = pipeline.submit('newsapi', get_pollution_news, city_name, country, 5)
+    
     # Fetch AQI data - prefer coordinates if available, fallback to location name
     aqi_data = None
-    if lat and lon:
-        # Try with coordinates first (most accurate)
-        aqi_data = get_aqi_from_weather_api_coords(lat, lon)
-        if not aqi_data:
-            # Fallback to OpenWeather with coordinates
-            aqi_data = get_aqi_from_openweather(lat, lon)
+    need_aqi = wants(fields, 'aqi_data', 'aqi_level')
+    if need_aqi and lat is not None and lon is not None:
+        aqi_data = fetch_aqi_fused(pipeline, lat, lon) if fusion else fetch_aqi_hedged(pipeline, lat, lon)
     
     # If no data from coordinates, try WeatherAPI with location name
-    if not aqi_data:
-        aqi_data = get_aqi_from_weather_api(location)
+    if need_aqi and not aqi_data and not coordinates and pipeline.remaining() > 0:
+        aqi_data = pipeline.call('weatherapi_name', get_aqi_from_weather_api, location)
     
     # If still no data, return error
-    if not aqi_data:
-        return jsonify({
+    if need_aqi and not aqi_data:
+        return {
             'error': 'Unable to fetch pollution data for this location',
-            'location': location
-        }), 404
+            'location': location,
+            'providers': pipeline.report()
+        }, 404
     
-    # Get pollution sources - try city first, then country, then default
-    pollution_sources = None
-    pollution_source_data = None
+    # Collect pollution-related news, whatever has arrived within the budget
+    pollution_news = None
+    if wants(fields, 'pollution_news'):
+        pollution_news = pipeline.result(news_future, default=[]) if news_future else []
     
-    # Try to find city-specific data
-    city_name = location.strip()
-    if city_name in CITY_POLLUTION_DATA:
-        pollution_source_data = CITY_POLLUTION_DATA[city_name]
-        pollution_sources = pollution_source_data['sources']
-        print(f"Using city-specific data for {city_name}")
-    # Fallback to country-specific data
-    elif country and country in COUNTRY_POLLUTION_DATA:
-        pollution_source_data = COUNTRY_POLLUTION_DATA[country]
-        pollution_sources = pollution_source_data['sources']
-        print(f"Using country-level data for {country}")
-    # Final fallback to default
+    return assemble_report(
+        location, location_data, aqi_data, pollution_news, pipeline.report(), aqi_standard, fields
+    ), 200
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Started by the first request rather than at import, so the master of a preloading server
+    # never runs it. Every worker starts one, but only the worker holding prefetch.lock refreshes
+    if PREFETCH_ENABLED:
+        prefetcher.start()
+
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_SECONDS.observe(
+            time.perf_counter() - started, endpoint=endpoint, method=request.method, status=response.status_code
+        )
+    return response
+
+
+# Report fields that change on every request without changing what the report says
+VOLATILE_REPORT_FIELDS = ('timestamp', 'providers')
+# Stand-ins the volatile fields are serialized as, so one serialization gives both the ETag and the body
+VOLATILE_PLACEHOLDERS = {field: f'volatile-{field}-{os.urandom(8).hex()}' for field in VOLATILE_REPORT_FIELDS}
+
+
+def json_body(payload, etag=None, weak=False):
+    """Serialize a payload the way jsonify does, as a Body"""
+    return Body((app.json.dumps(payload) + '\n').encode('utf-8'), etag, weak)
+
+
+def report_body(payload):
+    """A pollution report as a Body whose weak ETag ignores the per-request fields
+
+    The report is serialized once with placeholders for those fields, the ETag is
+    the hash of that, and the placeholders are then replaced by the fields' JSON.
+    """
+    volatile = {field: payload[field] for field in VOLATILE_REPORT_FIELDS if field in payload}
+    body = json_body(dict(payload, **{field: VOLATILE_PLACEHOLDERS[field] for field in volatile}))
+    data = body.data
+    for field, value in volatile.items():
+        data = data.replace(f'"{VOLATILE_PLACEHOLDERS[field]}"'.encode('utf-8'), app.json.dumps(value).encode('utf-8'))
+    return Body(data, body.etag, weak=True)
+
+
+def report_max_age(payload):
+    """Seconds until the report's AQI reading is due for a refresh, capped at POLLUTION_DATA_MAX_AGE_SECONDS
+
+    The providers that served the reading are the fused ones, or else the coordinate
+    providers that answered; the first of their cached readings to expire sets the age.
+    """
+    coordinates = payload.get('coordinates') or {}
+    lat, lon = coordinates.get('latitude'), coordinates.get('longitude')
+    if lat is None or lon is None:
+        return 0
+    fusion = (payload.get('aqi_data') or {}).get('fusion') or {}
+    providers = fusion.get('providers') or [
+        name for name, call in (payload.get('providers') or {}).items() if call.get('status') == 'ok'
+    ]
+    cell = snap_to_grid(lat, lon)
+    remaining = []
+    for provider in providers:
+        entry = aqi_cache.peek((provider,) + cell) if provider in AQI_CACHE_TTL_SECONDS else MISSING
+        if entry is not MISSING:
+            remaining.append(AQI_CACHE_TTL_SECONDS[provider] - (time.time() - entry[1]))
+    if not remaining:
+        return 0
+    return int(max(0, min(POLLUTION_DATA_MAX_AGE_SECONDS, *remaining)))
+
+
+def health_tips_body(aqi_level, locale=None, pollutant=None, standard=None):
+    """Health tips for a category label of an AQI standard (default AQI_STANDARD)
+
+    Every known label, locale and pollutant combination is served from
+    health_tip_bodies, serialized at startup; unknown labels get the Moderate tips.
+    """
+    level = health_tips.level(aqi_level, get_standard(standard or AQI_STANDARD).name)
+    locale = health_tips.locale(locale)
+    pollutant = pollutant if pollutant in health_tips.pollutants else None
+    if level is None:
+        # Unknown levels are echoed back, so they are serialized per request rather than stored
+        return json_body(health_tips.payload(aqi_level, level, locale, pollutant))
+    return health_tip_bodies[(aqi_level, level, locale, pollutant)]
+
+
+with startup.phase('health_tip_bodies'):
+    health_tip_bodies = {key: json_body(payload) for key, payload in health_tips.responses()}
+
+
+def pollution_sources_body():
+    """Country source breakdowns, serialized once per inventory version"""
+    # Checks for an edited inventory; a reload clears static_bodies
+    inventory.compiled()
+    return static_bodies.get(
+        ('pollution-sources',), lambda: json_body({'pollution_sources': COUNTRY_POLLUTION_DATA.to_dict()})
+    )
+
+
+def body_response(body, status=200, max_age=None):
+    """Response for a prepared Body; encode_response picks its coding and answers conditional requests"""
+    response = app.response_class(body.data, status=status, mimetype='application/json')
+    response.prepared_body = body
+    if max_age is not None:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    return response
+
+
+@app.after_request
+def encode_response(response):
+    """ETag JSON GET responses, answer a matching If-None-Match with 304 and compress large bodies"""
+    if (response.status_code != 200 or response.mimetype != 'application/json' or response.is_streamed
+            or response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+    body = getattr(response, 'prepared_body', None) or Body(response.get_data())
+    data, headers = prepare(
+        body, request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'),
+        COMPRESS_MIN_BYTES, conditional=request.method in ('GET', 'HEAD')
+    )
+    for name, value in headers.items():
+        if name == 'Vary':
+            response.vary.add(value)
+        else:
+            response.headers[name] = value
+    if data is None:
+        response.status_code = 304
+        response.set_data(b'')
+    elif data is not body.data:
+        response.set_data(data)
+    return response
+
+
+def parse_coordinates(lat, lon):
+    """(lat, lon) as floats, raising ValueError unless both are numbers in range"""
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        raise ValueError('lat and lon must be numbers')
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError('lat/lon out of range')
+    return lat, lon
+
+
+def parse_report_request(args):
+    """(location_label, coordinates) from location or lat/lon query parameters, raising ValueError if invalid"""
+    location = args.get('location', '').strip()
+    if args.get('lat') is not None or args.get('lon') is not None:
+        if args.get('lat') is None or args.get('lon') is None:
+            raise ValueError('Both lat and lon are required')
+        coordinates = parse_coordinates(args.get('lat'), args.get('lon'))
+        return location or f"{coordinates[0]},{coordinates[1]}", coordinates
+    if not location:
+        raise ValueError('Location parameter (or lat and lon) is required')
+    return location, None
+
+
+def report_key(location, coordinates, aqi_standard, fusion, fields):
+    """Identity of a report request; requests with equal keys get the same response"""
+    if coordinates:
+        place = ('coords', round(coordinates[0], 6), round(coordinates[1], 6), normalize_key(location))
     else:
-        pollution_sources = POLLUTION_SOURCES['default']
-        pollution_source_data = {'sources': pollution_sources, 'source': 'Default'}
-        print(f"Using default pollution sources for {location}")
+        place = ('name', normalize_key(location))
+    return place + (aqi_standard, fusion, tuple(sorted(fields)) if fields else None)
+
+
+def coalesced_report(location, coordinates, aqi_standard, fusion, fields):
+    """(payload, status, body) for a report, shared by identical requests in flight
+
+    Concurrent requests with the same report_key wait for the first one and get its
+    result, serialized once; with REPORT_COALESCING_SHARED the first request on the
+    host builds the report and the other workers reuse it.
+    """
+    key = report_key(location, coordinates, aqi_standard, fusion, fields)
+    # Where this request's report was built: None if by this request
+    built_by = 'worker'
     
-    # Calculate AQI level
-    aqi_level = get_aqi_level(aqi_data.get('aqi', 0))
+    def build():
+        nonlocal built_by
+        built_by = None
+        return build_pollution_report(location, coordinates, aqi_standard=aqi_standard, fusion=fusion, fields=fields)
     
-    # Fetch pollution-related news
-    pollution_news = get_pollution_news(city_name, country, limit=5)
+    def lead():
+        nonlocal built_by
+        built_by = 'host'
+        if shared_report_flights is None:
+            payload, status = build()
+        else:
+            payload, status = shared_report_flights.do(json.dumps(key), build)
+        if status != 200:
+            return payload, status, None
+        with span('serialize'):
+            return payload, status, report_body(select_fields(payload, fields))
     
-    response_data = {
-        'location': location,
-        'country': country,
-        'state': state,
-        'address': address,
-        'coordinates': {
-            'latitude': lat,
-            'longitude': lon
-        },
-        'aqi_data': aqi_data,
-        'aqi_level': aqi_level,
-        'pollution_sources': pollution_sources,
-        'source_data_attribution': pollution_source_data.get('source', 'Government/Research Data'),
-        'pollution_news': pollution_news,
-        'timestamp': __import__('datetime').datetime.now().isoformat()
+    if not REPORT_COALESCING:
+        return lead()
+    result = report_flights.do(key, lead)
+    if built_by is not None:
+        REPORTS_COALESCED.inc(scope=built_by)
+    return result
+
+
+@app.route('/api/pollution-data', methods=['GET'])
+def get_pollution_data():
+    """Main endpoint to get pollution data for a location name or lat/lon"""
+    try:
+        location, coordinates = parse_report_request(request.args)
+        aqi_standard = get_standard(request.args.get('aqi_standard') or AQI_STANDARD).name
+        fields = parse_fields(request.args.getlist('fields') + request.args.getlist('include'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response_data, status, body = coalesced_report(
+        location, coordinates, aqi_standard, fusion_requested(request.args.get('fusion')), fields
+    )
+    if status != 200:
+        return jsonify(response_data), status
+    if not coordinates:
+        prefetcher.record(location)
+    return body_response(body, max_age=report_max_age(response_data))
+
+
+def parse_batch_item(item):
+    """Turn one batch entry into (dedup_key, location_label, coordinates), raising ValueError if invalid"""
+    if isinstance(item, str):
+        item = {'location': item}
+    if not isinstance(item, dict):
+        raise ValueError('Each entry must be a location name or an object with location or lat/lon')
+    
+    if item.get('lat') is not None and item.get('lon') is not None:
+        lat, lon = parse_coordinates(item['lat'], item['lon'])
+        return ('coords', round(lat, 6), round(lon, 6)), f"{lat},{lon}", (lat, lon)
+    
+    location = item.get('location')
+    if not isinstance(location, str) or not location.strip():
+        raise ValueError('Entry needs a non-empty location or both lat and lon')
+    return ('name', normalize_key(location)), location.strip(), None
+
+
+def run_batch_item(location, coordinates, batch_deadline, aqi_standard=None, fusion=False, fields=None):
+    """Resolve one unique batch entry within what is left of the batch deadline"""
+    remaining = batch_deadline - time.monotonic()
+    if remaining <= 0:
+        return {'error': 'Batch deadline exceeded before this location was resolved'}, 504
+    try:
+        payload, status = build_pollution_report(
+            location, coordinates, min(remaining, REQUEST_DEADLINE_SECONDS), aqi_standard, fusion, fields
+        )
+        return (select_fields(payload, fields) if status == 200 else payload), status
+    except Exception as e:
+        logger.exception("Error resolving batch entry", extra={'location': location, 'error': str(e)})
+        return {'error': 'Internal error resolving this location'}, 500
+
+
+@app.route('/api/pollution-data/batch', methods=['POST'])
+def get_pollution_data_batch():
+    """Resolve many locations in one request, with per-location results and errors"""
+    body = request.get_json(silent=True) or {}
+    items = body.get('locations')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Body must be JSON with a non-empty "locations" list'}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'At most {BATCH_MAX_ITEMS} locations per batch'}), 400
+    try:
+        aqi_standard = get_standard(body.get('aqi_standard') or AQI_STANDARD).name
+        fields = body.get('fields', request.args.getlist('fields') + request.args.getlist('include'))
+        if not isinstance(fields, (str, list)):
+            raise ValueError('"fields" must be a list of field names or a comma-separated string')
+        fields = parse_fields([fields] if isinstance(fields, str) else fields)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Deduplicate so repeated entries share one lookup
+    unique = {}
+    entries = []
+    for index, item in enumerate(items):
+        try:
+            key, label, coordinates = parse_batch_item(item)
+        except ValueError as e:
+            entries.append({'index': index, 'status': 400, 'error': str(e)})
+            continue
+        unique.setdefault(key, (label, coordinates, []))[2].append(index)
+        entries.append({'index': index, 'key': key})
+    
+    batch_deadline = time.monotonic() + BATCH_DEADLINE_SECONDS
+    fusion = fusion_requested(body.get('fusion', request.args.get('fusion')))
+    futures = {
+        batch_executor.submit(
+            run_batch_item, label, coordinates, batch_deadline, aqi_standard, fusion, fields
+        ): key
+        for key, (label, coordinates, _) in unique.items()
     }
     
-    return jsonify(response_data), 200
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        def generate():
+            # Invalid entries first, then each unique location as soon as it resolves
+            for entry in entries:
+                if 'error' in entry:
+                    yield json.dumps(entry) + '\n'
+            for future in as_completed(futures):
+                key = futures[future]
+                payload, status = future.result()
+                yield json.dumps({'indices': unique[key][2], 'status': status, 'result': payload}) + '\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    outcomes = {futures[future]: future.result() for future in as_completed(futures)}
+    results = []
+    for entry in entries:
+        if 'error' in entry:
+            results.append(entry)
+            continue
+        payload, status = outcomes[entry['key']]
+        results.append({'index': entry['index'], 'status': status, 'result': payload})
+    
+    with span('serialize'):
+        response = jsonify({
+            'count': len(results),
+            'unique_locations': len(unique),
+            'errors': sum(1 for result in results if result['status'] != 200),
+            'results': results,
+        })
+    return response, 200
+
+
+def parse_live_request(args):
+    """(locations, coordinates) to subscribe to from stream query parameters, raising ValueError if invalid"""
+    locations = [location.strip() for location in args.getlist('location') if location.strip()]
+    coordinates = None
+    if args.get('lat') is not None or args.get('lon') is not None:
+        if args.get('lat') is None or args.get('lon') is None:
+            raise ValueError('Both lat and lon are required')
+        coordinates = parse_coordinates(args.get('lat'), args.get('lon'))
+    if not locations and coordinates is None:
+        raise ValueError('At least one location parameter (or lat and lon) is required')
+    if len(locations) + (coordinates is not None) > LIVE_MAX_LOCATIONS:
+        raise ValueError(f'At most {LIVE_MAX_LOCATIONS} locations per stream')
+    return locations, coordinates
+
+
+def open_live_stream():
+    """Count a new stream against LIVE_MAX_STREAMS, returning False if the worker is at the limit"""
+    global live_streams_open
+    with live_streams_lock:
+        if live_streams_open >= LIVE_MAX_STREAMS:
+            return False
+        live_streams_open += 1
+        return True
+
+
+def close_live_stream():
+    global live_streams_open
+    with live_streams_lock:
+        live_streams_open -= 1
+
+
+def live_cells(resolved):
+    """Group (label, lat, lon) subscriptions by AQI grid cell"""
+    cells = {}
+    for label, lat, lon in resolved:
+        cells.setdefault(snap_to_grid(lat, lon), []).append(label)
+    return cells
+
+
+def format_sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def live_messages(cells, cell, event, payload):
+    """SSE messages for one cell event, one per location subscribed to that cell"""
+    cell_info = {'latitude': cell[0], 'longitude': cell[1]}
+    return ''.join(format_sse(event, dict(payload, location=label, cell=cell_info)) for label in cells[cell])
+
+
+def live_snapshot(reading):
+    return {'aqi_data': reading, 'aqi_level': get_aqi_level(reading['aqi']) if reading else None}
+
+
+def live_update(event):
+    payload = dict(event)
+    if 'aqi' in event['changes']:
+        payload['aqi_level'] = get_aqi_level(event['changes']['aqi'])
+    return payload
+
+
+@app.route('/api/pollution-stream', methods=['GET'])
+def get_pollution_stream():
+    """Server-Sent Events stream of AQI changes for one or more locations"""
+    try:
+        locations, coordinates = parse_live_request(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    resolved = []
+    for location in locations:
+        location_data = get_country_from_location(location)
+        if location_data.get('lat') is None or location_data.get('lon') is None:
+            return jsonify({'error': 'Unable to resolve this location', 'location': location}), 404
+        resolved.append((location, location_data['lat'], location_data['lon']))
+    if coordinates:
+        resolved.append((f"{coordinates[0]},{coordinates[1]}", *coordinates))
+    cells = live_cells(resolved)
+    
+    if not open_live_stream():
+        response = jsonify({'error': 'Too many live streams on this server, retry shortly'})
+        response.headers['Retry-After'] = str(int(LIVE_KEEPALIVE_SECONDS))
+        return response, 503
+    events = queue.Queue(maxsize=LIVE_QUEUE_SIZE)
+    lagging = []
+    
+    def deliver(cell, event):
+        try:
+            events.put_nowait((cell, event))
+        except queue.Full:
+            # The client is not keeping up; it gets fresh snapshots instead of the missed deltas
+            lagging.append(cell)
+    
+    def generate():
+        # Subscribed once the server starts the stream, so a client gone before then leaves nothing behind
+        subscription = live_hub.subscribe(cells, deliver)
+        try:
+            for cell in cells:
+                yield live_messages(cells, cell, 'snapshot', live_snapshot(live_hub.current(cell)))
+            while True:
+                if lagging:
+                    while not events.empty():
+                        events.get_nowait()
+                    for cell in cells:
+                        yield live_messages(cells, cell, 'snapshot', live_snapshot(live_hub.current(cell)))
+                    lagging.clear()
+                try:
+                    cell, event = events.get(timeout=LIVE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    # Comment line so proxies keep the connection open and disconnects are noticed
+                    yield ': keepalive\n\n'
+                    continue
+                yield live_messages(cells, cell, 'update', live_update(event))
+        finally:
+            live_hub.unsubscribe(subscription)
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    # Called when the stream ends, even if the client left before it started
+    response.call_on_close(close_live_stream)
+    return response
 
 
 @app.route('/api/health-tips', methods=['GET'])
 def get_health_tips():
     """Get health recommendations based on AQI level"""
-    aqi_level = request.args.get('aqi_level', 'Moderate')
-    
-    health_tips = {
-        'Good': [
-            'Air quality is satisfactory, enjoy outdoor activities',
-            'Perfect day for exercise and outdoor recreation',
-            'No air quality alerts'
-        ],
-        'Moderate': [
-            'Unusually sensitive people should consider limiting prolonged outdoor exertion',
-            'General public is less likely to be affected',
-            'Keep monitoring air quality'
-        ],
-        'Unhealthy for Sensitive Groups': [
-            'Members of sensitive groups should limit prolonged outdoor exertion',
-            'Consider wearing an N95 mask if going outside',
-            'Keep windows closed to prevent outdoor air from entering'
-        ],
-        'Unhealthy': [
-            'Everyone may begin to experience health effects',
-            'Wear an N95 or P100 mask if venturing outdoors',
-            'Limit outdoor activities'
-        ],
-        'Very Unhealthy': [
-            'Health alert: everyone may experience serious health effects',
-            'Avoid outdoor activities entirely if possible',
-            'Use air purifiers indoors and keep windows closed'
-        ],
-        'Hazardous': [
-            'Health warning of emergency conditions',
-            'Entire population is more likely to be affected',
-            'Stay indoors and keep activity levels as low as possible'
-        ]
-    }
-    
-    return jsonify({
-        'aqi_level': aqi_level,
-        'health_tips': health_tips.get(aqi_level, health_tips['Moderate'])
-    }), 200
+    try:
+        body = health_tips_body(
+            request.args.get('aqi_level', 'Moderate'), request.args.get('locale'),
+            request.args.get('pollutant'), request.args.get('aqi_standard')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return body_response(body, max_age=STATIC_MAX_AGE_SECONDS)
 
 
 @app.route('/api/pollution-sources', methods=['GET'])
 def get_pollution_sources():
     """Get pollution sources for different countries"""
-    return jsonify({'pollution_sources': COUNTRY_POLLUTION_DATA}), 200
+    return body_response(pollution_sources_body(), max_age=STATIC_MAX_AGE_SECONDS)
+
+
+def parse_timestamp(value, default):
+    """Epoch seconds from a query parameter given as epoch seconds or an ISO 8601 date/time (UTC if naive)"""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+@app.route('/api/pollution-history', methods=['GET'])
+def get_pollution_history():
+    """Stored AQI readings for a location over a time range, downsampled to hourly or daily rollups"""
+    location = request.args.get('location', '')
+    now = time.time()
+    try:
+        end = parse_timestamp(request.args.get('end'), now)
+        start = parse_timestamp(request.args.get('start'), end - 7 * 86400)
+        lat, lon = request.args.get('lat'), request.args.get('lon')
+        lat, lon = (float(lat), float(lon)) if lat is not None and lon is not None else (None, None)
+    except ValueError:
+        return jsonify({'error': 'start/end must be epoch seconds or ISO 8601, lat/lon must be numbers'}), 400
+    if start > end:
+        return jsonify({'error': 'start must be before end'}), 400
+    
+    if lat is None:
+        if not location:
+            return jsonify({'error': 'Location parameter (or lat and lon) is required'}), 400
+        location_data = get_country_from_location(location)
+        lat, lon = location_data.get('lat'), location_data.get('lon')
+        if lat is None or lon is None:
+            return jsonify({'error': 'Unable to resolve this location', 'location': location}), 404
+    
+    cell_lat, cell_lon = snap_to_grid(lat, lon)
+    try:
+        resolution, points = history.query(cell_lat, cell_lon, start, end, request.args.get('resolution', 'auto'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'location': location or f"{lat},{lon}",
+        'cell': {'latitude': cell_lat, 'longitude': cell_lon},
+        'start': int(start),
+        'end': int(end),
+        'resolution': resolution,
+        'aqi_standard': AQI_STANDARD,
+        'points': points,
+    }), 200
+
+
+def parse_grid_request(args):
+    """(west, south, east, north, rows, cols, radius_km) from grid query parameters, raising ValueError if invalid"""
+    try:
+        west, south, east, north = (float(part) for part in args.get('bbox', '').split(','))
+    except ValueError:
+        raise ValueError('bbox must be west,south,east,north in degrees')
+    if not (-180 <= west < east <= 180 and -90 <= south < north <= 90):
+        raise ValueError('bbox must satisfy west < east and south < north, within -180..180 and -90..90')
+    try:
+        rows = int(args.get('rows', GRID_DEFAULT_SIZE))
+        cols = int(args.get('cols', GRID_DEFAULT_SIZE))
+        radius_km = float(args.get('radius_km', GRID_RADIUS_KM))
+    except ValueError:
+        raise ValueError('rows and cols must be integers, radius_km a number')
+    if not (1 <= rows <= GRID_MAX_SIZE and 1 <= cols <= GRID_MAX_SIZE):
+        raise ValueError(f'rows and cols must be between 1 and {GRID_MAX_SIZE}')
+    if not (0 < radius_km <= GRID_MAX_RADIUS_KM):
+        raise ValueError(f'radius_km must be between 0 and {GRID_MAX_RADIUS_KM}')
+    return west, south, east, north, rows, cols, radius_km
+
+
+def grid_readings(west, south, east, north, since):
+    """Newest AQI reading per grid cell inside a bounding box: [(lat, lon, aqi)]
+
+    Stored history covers readings taken by every worker; the in-memory AQI
+    cache adds this worker's readings that are not written yet.
+    """
+    newest = {}
+    if HISTORY_ENABLED:
+        try:
+            for lat, lon, ts, aqi in history.latest(south, west, north, east, since):
+                newest[(lat, lon)] = (ts, aqi)
+        except Exception as e:
+            logger.warning("History unavailable for grid", extra={'error': str(e)})
+    for (_, lat, lon), reading, fetched_at in aqi_cache.items():
+        aqi = reading.get('aqi')
+        if (aqi is None or fetched_at < since or not (south <= lat <= north and west <= lon <= east)
+                or newest.get((lat, lon), (0,))[0] >= fetched_at):
+            continue
+        newest[(lat, lon)] = (fetched_at, aqi)
+    return [(lat, lon, aqi) for (lat, lon), (_, aqi) in newest.items()]
+
+
+@app.route('/api/pollution-grid', methods=['GET'])
+def get_pollution_grid():
+    """AQI over a bounding box as a rows x cols grid, interpolated from cached and stored readings"""
+    try:
+        west, south, east, north, rows, cols, radius_km = parse_grid_request(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Stations just outside the box still reach cells near its edges
+    lat_pad = radius_km / KM_PER_DEGREE
+    lon_pad = lat_pad / max(math.cos(math.radians(max(abs(south), abs(north)))), 0.01)
+    readings = grid_readings(
+        max(-180.0, west - lon_pad), max(-90.0, south - lat_pad), min(180.0, east + lon_pad), min(90.0, north + lat_pad),
+        time.time() - GRID_MAX_AGE_SECONDS,
+    )
+    with span('interpolate', stations=len(readings), cells=rows * cols):
+        lats, lons = cell_centers(south, west, north, east, rows, cols)
+        aqi = idw_grid(readings, lats, lons, radius_km, GRID_IDW_POWER)
+    covered = sum(1 for row in aqi for value in row if value is not None)
+    
+    return jsonify({
+        'bbox': {'west': west, 'south': south, 'east': east, 'north': north},
+        'rows': rows,
+        'cols': cols,
+        'cell_degrees': {'latitude': (north - south) / rows, 'longitude': (east - west) / cols},
+        'radius_km': radius_km,
+        'aqi_standard': AQI_STANDARD,
+        'stations': len(readings),
+        'coverage': round(covered / (rows * cols), 4),
+        'aqi': aqi,
+    }), 200
+
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Cache counters for sizing and monitoring"""
+    return jsonify({
+        'geocode_cache': geocode_cache.stats(),
+        'source_index': source_index.stats(),
+        'reverse_geocoder': reverse_geocoder.stats(),
+        'inventory': inventory.stats(),
+        'aqi_cache': aqi_cache.stats(),
+        'news_cache': news_cache.stats(),
+        'providers': {name: client.stats() for name, client in PROVIDER_CLIENTS.items()},
+        'prefetch': dict(prefetcher.stats(), enabled=PREFETCH_ENABLED),
+        'history': dict(history.stats(), enabled=HISTORY_ENABLED),
+        'live': dict(live_hub.stats(), streams=live_streams_open, max_streams=LIVE_MAX_STREAMS),
+        'static_bodies': static_bodies.stats(),
+        'report_coalescing': dict(
+            report_flights.stats(), enabled=REPORT_COALESCING,
+            shared=shared_report_flights.stats() if shared_report_flights is not None else None,
+        ),
+        'startup': startup.report(),
+    }), 200
+
+
+def collect_runtime_metrics():
+    """Cache, provider and background job metrics, read from their stats when scraped"""
+    geocode = geocode_cache.stats()
+    aqi = aqi_cache.stats()
+    news = news_cache.stats()
+    lookups = [(('geocode', 'hit'), geocode['hits']), (('geocode', 'miss'), geocode['misses'])]
+    for name, stats in (('aqi', aqi), ('news', news)):
+        lookups += [
+            ((name, 'fresh'), stats['fresh_hits']),
+            ((name, 'stale'), stats['stale_hits']),
+            ((name, 'miss'), stats['misses']),
+        ]
+    geocode_lookups = geocode['hits'] + geocode['misses']
+    yield ('pollution_cache_lookups_total', 'counter', 'Cache lookups by result', ('cache', 'result'), lookups)
+    yield ('pollution_cache_hit_ratio', 'gauge', 'Share of cache lookups served from cache', ('cache',), [
+        (('geocode',), round(geocode['hits'] / geocode_lookups, 4) if geocode_lookups else None),
+        (('aqi',), aqi['hit_ratio']),
+        (('news',), news['hit_ratio']),
+    ])
+    yield ('pollution_cache_entries', 'gauge', 'Entries held in memory per cache', ('cache',), [
+        (('geocode',), geocode['memory']['size']),
+        (('aqi',), aqi['size']),
+        (('news',), news['size']),
+    ])
+    yield ('pollution_cache_coalesced_fetches_total', 'counter', 'Cache misses that shared an in-flight fetch',
+           ('cache',), [(('aqi',), aqi['coalesced_fetches']), (('news',), news['coalesced_fetches'])])
+
+    providers = {name: client.stats() for name, client in PROVIDER_CLIENTS.items()}
+    yield ('pollution_provider_in_flight', 'gauge', 'Upstream calls in progress', ('provider',),
+           [((name,), stats['in_flight']) for name, stats in providers.items()])
+    yield ('pollution_provider_retries_total', 'counter', 'Upstream call retries', ('provider',),
+           [((name,), stats['retries']) for name, stats in providers.items()])
+    yield ('pollution_provider_circuit_open', 'gauge', '1 while the provider circuit breaker is not closed',
+           ('provider',), [((name,), int(stats['breaker']['state'] != 'closed')) for name, stats in providers.items()])
+    yield ('pollution_provider_rejected_total', 'counter', 'Calls rejected by an open circuit breaker',
+           ('provider',), [((name,), stats['breaker']['rejected']) for name, stats in providers.items()])
+    quotas = {name: stats['quota'] for name, stats in providers.items() if stats['quota']}
+    yield ('pollution_provider_quota_remaining', 'gauge', 'Requests left in each provider quota window',
+           ('provider', 'window'),
+           [((name, window), tokens) for name, quota in quotas.items() for window, tokens in quota['remaining'].items()])
+    yield ('pollution_provider_quota_rejected_total', 'counter', 'Calls rejected because a provider quota was used up',
+           ('provider',), [((name,), quota['rejected']) for name, quota in quotas.items()])
+
+    live = live_hub.stats()
+    yield ('pollution_live_subscriptions', 'gauge', 'Open live update streams', (), [((), live['subscriptions'])])
+    yield ('pollution_history_queued', 'gauge', 'Readings waiting to be written to history', (),
+           [((), history.stats()['queued'])])
+
+
+registry.register_collector(collect_runtime_metrics)
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/health', methods=['GET'])
@@ -661,5 +1750,9 @@ def health_check():
     return jsonify({'status': 'Backend is running'}), 200
 
 
+startup.finish()
+logger.info("App ready", extra=startup.report(top=5))
+
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
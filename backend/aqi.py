@@ -0,0 +1,290 @@
+import math
+from bisect import bisect_left, bisect_right
+
+try:
+    import numpy as np
+except ImportError:  # the vectorized path falls back to scoring readings one by one
+    np = None
+
+# Pollutants as reported by WeatherAPI and OpenWeatherMap, all in µg/m³
+POLLUTANTS = ('pm25', 'pm10', 'o3', 'no2', 'so2', 'co')
+
+# ppb = µg/m³ * MOLAR_VOLUME / molecular weight, at 25 °C and 1 atm
+MOLAR_VOLUME = 24.45
+MOLECULAR_WEIGHTS = {'o3': 48.00, 'no2': 46.01, 'so2': 64.07, 'co': 28.01}
+
+
+def unit_factor(pollutant, unit):
+    """Multiplier converting a µg/m³ concentration of pollutant into unit"""
+    if unit == 'ug/m3':
+        return 1.0
+    if unit == 'mg/m3':
+        return 0.001
+    if unit == 'ppb':
+        return MOLAR_VOLUME / MOLECULAR_WEIGHTS[pollutant]
+    if unit == 'ppm':
+        return MOLAR_VOLUME / MOLECULAR_WEIGHTS[pollutant] / 1000
+    raise ValueError(f"Unknown unit {unit}")
+
+
+class Breakpoints:
+    """Piecewise-linear concentration -> sub-index table for one pollutant"""
+
+    def __init__(self, pollutant, unit, points, decimals=None):
+        self.pollutant = pollutant
+        self.unit = unit
+        self.factor = unit_factor(pollutant, unit)
+        # Concentrations are truncated to the table's precision first, as the EPA does
+        self.decimals = decimals
+        self.concentrations = tuple(c for c, _ in points)
+        self.indices = tuple(i for _, i in points)
+
+    @classmethod
+    def bands(cls, pollutant, unit, rows, decimals=None):
+        """Table from (c_low, c_high, i_low, i_high) rows, as breakpoint tables are published"""
+        points = []
+        for c_low, c_high, i_low, i_high in rows:
+            if not points or points[-1] != (c_low, i_low):
+                points.append((c_low, i_low))
+            points.append((c_high, i_high))
+        return cls(pollutant, unit, points, decimals)
+
+    @classmethod
+    def steps(cls, pollutant, unit, indices, concentrations):
+        """Table from the concentrations at each index breakpoint of a contiguous scale"""
+        return cls(pollutant, unit, list(zip(concentrations, indices)))
+
+    def convert(self, value):
+        value = max(value * self.factor, 0.0)
+        if self.decimals is not None:
+            scale = 10 ** self.decimals
+            value = math.floor(value * scale + 1e-9) / scale
+        return value
+
+    def sub_index(self, value):
+        """Sub-index for a µg/m³ concentration, capped at the top of the table"""
+        c = self.convert(value)
+        points = self.concentrations
+        if c >= points[-1]:
+            return float(self.indices[-1])
+        i = bisect_right(points, c)
+        c_low, c_high = points[i - 1], points[i]
+        i_low, i_high = self.indices[i - 1], self.indices[i]
+        return i_low + (c - c_low) * (i_high - i_low) / (c_high - c_low)
+
+    def concentration(self, index):
+        """µg/m³ concentration with the given sub-index, the inverse of sub_index"""
+        indices = self.indices
+        if index >= indices[-1]:
+            c = self.concentrations[-1]
+        else:
+            i = max(1, bisect_right(indices, index))
+            i_low, i_high = indices[i - 1], indices[i]
+            c_low, c_high = self.concentrations[i - 1], self.concentrations[i]
+            c = c_low + (max(index, i_low) - i_low) * (c_high - c_low) / (i_high - i_low)
+        return c / self.factor
+
+    def sub_index_array(self, values):
+        c = np.maximum(np.asarray(values, dtype=float) * self.factor, 0.0)
+        if self.decimals is not None:
+            scale = 10 ** self.decimals
+            c = np.floor(c * scale + 1e-9) / scale
+        # np.interp clamps to the end points, which caps readings above the table
+        return np.interp(c, self.concentrations, self.indices)
+
+
+class AQIStandard:
+    """A national air quality index: per-pollutant breakpoint tables and category labels"""
+
+    def __init__(self, name, label, tables, categories):
+        self.name = name
+        self.label = label
+        self.tables = {table.pollutant: table for table in tables}
+        # (upper index, label) pairs; the last category is open-ended
+        self.category_limits = [limit for limit, _ in categories[:-1]]
+        self.category_labels = [category for _, category in categories]
+
+    def category(self, aqi):
+        return self.category_labels[bisect_left(self.category_limits, aqi)]
+
+    def categories(self, values):
+        """Category labels for a sequence or array of AQI values, as an object array (a list without NumPy)"""
+        if np is None:
+            return [self.category(value) for value in values]
+        labels = np.array(self.category_labels, dtype=object)
+        return labels[np.searchsorted(self.category_limits, np.asarray(values, dtype=float), side='left')]
+
+
+US_EPA = AQIStandard('us_epa', 'US EPA AQI', [
+    Breakpoints.bands('pm25', 'ug/m3', [
+        (0.0, 9.0, 0, 50), (9.1, 35.4, 51, 100), (35.5, 55.4, 101, 150),
+        (55.5, 125.4, 151, 200), (125.5, 225.4, 201, 300), (225.5, 325.4, 301, 500),
+    ], decimals=1),
+    Breakpoints.bands('pm10', 'ug/m3', [
+        (0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150),
+        (255, 354, 151, 200), (355, 424, 201, 300), (425, 604, 301, 500),
+    ], decimals=0),
+    # 8-hour ozone table; above 200 ppb it rises to the 1-hour Hazardous ceiling
+    Breakpoints.bands('o3', 'ppb', [
+        (0, 54, 0, 50), (55, 70, 51, 100), (71, 85, 101, 150),
+        (86, 105, 151, 200), (106, 200, 201, 300), (201, 604, 301, 500),
+    ], decimals=0),
+    Breakpoints.bands('no2', 'ppb', [
+        (0, 53, 0, 50), (54, 100, 51, 100), (101, 360, 101, 150),
+        (361, 649, 151, 200), (650, 1249, 201, 300), (1250, 2049, 301, 500),
+    ], decimals=0),
+    Breakpoints.bands('so2', 'ppb', [
+        (0, 35, 0, 50), (36, 75, 51, 100), (76, 185, 101, 150),
+        (186, 304, 151, 200), (305, 604, 201, 300), (605, 1004, 301, 500),
+    ], decimals=0),
+    Breakpoints.bands('co', 'ppm', [
+        (0.0, 4.4, 0, 50), (4.5, 9.4, 51, 100), (9.5, 12.4, 101, 150),
+        (12.5, 15.4, 151, 200), (15.5, 30.4, 201, 300), (30.5, 50.4, 301, 500),
+    ], decimals=1),
+], [
+    (50, 'Good'), (100, 'Moderate'), (150, 'Unhealthy for Sensitive Groups'),
+    (200, 'Unhealthy'), (300, 'Very Unhealthy'), (None, 'Hazardous'),
+])
+
+# The open-ended Severe band is closed at conventional ceilings so the index tops out at 500
+_NAQI_INDICES = (0, 50, 100, 200, 300, 400, 500)
+INDIA_NAQI = AQIStandard('india_naqi', 'India National AQI', [
+    Breakpoints.steps('pm25', 'ug/m3', _NAQI_INDICES, (0, 30, 60, 90, 120, 250, 380)),
+    Breakpoints.steps('pm10', 'ug/m3', _NAQI_INDICES, (0, 50, 100, 250, 350, 430, 510)),
+    Breakpoints.steps('o3', 'ug/m3', _NAQI_INDICES, (0, 50, 100, 168, 208, 748, 1000)),
+    Breakpoints.steps('no2', 'ug/m3', _NAQI_INDICES, (0, 40, 80, 180, 280, 400, 520)),
+    Breakpoints.steps('so2', 'ug/m3', _NAQI_INDICES, (0, 40, 80, 380, 800, 1600, 2100)),
+    Breakpoints.steps('co', 'mg/m3', _NAQI_INDICES, (0, 1, 2, 10, 17, 34, 46)),
+], [
+    (50, 'Good'), (100, 'Satisfactory'), (200, 'Moderate'),
+    (300, 'Poor'), (400, 'Very Poor'), (None, 'Severe'),
+])
+
+# HJ 633-2012 IAQI; hourly limits where the standard defines them, daily ones above
+_IAQI_INDICES = (0, 50, 100, 150, 200, 300, 400, 500)
+CHINA = AQIStandard('china', 'China AQI (HJ 633-2012)', [
+    Breakpoints.steps('pm25', 'ug/m3', _IAQI_INDICES, (0, 35, 75, 115, 150, 250, 350, 500)),
+    Breakpoints.steps('pm10', 'ug/m3', _IAQI_INDICES, (0, 50, 150, 250, 350, 420, 500, 600)),
+    Breakpoints.steps('o3', 'ug/m3', _IAQI_INDICES, (0, 160, 200, 300, 400, 800, 1000, 1200)),
+    Breakpoints.steps('no2', 'ug/m3', _IAQI_INDICES, (0, 100, 200, 700, 1200, 2340, 3090, 3840)),
+    Breakpoints.steps('so2', 'ug/m3', _IAQI_INDICES, (0, 150, 500, 650, 800, 1600, 2100, 2620)),
+    Breakpoints.steps('co', 'mg/m3', _IAQI_INDICES, (0, 5, 10, 35, 60, 90, 120, 150)),
+], [
+    (50, 'Excellent'), (100, 'Good'), (150, 'Lightly Polluted'),
+    (200, 'Moderately Polluted'), (300, 'Heavily Polluted'), (None, 'Severely Polluted'),
+])
+
+# Hourly background CAQI grid; readings beyond the grid score 100 (Very High)
+_CAQI_INDICES = (0, 25, 50, 75, 100)
+EU_CAQI = AQIStandard('eu_caqi', 'European CAQI', [
+    Breakpoints.steps('pm25', 'ug/m3', _CAQI_INDICES, (0, 15, 30, 55, 110)),
+    Breakpoints.steps('pm10', 'ug/m3', _CAQI_INDICES, (0, 25, 50, 90, 180)),
+    Breakpoints.steps('o3', 'ug/m3', _CAQI_INDICES, (0, 60, 120, 180, 240)),
+    Breakpoints.steps('no2', 'ug/m3', _CAQI_INDICES, (0, 50, 100, 200, 400)),
+    Breakpoints.steps('so2', 'ug/m3', _CAQI_INDICES, (0, 50, 100, 350, 500)),
+    Breakpoints.steps('co', 'ug/m3', _CAQI_INDICES, (0, 5000, 7500, 10000, 20000)),
+], [
+    (25, 'Very Low'), (50, 'Low'), (75, 'Medium'), (99, 'High'), (None, 'Very High'),
+])
+
+STANDARDS = {standard.name: standard for standard in (US_EPA, INDIA_NAQI, CHINA, EU_CAQI)}
+
+
+def get_standard(name):
+    """AQIStandard for a name like 'us_epa', raising ValueError for unknown names"""
+    if isinstance(name, AQIStandard):
+        return name
+    try:
+        return STANDARDS[str(name).strip().lower()]
+    except KeyError:
+        raise ValueError(f"Unknown AQI standard {name!r}; expected one of {', '.join(STANDARDS)}")
+
+
+def _present(value):
+    return value is not None and not (isinstance(value, float) and math.isnan(value))
+
+
+def compute_aqi(concentrations, standard=US_EPA):
+    """Overall AQI, category, dominant pollutant and sub-indices for one reading in µg/m³
+
+    The AQI is the highest sub-index; pollutants that are missing or not covered by
+    the standard are skipped. Provider readings are instantaneous, so the
+    standards' averaging periods are not applied.
+    """
+    standard = get_standard(standard)
+    sub_indices = {}
+    for pollutant in POLLUTANTS:
+        table = standard.tables.get(pollutant)
+        value = concentrations.get(pollutant)
+        if table is not None and _present(value):
+            sub_indices[pollutant] = int(table.sub_index(float(value)) + 0.5)
+
+    if not sub_indices:
+        return {'aqi': None, 'category': None, 'dominant_pollutant': None, 'sub_indices': {}, 'standard': standard.name}
+    # max() keeps the first of equal sub-indices, so ties go to the earlier pollutant
+    dominant = max(sub_indices, key=sub_indices.get)
+    aqi = sub_indices[dominant]
+    return {
+        'aqi': aqi,
+        'category': standard.category(aqi),
+        'dominant_pollutant': dominant,
+        'sub_indices': sub_indices,
+        'standard': standard.name,
+    }
+
+
+def compute_aqi_array(concentrations, standard=US_EPA):
+    """Score many readings at once from {pollutant: array of µg/m³ values}
+
+    Returns arrays aligned with the input: 'aqi' (NaN where no pollutant was
+    reported), 'dominant_pollutant' and 'category' ('' where there is no AQI), and
+    'sub_indices' per pollutant. Without NumPy the same result is built from
+    lists, one reading at a time.
+    """
+    standard = get_standard(standard)
+    pollutants = [p for p in POLLUTANTS if p in concentrations and p in standard.tables]
+    if np is None:
+        return _compute_aqi_lists(concentrations, pollutants, standard)
+
+    if not pollutants:
+        size = len(next(iter(concentrations.values()), ()))
+        return {
+            'aqi': np.full(size, np.nan),
+            'dominant_pollutant': np.full(size, '', dtype=object),
+            'category': np.full(size, '', dtype=object),
+            'sub_indices': {},
+        }
+
+    sub_indices = {}
+    for pollutant in pollutants:
+        values = np.asarray(concentrations[pollutant], dtype=float)
+        scores = np.floor(standard.tables[pollutant].sub_index_array(values) + 0.5)
+        scores[np.isnan(values)] = np.nan
+        sub_indices[pollutant] = scores
+
+    stacked = np.vstack([sub_indices[p] for p in pollutants])
+    reported = ~np.isnan(stacked).all(axis=0)
+    winner = np.argmax(np.where(np.isnan(stacked), -1.0, stacked), axis=0)
+    aqi = np.where(reported, np.take_along_axis(stacked, winner[None, :], axis=0)[0], np.nan)
+
+    names = np.array(pollutants, dtype=object)
+    return {
+        'aqi': aqi,
+        'dominant_pollutant': np.where(reported, names[winner], ''),
+        'category': np.where(reported, standard.categories(np.nan_to_num(aqi)), ''),
+        'sub_indices': sub_indices,
+    }
+
+
+def _compute_aqi_lists(concentrations, pollutants, standard):
+    columns = {p: list(concentrations[p]) for p in pollutants}
+    size = len(next(iter(concentrations.values()), ()))
+    result = {'aqi': [], 'dominant_pollutant': [], 'category': [], 'sub_indices': {p: [] for p in pollutants}}
+    for row in range(size):
+        scored = compute_aqi({p: columns[p][row] for p in pollutants}, standard)
+        result['aqi'].append(float('nan') if scored['aqi'] is None else float(scored['aqi']))
+        result['dominant_pollutant'].append(scored['dominant_pollutant'] or '')
+        result['category'].append(scored['category'] or '')
+        for p in pollutants:
+            result['sub_indices'][p].append(float(scored['sub_indices'].get(p, float('nan'))))
+    return result
@@ -0,0 +1,627 @@
+# Async serving mode. The hot read endpoints are served by async handlers with an
+# async HTTP client, so one process can hold thousands of in-flight requests;
+# every other route falls through to the Flask app. Run with:
+#   uvicorn asgi:app --host 0.0.0.0 --port 5000
+import asyncio
+import functools
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+import requests
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as backend
+from aqi import get_standard
+from cache import MISSING, normalize_key
+from http_client import RETRYABLE_STATUSES, CircuitOpenError, response_outcome
+from metrics import HTTP_SECONDS, REPORTS_COALESCED, STAGE_SECONDS, UPSTREAM_SECONDS, span
+from responses import prepare
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent connections to each provider from one process
+ASYNC_MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', '100'))
+
+# Failures a provider lookup swallows and reports as "no data"
+PROVIDER_ERRORS = (httpx.HTTPError, requests.RequestException, ValueError, KeyError)
+
+
+class AsyncProviderClient:
+    """httpx counterpart of ProviderClient, sharing its settings, counters and circuit breaker"""
+
+    def __init__(self, sync_client):
+        self.sync_client = sync_client
+        self.breaker = sync_client.breaker
+        self._client = None
+
+    @property
+    def client(self):
+        # Created inside the running event loop on first use
+        if self._client is None:
+            sync = self.sync_client
+            self._client = httpx.AsyncClient(
+                headers=sync.headers,
+                timeout=httpx.Timeout(sync.read_timeout, connect=sync.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=sync.pool_size,
+                ),
+            )
+        return self._client
+
+    async def get(self, url, params=None):
+        """GET with retries; raises CircuitOpenError or QuotaExceededError like ProviderClient.get"""
+        sync = self.sync_client
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {sync.name}, skipping request")
+        if sync.quota is not None:
+            try:
+                await self.acquire_quota(sync.quota)
+            except BaseException:
+                # Including a failed quota store: no call went upstream
+                self.breaker.release()
+                raise
+
+        sync.count('in_flight', 1)
+        started = time.perf_counter()
+        try:
+            response = await self._get_with_retries(url, params)
+        except httpx.HTTPError:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, provider=sync.name, outcome='error')
+            sync.count('failures', 1)
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Not an upstream failure (a bug, a cancelled request), but a half-open probe is handed back
+            self.breaker.release()
+            raise
+        finally:
+            sync.count('in_flight', -1)
+
+        UPSTREAM_SECONDS.observe(
+            time.perf_counter() - started, provider=sync.name, outcome=response_outcome(response.status_code)
+        )
+        if response.status_code in RETRYABLE_STATUSES:
+            sync.count('failures', 1)
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def acquire_quota(self, quota):
+        """ProviderQuota.acquire without blocking the event loop while waiting for a token"""
+        deadline = time.monotonic() + quota.max_wait
+        while True:
+            # One short SQLite transaction, which can wait on another process's lock
+            wait = await run_in_threadpool(quota.take)
+            if not wait:
+                return
+            if time.monotonic() + wait > deadline:
+                raise quota.exceeded(wait)
+            quota.waited += 1
+            await asyncio.sleep(wait)
+
+    async def _get_with_retries(self, url, params):
+        sync = self.sync_client
+        attempt = 0
+        while True:
+            sync.count('requests', 1)
+            try:
+                response = await self.client.get(url, params=params)
+                sync.check_throttled(response.status_code)
+                if response.status_code not in RETRYABLE_STATUSES or not sync.may_retry(attempt):
+                    return response
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if not sync.may_retry(attempt):
+                    raise
+            attempt += 1
+            sync.count('retries', 1)
+            await asyncio.sleep(random.uniform(0, sync.backoff * (2 ** attempt)))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+async_clients = {name: AsyncProviderClient(client) for name, client in backend.PROVIDER_CLIENTS.items()}
+
+
+class AsyncSingleFlight:
+    """Concurrent awaits for the same key share one task"""
+
+    def __init__(self):
+        self._tasks = {}
+
+    def start(self, key, factory):
+        """Return the task in flight for key, starting factory() if there is none"""
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return task
+
+    async def do(self, key, factory):
+        # Shielded so one caller giving up does not cancel the fetch for the others
+        return await asyncio.shield(self.start(key, factory))
+
+
+flights = AsyncSingleFlight()
+# Identical report requests in flight in this process (see app.coalesced_report)
+report_flights = AsyncSingleFlight()
+
+
+async def fetch_json(provider, url, params):
+    response = await async_clients[provider].get(url, params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+async def cached(cache, key, fetch, ttl=None):
+    """Async read-through for a StaleWhileRevalidateCache, with the same fresh/stale/miss rules
+
+    Reads and writes that reach the cache's shared SQLite tier run on the thread
+    pool; a fresh entry in memory is returned without leaving the event loop.
+    """
+    if cache.shared is None or cache.is_fresh(key, ttl):
+        value, state = cache.lookup(key, ttl)
+    else:
+        value, state = await run_in_threadpool(cache.lookup, key, ttl)
+    if state == 'fresh':
+        return value
+
+    async def fetch_and_store():
+        result = await fetch()
+        if result is not None:
+            if cache.shared is None:
+                cache.set(key, result, ttl)
+            else:
+                await run_in_threadpool(cache.set, key, result, ttl)
+        return result
+
+    flight_key = (id(cache), key)
+    if state == 'stale':
+        flights.start(flight_key, fetch_and_store)
+        return value
+    return await flights.do(flight_key, fetch_and_store)
+
+
+async def cached_aqi_reading(provider, lat, lon, url, params, parse):
+    """Async version of app.cached_aqi_reading"""
+    async def fetch():
+        try:
+            return backend.record_reading(provider, lat, lon, parse(await fetch_json(provider, url, params)))
+        except PROVIDER_ERRORS as e:
+            logger.warning("AQI lookup failed", extra={'provider': provider, 'lat': lat, 'lon': lon, 'error': str(e)})
+            return None
+
+    key = (provider,) + backend.snap_to_grid(lat, lon)
+    aqi_data = await cached(backend.aqi_cache, key, fetch, backend.AQI_CACHE_TTL_SECONDS[provider])
+    return dict(aqi_data) if aqi_data else None
+
+
+async def get_aqi_from_weather_api_coords(lat, lon):
+    return await cached_aqi_reading(
+        'weatherapi', lat, lon, backend.WEATHER_API_URL,
+        backend.weather_api_params(f"{lat},{lon}"), backend.parse_weather_api_aqi
+    )
+
+
+async def get_aqi_from_openweather(lat, lon):
+    return await cached_aqi_reading(
+        'openweather', lat, lon, backend.OPEN_WEATHER_AQI_URL,
+        backend.openweather_params(lat, lon), backend.parse_openweather_aqi
+    )
+
+
+async def get_aqi_from_waqi(lat, lon):
+    return await cached_aqi_reading(
+        'waqi', lat, lon, backend.waqi_geo_url(lat, lon), {'token': backend.IQAIR_API_KEY}, backend.parse_waqi_aqi
+    )
+
+
+# Async counterparts of app.FUSION_PROVIDERS
+FUSION_PROVIDERS = {
+    'weatherapi': get_aqi_from_weather_api_coords,
+    'openweather': get_aqi_from_openweather,
+    'waqi': get_aqi_from_waqi,
+}
+
+
+async def get_aqi_from_weather_api(location):
+    try:
+        data = await fetch_json('weatherapi', backend.WEATHER_API_URL, backend.weather_api_params(location))
+        return backend.parse_weather_api_aqi(data)
+    except PROVIDER_ERRORS as e:
+        logger.warning("WeatherAPI lookup failed", extra={'provider': 'weatherapi', 'location': location, 'error': str(e)})
+        return None
+
+
+async def get_country_from_location(location):
+    """Async version of app.get_country_from_location, sharing its geocode cache"""
+    key = normalize_key(location)
+    cached_location = backend.geocode_cache.memory.get(key)
+    if cached_location is MISSING:
+        cached_location = await run_in_threadpool(backend.geocode_cache.load, key)
+    if cached_location is not MISSING:
+        return dict(cached_location) if cached_location else backend.unresolved_location(location)
+
+    try:
+        results = await flights.do(
+            ('geocode', key),
+            lambda: fetch_json('nominatim', backend.NOMINATIM_URL, backend.nominatim_params(location))
+        )
+    except PROVIDER_ERRORS as e:
+        logger.warning("Geocoding failed", extra={'provider': 'nominatim', 'location': location, 'error': str(e)})
+        return backend.unresolved_location(location)
+
+    return await run_in_threadpool(
+        backend.store_geocode_result, location, backend.parse_geocode_results(results, location)
+    )
+
+
+async def fetch_news_articles(query, limit):
+    """Async version of app.fetch_news_articles"""
+    with span('news_query'):
+        data = await fetch_json('newsapi', backend.NEWS_API_URL, backend.news_query_params(query, limit))
+        return backend.parse_news_articles(data)
+
+
+async def fetch_pollution_news(city, country=None, limit=5):
+    """Async version of app.fetch_pollution_news"""
+    search_queries = backend.news_search_queries(city, country)
+    tasks = [asyncio.ensure_future(fetch_news_articles(query, limit)) for query in search_queries]
+    news_items = []
+    seen_urls = set()
+    failed = 0
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                articles = await next_done
+            except PROVIDER_ERRORS as e:
+                failed += 1
+                logger.warning("News query failed", extra={'provider': 'newsapi', 'city': city, 'error': str(e)})
+                continue
+            if backend.collect_news_articles(articles, news_items, seen_urls, limit):
+                return news_items
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if failed == len(search_queries):
+        return None
+    return news_items
+
+
+async def get_pollution_news(city, country=None, limit=5):
+    key = (normalize_key(city), country, limit)
+    news = await cached(backend.news_cache, key, lambda: fetch_pollution_news(city, country, limit))
+    return list(news or [])
+
+
+class AsyncRequestPipeline(backend.RequestPipeline):
+    """RequestPipeline whose lookups are asyncio tasks instead of thread pool futures"""
+
+    def submit(self, name, coroutine):
+        call = {'status': 'pending', 'started': time.monotonic(), 'elapsed_ms': None}
+        self._calls[name] = call
+
+        async def run():
+            try:
+                result = await coroutine
+            except Exception:
+                call['status'] = 'error'
+                raise
+            else:
+                call['status'] = 'ok' if result else 'no_data'
+                return result
+            finally:
+                elapsed = time.monotonic() - call['started']
+                call['elapsed_ms'] = round(elapsed * 1000, 1)
+                STAGE_SECONDS.observe(elapsed, stage=name, outcome=call['status'])
+
+        task = asyncio.ensure_future(run())
+        call['future'] = task
+        return task
+
+    async def result(self, task, default=None):
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.remaining())
+        except asyncio.TimeoutError:
+            return default
+        except Exception as e:
+            logger.warning("Provider lookup failed", extra={'error': str(e)})
+            return default
+
+    async def call(self, name, coroutine, default=None):
+        return await self.result(self.submit(name, coroutine), default)
+
+
+async def fetch_aqi_hedged(pipeline, lat, lon):
+    """Async version of app.fetch_aqi_hedged"""
+    primary = pipeline.submit('weatherapi', get_aqi_from_weather_api_coords(lat, lon))
+    await asyncio.wait([primary], timeout=min(backend.AQI_HEDGE_DELAY_SECONDS, pipeline.remaining()))
+    if primary.done():
+        aqi_data = await pipeline.result(primary)
+        if aqi_data:
+            return aqi_data
+        pending = set()
+    else:
+        pending = {primary}
+
+    pending.add(pipeline.submit('openweather', get_aqi_from_openweather(lat, lon)))
+
+    while pending and pipeline.remaining() > 0:
+        done, pending = await asyncio.wait(
+            pending, timeout=pipeline.remaining(), return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in sorted(done, key=lambda t: t is not primary):
+            aqi_data = await pipeline.result(task)
+            if aqi_data:
+                return aqi_data
+
+    return None
+
+
+async def fetch_aqi_fused(pipeline, lat, lon):
+    """Async version of app.fetch_aqi_fused"""
+    cell = backend.snap_to_grid(lat, lon)
+    readings = {}
+    fetches = {}
+    for name, get in FUSION_PROVIDERS.items():
+        if backend.aqi_cache.peek((name,) + cell) is MISSING:
+            fetches[pipeline.submit(name, get(lat, lon))] = name
+            continue
+        reading = await pipeline.call(name, get(lat, lon))
+        if reading:
+            readings[name] = reading
+    pending = set(fetches)
+    while not readings and pending and pipeline.remaining() > 0:
+        done, pending = await asyncio.wait(
+            pending, timeout=pipeline.remaining(), return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in done:
+            reading = await pipeline.result(task)
+            if reading:
+                readings[fetches[task]] = reading
+    return backend.fused_reading(readings, lat, lon)
+
+
+async def build_pollution_report(location, coordinates=None, aqi_standard=None, fusion=False, fields=None):
+    """Async version of app.build_pollution_report"""
+    pipeline = AsyncRequestPipeline()
+    city_name = location.strip()
+
+    if coordinates:
+        location_data = backend.reverse_geocoder.resolve(*coordinates)
+        city_name = location_data.get('city')
+    else:
+        location_data = await pipeline.call(
+            'nominatim', get_country_from_location(location), default=backend.unresolved_location(location)
+        )
+    country = location_data.get('country')
+    lat = location_data.get('lat')
+    lon = location_data.get('lon')
+
+    news_task = None
+    if city_name and backend.wants(fields, 'pollution_news'):
+        news_task = pipeline.submit('newsapi', get_pollution_news(city_name, country, 5))
+
+    aqi_data = None
+    need_aqi = backend.wants(fields, 'aqi_data', 'aqi_level')
+    if need_aqi and lat is not None and lon is not None:
+        aqi_data = await (fetch_aqi_fused if fusion else fetch_aqi_hedged)(pipeline, lat, lon)
+
+    if need_aqi and not aqi_data and not coordinates and pipeline.remaining() > 0:
+        aqi_data = await pipeline.call('weatherapi_name', get_aqi_from_weather_api(location))
+
+    if need_aqi and not aqi_data:
+        return {
+            'error': 'Unable to fetch pollution data for this location',
+            'location': location,
+            'providers': pipeline.report()
+        }, 404
+
+    pollution_news = None
+    if backend.wants(fields, 'pollution_news'):
+        pollution_news = await pipeline.result(news_task, default=[]) if news_task else []
+    return backend.assemble_report(
+        location, location_data, aqi_data, pollution_news, pipeline.report(), aqi_standard, fields
+    ), 200
+
+
+def json_response(payload, status=200):
+    # Same open CORS policy the Flask app gets from flask_cors
+    return JSONResponse(payload, status_code=status, headers={'Access-Control-Allow-Origin': '*'})
+
+
+def body_response(request, body, status=200, max_age=None):
+    """Native counterpart of app.body_response and app.encode_response"""
+    headers = {'Access-Control-Allow-Origin': '*'}
+    if max_age is not None:
+        headers['Cache-Control'] = f'public, max-age={max_age}'
+    data, representation = prepare(
+        body, request.headers.get('accept-encoding'), request.headers.get('if-none-match'),
+        backend.COMPRESS_MIN_BYTES
+    )
+    headers.update(representation)
+    if data is None:
+        return Response(status_code=304, headers=headers)
+    return Response(data, status_code=status, media_type='application/json', headers=headers)
+
+
+def timed(endpoint):
+    """Record a native route's latency in the same histogram the Flask routes use"""
+    def decorate(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            started = time.perf_counter()
+            response = await handler(request)
+            HTTP_SECONDS.observe(
+                time.perf_counter() - started, endpoint=endpoint, method=request.method, status=response.status_code
+            )
+            return response
+        return wrapper
+    return decorate
+
+
+async def coalesced_report(location, coordinates, aqi_standard, fusion, fields):
+    """Async version of app.coalesced_report; reports are shared within this process only"""
+    built = False
+
+    async def lead():
+        nonlocal built
+        built = True
+        payload, status = await build_pollution_report(location, coordinates, aqi_standard, fusion, fields)
+        if status != 200:
+            return payload, status, None
+        with span('serialize'):
+            return payload, status, backend.report_body(backend.select_fields(payload, fields))
+
+    if not backend.REPORT_COALESCING:
+        return await lead()
+    result = await report_flights.do(backend.report_key(location, coordinates, aqi_standard, fusion, fields), lead)
+    if not built:
+        REPORTS_COALESCED.inc(scope='worker')
+    return result
+
+
+@timed('/api/pollution-data')
+async def get_pollution_data(request):
+    try:
+        location, coordinates = backend.parse_report_request(request.query_params)
+        aqi_standard = get_standard(request.query_params.get('aqi_standard') or backend.AQI_STANDARD).name
+        fields = backend.parse_fields(
+            request.query_params.getlist('fields') + request.query_params.getlist('include')
+        )
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+
+    payload, status, body = await coalesced_report(
+        location, coordinates, aqi_standard, backend.fusion_requested(request.query_params.get('fusion')), fields
+    )
+    if status != 200:
+        return json_response(payload, status)
+    if not coordinates:
+        backend.prefetcher.record(location)
+    return body_response(request, body, max_age=backend.report_max_age(payload))
+
+
+@timed('/api/pollution-stream')
+async def get_pollution_stream(request):
+    """Async version of app.get_pollution_stream; an open stream costs no thread"""
+    try:
+        locations, coordinates = backend.parse_live_request(request.query_params)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+
+    resolved = []
+    for location in locations:
+        location_data = await get_country_from_location(location)
+        if location_data.get('lat') is None or location_data.get('lon') is None:
+            return json_response({'error': 'Unable to resolve this location', 'location': location}, 404)
+        resolved.append((location, location_data['lat'], location_data['lon']))
+    if coordinates:
+        resolved.append((f"{coordinates[0]},{coordinates[1]}", *coordinates))
+    cells = backend.live_cells(resolved)
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue(maxsize=backend.LIVE_QUEUE_SIZE)
+    lagging = []
+
+    def enqueue(item):
+        try:
+            events.put_nowait(item)
+        except asyncio.QueueFull:
+            lagging.append(item[0])
+
+    def deliver(cell, event):
+        # The hub publishes from its own thread
+        loop.call_soon_threadsafe(enqueue, (cell, event))
+
+    async def snapshot(cell):
+        reading = await loop.run_in_executor(None, backend.live_hub.current, cell)
+        return backend.live_messages(cells, cell, 'snapshot', backend.live_snapshot(reading))
+
+    async def generate():
+        # Subscribed once the stream starts, so a client gone before then leaves nothing behind
+        subscription = backend.live_hub.subscribe(cells, deliver)
+        try:
+            for cell in cells:
+                yield await snapshot(cell)
+            while True:
+                if lagging:
+                    while not events.empty():
+                        events.get_nowait()
+                    for cell in cells:
+                        yield await snapshot(cell)
+                    lagging.clear()
+                try:
+                    cell, event = await asyncio.wait_for(events.get(), backend.LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield backend.live_messages(cells, cell, 'update', backend.live_update(event))
+        finally:
+            backend.live_hub.unsubscribe(subscription)
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        'Access-Control-Allow-Origin': '*',
+    })
+
+
+@timed('/api/health-tips')
+async def get_health_tips(request):
+    params = request.query_params
+    try:
+        body = backend.health_tips_body(
+            params.get('aqi_level', 'Moderate'), params.get('locale'), params.get('pollutant'), params.get('aqi_standard')
+        )
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    return body_response(request, body, max_age=backend.STATIC_MAX_AGE_SECONDS)
+
+
+@timed('/api/pollution-sources')
+async def get_pollution_sources(request):
+    return body_response(request, backend.pollution_sources_body(), max_age=backend.STATIC_MAX_AGE_SECONDS)
+
+
+@timed('/health')
+async def health_check(request):
+    return json_response({'status': 'Backend is running'})
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    if backend.PREFETCH_ENABLED:
+        backend.prefetcher.start()
+    yield
+    for client in async_clients.values():
+        await client.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/pollution-data', get_pollution_data, methods=['GET']),
+        Route('/api/pollution-stream', get_pollution_stream, methods=['GET']),
+        Route('/api/health-tips', get_health_tips, methods=['GET']),
+        Route('/api/pollution-sources', get_pollution_sources, methods=['GET']),
+        Route('/health', health_check, methods=['GET']),
+        # Batch, stats and any other route are served by the Flask app on a thread pool
+        Mount('/', app=WSGIMiddleware(backend.app)),
+    ],
+    lifespan=lifespan,
+)
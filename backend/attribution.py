@@ -0,0 +1,169 @@
+import json
+import math
+import re
+import unicodedata
+
+EARTH_RADIUS_KM = 6371.0
+
+_DROPPED_PUNCTUATION = re.compile(r"[.'’]")
+_SEPARATORS = re.compile(r'[^\w\s]')
+
+
+def normalize_place_name(name):
+    """Fold case, accents and punctuation so 'L.A.' matches 'la' and 'République' matches 'republique'"""
+    text = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = _DROPPED_PUNCTUATION.sub('', text.casefold())
+    return ' '.join(_SEPARATORS.sub(' ', text).split())
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class SpatialGrid:
+    """Points bucketed into fixed-size lat/lon cells for nearest-neighbour search within a radius"""
+
+    def __init__(self, cell_degrees=1.0):
+        self.cell_degrees = cell_degrees
+        self._cells = {}
+
+    def _cell(self, lat, lon):
+        return math.floor((lat + 90) / self.cell_degrees), math.floor((lon + 180) / self.cell_degrees)
+
+    def add(self, lat, lon, item):
+        self._cells.setdefault(self._cell(lat, lon), []).append((lat, lon, item))
+
+    def nearest(self, lat, lon, radius_km):
+        """Return (item, distance_km) for the closest point within radius_km, or (None, None)"""
+        # Only the cells the search circle can touch are scanned; columns wrap at the antimeridian
+        lat_span = radius_km / 111.0
+        lon_span = radius_km / max(111.0 * math.cos(math.radians(lat)), 1e-6)
+        row, col = self._cell(lat, lon)
+        columns_around = math.ceil(360 / self.cell_degrees)
+        rows = math.ceil(lat_span / self.cell_degrees)
+        # Near the poles the circle spans every column; scan each of them once
+        cols = min(math.ceil(lon_span / self.cell_degrees), columns_around // 2 + 1)
+        columns = {c % columns_around for c in range(col - cols, col + cols + 1)}
+
+        best, best_distance = None, None
+        for r in range(row - rows, row + rows + 1):
+            for c in columns:
+                for point_lat, point_lon, item in self._cells.get((r, c), ()):
+                    distance = haversine_km(lat, lon, point_lat, point_lon)
+                    if distance <= radius_km and (best_distance is None or distance < best_distance):
+                        best, best_distance = item, distance
+        return best, best_distance
+
+    def __len__(self):
+        return sum(len(points) for points in self._cells.values())
+
+
+class SourceAttributionIndex:
+    """Resolves a requested location to a known city (and country) with source-attribution data
+
+    Names and aliases are matched after normalization in constant time. A name
+    match only counts if the geocoded place is in the city's country or within
+    ``radius_km`` of it, so 'Paris, Texas' does not get Paris, France; otherwise
+    the geocoded coordinates are matched to the nearest known city centroid
+    within ``radius_km`` through a spatial grid.
+    """
+
+    def __init__(self, radius_km=50, cell_degrees=1.0):
+        self.radius_km = radius_km
+        self._cities = {}
+        # canonical city name -> (normalized country name, lat, lon)
+        self._places = {}
+        self._countries = {}
+        self._grid = SpatialGrid(cell_degrees)
+
+    @classmethod
+    def from_file(cls, path, known_cities=None, known_countries=None, **kwargs):
+        """Build the index from a places JSON file, keeping only places we hold data for"""
+        with open(path, encoding='utf-8') as f:
+            places = json.load(f)
+        index = cls(**kwargs)
+        for city in places.get('cities', []):
+            if known_cities is None or city['name'] in known_cities:
+                index.add_city(
+                    city['name'], city['lat'], city['lon'], city.get('aliases', ()), country=city.get('country')
+                )
+        for country in places.get('countries', []):
+            if known_countries is None or country['name'] in known_countries:
+                index.add_country(country['name'], country.get('aliases', ()))
+        return index
+
+    def add_city(self, name, lat, lon, aliases=(), country=None):
+        for alias in (name, *aliases):
+            self._cities.setdefault(normalize_place_name(alias), name)
+        self._places[name] = (normalize_place_name(country) if country else None, lat, lon)
+        self._grid.add(lat, lon, name)
+
+    def add_country(self, name, aliases=()):
+        for alias in (name, *aliases):
+            self._countries.setdefault(normalize_place_name(alias), name)
+
+    def city_by_name(self, text):
+        """Canonical city for a name like 'new york', 'NYC' or 'Delhi, India'"""
+        if not text:
+            return None
+        key = normalize_place_name(text)
+        if key in self._cities:
+            return self._cities[key]
+        # 'Delhi, India' / 'Paris, France': try the part before the first comma
+        head = normalize_place_name(str(text).split(',', 1)[0])
+        return self._cities.get(head)
+
+    def city_near(self, lat, lon):
+        """Closest known city within the match radius of a coordinate"""
+        if lat is None or lon is None:
+            return None
+        city, _ = self._grid.nearest(lat, lon, self.radius_km)
+        return city
+
+    def country_by_name(self, text):
+        if not text:
+            return None
+        return self._countries.get(normalize_place_name(text))
+
+    def is_consistent(self, city, location_data):
+        """Whether a city matched by name agrees with where the request was geocoded to
+
+        True if the geocoded country is the city's country or the geocoded point is
+        within the match radius; with neither known there is nothing to contradict it.
+        """
+        city_country, city_lat, city_lon = self._places[city]
+        country = location_data.get('country')
+        lat, lon = location_data.get('lat'), location_data.get('lon')
+        if country and city_country:
+            key = normalize_place_name(country)
+            canonical = self._countries.get(key)
+            if key == city_country or (canonical and normalize_place_name(canonical) == city_country):
+                return True
+        if lat is not None and lon is not None:
+            return haversine_km(lat, lon, city_lat, city_lon) <= self.radius_km
+        return not (country and city_country)
+
+    def match_city(self, location, location_data):
+        """Known city for a request: the query text, then the geocoded city name, then the coordinates
+
+        Name matches that contradict the geocoded country and coordinates are skipped.
+        """
+        for name in (location, location_data.get('city')):
+            city = self.city_by_name(name)
+            if city and self.is_consistent(city, location_data):
+                return city
+        return self.city_near(location_data.get('lat'), location_data.get('lon'))
+
+    def stats(self):
+        return {
+            'city_names': len(self._cities),
+            'city_points': len(self._grid),
+            'country_names': len(self._countries),
+            'radius_km': self.radius_km,
+        }
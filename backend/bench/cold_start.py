@@ -0,0 +1,97 @@
+"""Time from launching gunicorn (with gunicorn.conf.py) to the first successful report, against stub providers
+
+Each run starts the backend from scratch with an empty cache directory and
+polls --path until it answers 200, so the time covers importing the app,
+forking the workers and one uncached report. Prints every run and the
+median, and exits with status 1 if the median is above --target seconds:
+
+    python bench/cold_start.py --runs 5 --target 1.0
+    python bench/cold_start.py --env GUNICORN_PRELOAD=false
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from run import BACKEND_DIR, free_port
+from stub_server import add_fault_arguments, start_stub_server
+
+
+def cold_start(args, stub):
+    """Seconds until the first 200 from a freshly started backend, and that response's body"""
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix='pollution-cold-start-') as cache_dir:
+        env = dict(os.environ)
+        env.update(stub.backend_env())
+        env.update({
+            'CACHE_DIR': cache_dir,
+            'PORT': str(port),
+            'WEB_CONCURRENCY': str(args.workers),
+            'FLASK_DEBUG': '0',
+            'LOG_LEVEL': 'WARNING',
+            'QUOTA_ENABLED': 'false',
+        })
+        for setting in args.env or ():
+            name, _, value = setting.partition('=')
+            env[name] = value
+        url = f'http://127.0.0.1:{port}' + args.path
+        log_path = os.path.join(cache_dir, 'backend.log')
+        with open(log_path, 'wb') as log:
+            started = time.perf_counter()
+            process = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+            )
+        try:
+            deadline = started + args.timeout
+            while time.perf_counter() < deadline and process.poll() is None:
+                try:
+                    response = requests.get(url, timeout=args.timeout)
+                    if response.status_code == 200:
+                        return time.perf_counter() - started
+                except requests.ConnectionError:
+                    pass
+                time.sleep(0.005)
+            with open(log_path, encoding='utf-8', errors='replace') as log:
+                tail = ''.join(log.readlines()[-20:])
+            raise RuntimeError(f"backend did not answer {args.path} with 200:\n{tail}")
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes (WEB_CONCURRENCY)')
+    parser.add_argument('--path', default='/api/pollution-data?location=Delhi',
+                        help='request that has to succeed (default: an uncached report)')
+    parser.add_argument('--target', type=float, default=1.0, help='highest acceptable median, in seconds')
+    parser.add_argument('--timeout', type=float, default=30, help='give up on a run after this many seconds')
+    parser.add_argument('--env', action='append', metavar='NAME=VALUE',
+                        help='extra backend environment, e.g. GUNICORN_PRELOAD=false (repeatable)')
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    stub = start_stub_server(args)
+    try:
+        timings = []
+        for run in range(1, args.runs + 1):
+            timings.append(cold_start(args, stub))
+            print(f"run {run}: {timings[-1] * 1000:.0f} ms")
+    finally:
+        stub.shutdown()
+
+    median = statistics.median(timings)
+    print(f"median {median * 1000:.0f} ms, best {min(timings) * 1000:.0f} ms, target {args.target * 1000:.0f} ms")
+    if median > args.target:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Compare two run.py result files level by level and flag regressions
+
+    python bench/compare.py before.json after.json --threshold 0.1
+
+Exits with status 1 when, at any concurrency level present in both runs,
+req/s dropped or p95/p99 latency rose by more than the threshold, or the
+error count went up.
+"""
+import argparse
+import json
+import sys
+
+
+def change(before, after):
+    if not before or after is None:
+        return None
+    return (after - before) / before
+
+
+def format_change(value):
+    return '     n/a' if value is None else f'{value * 100:+7.1f}%'
+
+
+def compare(before, after, threshold):
+    """(rows, regressions) for the concurrency levels both runs measured"""
+    previous = {level['concurrency']: level for level in before['levels']}
+    rows, regressions = [], []
+    for level in after['levels']:
+        old = previous.get(level['concurrency'])
+        if old is None:
+            continue
+        deltas = {
+            'req/s': change(old['requests_per_second'], level['requests_per_second']),
+            'p50': change(old['latency_ms']['p50'], level['latency_ms']['p50']),
+            'p95': change(old['latency_ms']['p95'], level['latency_ms']['p95']),
+            'p99': change(old['latency_ms']['p99'], level['latency_ms']['p99']),
+        }
+        rows.append((level['concurrency'], old, level, deltas))
+        if deltas['req/s'] is not None and deltas['req/s'] < -threshold:
+            regressions.append(f"c={level['concurrency']}: req/s {format_change(deltas['req/s']).strip()}")
+        for name in ('p95', 'p99'):
+            if deltas[name] is not None and deltas[name] > threshold:
+                regressions.append(f"c={level['concurrency']}: {name} {format_change(deltas[name]).strip()}")
+        if level['errors'] > old['errors']:
+            regressions.append(f"c={level['concurrency']}: errors {old['errors']} -> {level['errors']}")
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative change counted as a regression (default 0.10)')
+    args = parser.parse_args()
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)
+
+    print(f"before: {before.get('label') or ''} {before.get('git_commit') or ''} {before['created_at']}")
+    print(f"after:  {after.get('label') or ''} {after.get('git_commit') or ''} {after['created_at']}")
+    if before['config'] != after['config']:
+        print("warning: the runs used different settings; compare with care")
+    print(f"{'conc':>6} {'req/s':>17} {'':>8} {'p95 ms':>17} {'':>8} {'p99 ms':>17} {'':>8}")
+    rows, regressions = compare(before, after, args.threshold)
+    for concurrency, old, new, deltas in rows:
+        cells = []
+        for name, old_value, new_value in (
+            ('req/s', old['requests_per_second'], new['requests_per_second']),
+            ('p95', old['latency_ms']['p95'], new['latency_ms']['p95']),
+            ('p99', old['latency_ms']['p99'], new['latency_ms']['p99']),
+        ):
+            cells.append(f"{old_value:>8} {new_value:>8} {format_change(deltas[name])}")
+        print(f"{concurrency:>6} " + ' '.join(cells))
+
+    if regressions:
+        print("Regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("No regressions above the threshold")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Refresh the stub server fixtures from the real providers
+
+Uses the API keys from backend/.env (or the environment) and records one
+response per provider for --location:
+
+    python bench/record_fixtures.py --location Delhi
+"""
+import argparse
+import json
+import os
+
+import requests
+from dotenv import load_dotenv
+
+from stub_server import FIXTURE_DIR
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_AGENT = 'PollutionSourceFinder/1.0 (benchmark fixtures)'
+
+
+def record(location):
+    """Provider name -> recorded JSON response"""
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+
+    def get(url, **params):
+        response = session.get(url, params=params, timeout=15)
+        response.raise_for_status()
+        return response.json()
+
+    places = get('https://nominatim.openstreetmap.org/search', q=location, format='json', limit=1, addressdetails=1)
+    if not places:
+        raise SystemExit(f"Nominatim found nothing for {location!r}")
+    lat, lon = places[0]['lat'], places[0]['lon']
+    return {
+        'nominatim': places,
+        'weatherapi': get('https://api.weatherapi.com/v1/current.json',
+                          key=os.getenv('WEATHER_API_KEY'), q=f'{lat},{lon}', aqi='yes'),
+        'openweather': get('https://api.openweathermap.org/data/2.5/air_pollution',
+                           lat=lat, lon=lon, appid=os.getenv('OPEN_WEATHER_API_KEY')),
+        'waqi': get(f'https://api.waqi.info/feed/{location}/', token=os.getenv('IQAIR_API_KEY')),
+        'newsapi': get('https://newsapi.org/v2/everything', q=f'{location} air pollution',
+                       apiKey=os.getenv('NEWS_API_KEY'), sortBy='publishedAt', language='en', pageSize=12),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--location', default='Delhi')
+    parser.add_argument('--output', default=FIXTURE_DIR, help='fixture directory to write')
+    args = parser.parse_args()
+    load_dotenv(os.path.join(BACKEND_DIR, '.env'))
+
+    os.makedirs(args.output, exist_ok=True)
+    for provider, body in record(args.location).items():
+        path = os.path.join(args.output, f'{provider}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(body, f, indent=2, ensure_ascii=False)
+        print(f"Recorded {provider} -> {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""Throughput and latency of the backend under a concurrency sweep, against stub providers
+
+Starts the stub providers (stub_server.py) and the backend configured to use
+them, then for each concurrency level keeps that many requests in flight for
+--duration seconds and records req/s and latency percentiles. Results are
+written as JSON for compare.py:
+
+    python bench/run.py --concurrency 1,8,32 --duration 15 --latency 0.15 --output before.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import requests
+
+from stub_server import add_fault_arguments, start_stub_server
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def backend_command(server, port, workers):
+    bind = f'127.0.0.1:{port}'
+    if server == 'flask':
+        return [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--host', '127.0.0.1', '--port', str(port),
+                '--with-threads', '--no-reload', '--no-debugger']
+    if server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '--bind', bind, '--workers', str(workers), 'app:app']
+    if server == 'asgi':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+                '--workers', str(workers), '--log-level', 'warning']
+    raise ValueError(f"unknown server {server!r}")
+
+
+def start_backend(args, stub, cache_dir):
+    """Launch the backend on a free port with every provider pointed at the stub"""
+    port = free_port()
+    env = dict(os.environ)
+    env.update(stub.backend_env())
+    env.update({
+        'CACHE_DIR': cache_dir,
+        'FLASK_DEBUG': '0',
+        'LOG_LEVEL': 'WARNING',
+        'PREFETCH_ENABLED': 'false',
+        # The stubs have no usage limits, and a sweep would exhaust the real budgets
+        'QUOTA_ENABLED': 'false',
+    })
+    for setting in args.env or ():
+        name, _, value = setting.partition('=')
+        env[name] = value
+    # Server and access logs go to a file so they do not interleave with the results table
+    log_path = os.path.join(cache_dir, 'backend.log')
+    with open(log_path, 'wb') as log:
+        process = subprocess.Popen(
+            backend_command(args.server, port, args.workers), cwd=BACKEND_DIR, env=env,
+            stdout=log, stderr=subprocess.STDOUT
+        )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            if requests.get(base_url + '/health', timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    if process.poll() is None:
+        process.terminate()
+    with open(log_path, encoding='utf-8', errors='replace') as log:
+        tail = ''.join(log.readlines()[-20:])
+    raise RuntimeError(f"backend did not become healthy:\n{tail}")
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+class LocationPool:
+    """Location names for successive requests
+
+    With size 0 every request asks for a new location, so every request misses
+    the backend caches; otherwise requests cycle through ``size`` locations and
+    mostly hit them.
+    """
+
+    def __init__(self, size):
+        run = uuid.uuid4().hex[:6]
+        self._names = itertools.cycle([f'Bench {run} {n}' for n in range(size)]) if size else None
+        self._counter = itertools.count()
+        self._run = run
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            if self._names is not None:
+                return next(self._names)
+            return f'Bench {self._run} {next(self._counter)}'
+
+
+def run_level(base_url, path, pool, concurrency, duration, timeout):
+    """Keep ``concurrency`` requests in flight for ``duration`` seconds"""
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker():
+        session = requests.Session()
+        local_latencies, local_statuses = [], {}
+        while time.perf_counter() < stop_at:
+            url = base_url + path.format(location=requests.utils.quote(pool.next()))
+            started = time.perf_counter()
+            try:
+                status = str(session.get(url, timeout=timeout).status_code)
+            except requests.RequestException as e:
+                status = type(e).__name__
+            local_latencies.append(time.perf_counter() - started)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        session.close()
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+
+def summarize(concurrency, latencies, statuses, elapsed, upstream):
+    ordered = sorted(latencies)
+    requests_made = len(ordered)
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        'concurrency': concurrency,
+        'requests': requests_made,
+        'errors': errors,
+        'statuses': statuses,
+        'duration_seconds': round(elapsed, 3),
+        'requests_per_second': round(requests_made / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': ms(sum(ordered) / requests_made) if requests_made else None,
+            'p50': ms(percentile(ordered, 0.50)),
+            'p95': ms(percentile(ordered, 0.95)),
+            'p99': ms(percentile(ordered, 0.99)),
+            'max': ms(ordered[-1]) if ordered else None,
+        },
+        'upstream_requests': upstream,
+        'upstream_per_request': {
+            provider: round(counts['requests'] / requests_made, 3) if requests_made else None
+            for provider, counts in upstream.items()
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_level(result):
+    latency = result['latency_ms']
+    print(f"{result['concurrency']:>6} {result['requests']:>8} {result['requests_per_second']:>9} "
+          f"{latency['p50']:>8} {latency['p95']:>8} {latency['p99']:>8} {result['errors']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', default='1,4,16,32',
+                        help='comma-separated concurrency levels to sweep')
+    parser.add_argument('--duration', type=float, default=10, help='measured seconds per level')
+    parser.add_argument('--warmup', type=float, default=2, help='unmeasured seconds before each level')
+    parser.add_argument('--path', default='/api/pollution-data?location={location}',
+                        help='request path; {location} is replaced by a name from the location pool')
+    parser.add_argument('--locations', type=int, default=0,
+                        help='distinct locations to cycle through (0: a new one per request, all cache misses)')
+    parser.add_argument('--timeout', type=float, default=30, help='client timeout per request')
+    parser.add_argument('--server', choices=('flask', 'gunicorn', 'asgi'), default='gunicorn',
+                        help='how to serve the backend (gunicorn matches the Docker image)')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn or uvicorn worker processes')
+    parser.add_argument('--target', help='benchmark an already running backend at this URL instead')
+    parser.add_argument('--env', action='append', metavar='NAME=VALUE',
+                        help='extra backend environment setting (repeatable)')
+    parser.add_argument('--label', help='free-form label stored with the results')
+    parser.add_argument('--output', help='results file (default bench/results/<timestamp>.json)')
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+
+    stub = start_stub_server(args)
+    process = None
+    with tempfile.TemporaryDirectory(prefix='pollution-bench-') as cache_dir:
+        try:
+            if args.target:
+                base_url = args.target.rstrip('/')
+            else:
+                process, base_url = start_backend(args, stub, cache_dir)
+            pool = LocationPool(args.locations)
+
+            print(f"{'conc':>6} {'requests':>8} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+            results = []
+            for concurrency in levels:
+                if args.warmup:
+                    run_level(base_url, args.path, pool, concurrency, args.warmup, args.timeout)
+                stub.reset_stats()
+                latencies, statuses, elapsed = run_level(
+                    base_url, args.path, pool, concurrency, args.duration, args.timeout
+                )
+                results.append(summarize(concurrency, latencies, statuses, elapsed, stub.stats()))
+                print_level(results[-1])
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=10)
+            stub.shutdown()
+
+    report = {
+        'label': args.label,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'server': 'external' if args.target else args.server,
+            'workers': args.workers,
+            'path': args.path,
+            'locations': args.locations,
+            'duration_seconds': args.duration,
+            'warmup_seconds': args.warmup,
+            'latency_seconds': stub.latency,
+            'jitter': stub.jitter,
+            'failure_rate': stub.failure_rate,
+            'failure_mode': stub.failure_mode,
+            'seed': args.seed,
+            'env': args.env or [],
+        },
+        'levels': results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json'
+    )
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
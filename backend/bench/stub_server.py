@@ -0,0 +1,209 @@
+"""Local stand-ins for the upstream providers, replaying recorded responses
+
+Each provider is served under its own path prefix, e.g.
+http://127.0.0.1:8099/weatherapi/v1/current.json, with an optional injected
+latency and failure rate. Point the backend at it with the *_URL overrides
+printed on startup:
+
+    python bench/stub_server.py --port 8099 --latency 0.2 --latency newsapi=0.4 --failure-rate waqi=0.1
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PROVIDERS = ('weatherapi', 'openweather', 'waqi', 'newsapi', 'nominatim')
+
+# Backend setting -> path under the stub server
+URL_SETTINGS = {
+    'WEATHER_API_URL': '/weatherapi/v1/current.json',
+    'OPEN_WEATHER_AQI_URL': '/openweather/data/2.5/air_pollution',
+    'IQAIR_URL': '/waqi/feed',
+    'NEWS_API_URL': '/newsapi/v2/everything',
+    'NOMINATIM_URL': '/nominatim/search',
+}
+
+
+def load_fixtures(directory=FIXTURE_DIR):
+    fixtures = {}
+    for provider in PROVIDERS:
+        with open(os.path.join(directory, f'{provider}.json'), encoding='utf-8') as f:
+            fixtures[provider] = json.load(f)
+    return fixtures
+
+
+def parse_setting(values, default=0.0):
+    """'0.2' sets every provider, 'newsapi=0.4' one of them; later values win"""
+    settings = dict.fromkeys(PROVIDERS, default)
+    for value in values or ():
+        provider, _, amount = value.rpartition('=')
+        if provider and provider not in PROVIDERS:
+            raise ValueError(f"unknown provider {provider!r}, expected one of {', '.join(PROVIDERS)}")
+        for name in ([provider] if provider else PROVIDERS):
+            settings[name] = float(amount)
+    return settings
+
+
+def geocode_response(template, query):
+    """The recorded Nominatim answer moved to a position derived from the query
+
+    Distinct benchmark locations then fall in distinct AQI grid cells, so the
+    backend caches behave as they would for real traffic. The recorded place
+    keeps its recorded position.
+    """
+    if not template or query.strip().lower() == template[0].get('name', '').lower():
+        return template
+    digest = hashlib.sha1(query.strip().lower().encode('utf-8')).digest()
+    place = copy.deepcopy(template[0])
+    place['lat'] = f"{float(place['lat']) + (digest[0] * 256 + digest[1]) / 65536 * 4 - 2:.7f}"
+    place['lon'] = f"{float(place['lon']) + (digest[2] * 256 + digest[3]) / 65536 * 4 - 2:.7f}"
+    address = place.setdefault('address', {})
+    place['name'] = address['city'] = query
+    place['display_name'] = f"{query}, {address.get('country', '')}"
+    return [place]
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the fixtures, fault settings and per-provider counters"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, fixtures=None, latency=None, jitter=0.0, failure_rate=None,
+                 failure_mode='status', seed=None):
+        super().__init__(address, StubHandler)
+        self.fixtures = fixtures or load_fixtures()
+        self.bodies = {provider: json.dumps(body).encode('utf-8') for provider, body in self.fixtures.items()}
+        self.latency = latency or dict.fromkeys(PROVIDERS, 0.0)
+        self.jitter = jitter
+        self.failure_rate = failure_rate or dict.fromkeys(PROVIDERS, 0.0)
+        self.failure_mode = failure_mode
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {provider: {'requests': 0, 'failures': 0} for provider in PROVIDERS}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def backend_env(self):
+        """Environment overrides that send every backend provider call here"""
+        return {setting: self.base_url + path for setting, path in URL_SETTINGS.items()}
+
+    def plan(self, provider):
+        """(delay seconds, fail?) for one request"""
+        with self._lock:
+            self.counts[provider]['requests'] += 1
+            delay = self.latency[provider]
+            if delay and self.jitter:
+                delay *= 1 + self.random.uniform(-self.jitter, self.jitter)
+            fail = self.random.random() < self.failure_rate[provider]
+            if fail:
+                self.counts[provider]['failures'] += 1
+        return max(0.0, delay), fail
+
+    def stats(self):
+        with self._lock:
+            return copy.deepcopy(self.counts)
+
+    def reset_stats(self):
+        with self._lock:
+            for counts in self.counts.values():
+                counts.update(requests=0, failures=0)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        provider = url.path.strip('/').split('/', 1)[0]
+        if provider == '_stats':
+            return self.send_body(200, json.dumps(self.server.stats()).encode('utf-8'))
+        if provider not in PROVIDERS:
+            return self.send_body(404, b'{"error": "unknown provider"}')
+
+        delay, fail = self.server.plan(provider)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            if self.server.failure_mode == 'reset':
+                # Drop the connection without answering, like a reset or a crashed upstream
+                self.close_connection = True
+                return
+            return self.send_body(503, b'{"error": "injected failure"}')
+
+        if provider == 'nominatim':
+            query = parse_qs(url.query).get('q', [''])[0]
+            body = json.dumps(geocode_response(self.server.fixtures['nominatim'], query)).encode('utf-8')
+        else:
+            body = self.server.bodies[provider]
+        self.send_body(200, body)
+
+    def send_body(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def add_fault_arguments(parser):
+    parser.add_argument('--latency', action='append', metavar='[PROVIDER=]SECONDS',
+                        help='injected response delay, for all providers or one (repeatable)')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='randomize each delay by up to this fraction, e.g. 0.5 for +/-50%%')
+    parser.add_argument('--failure-rate', action='append', metavar='[PROVIDER=]RATE',
+                        help='share of requests that fail, for all providers or one (repeatable)')
+    parser.add_argument('--failure-mode', choices=('status', 'reset'), default='status',
+                        help='fail with HTTP 503 or by dropping the connection')
+    parser.add_argument('--seed', type=int, help='random seed for reproducible jitter and failures')
+    parser.add_argument('--fixtures', default=FIXTURE_DIR, help='directory of recorded responses')
+
+
+def start_stub_server(args, host='127.0.0.1', port=0):
+    """Start a StubServer from parsed fault arguments on a background thread"""
+    server = StubServer(
+        (host, port),
+        fixtures=load_fixtures(args.fixtures),
+        latency=parse_setting(args.latency),
+        jitter=args.jitter,
+        failure_rate=parse_setting(args.failure_rate),
+        failure_mode=args.failure_mode,
+        seed=args.seed,
+    )
+    threading.Thread(target=server.serve_forever, name='stub-server', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_stub_server(args, args.host, args.port)
+    print(f"Stub providers on {server.base_url}; run the backend with:")
+    for setting, url in server.backend_env().items():
+        print(f"  {setting}={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
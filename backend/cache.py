@@ -0,0 +1,523 @@
+import errno
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; SharedSingleFlight needs it
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Returned by cache lookups when a key is absent, so None can be cached (negative caching)
+MISSING = object()
+
+
+def normalize_key(text):
+    """Fold case and whitespace so 'New  York' and 'new york' share a cache entry"""
+    return ' '.join(str(text).casefold().split())
+
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache with per-entry expiry"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached value, or MISSING if absent or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """Store a value, evicting the least recently used entry when full"""
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        """Snapshot of the unexpired (key, value) pairs, without counting lookups or touching recency"""
+        now = time.time()
+        with self._lock:
+            return [(key, value) for key, (value, expires_at) in self._data.items() if expires_at > now]
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class SQLiteCache:
+    """JSON key/value cache in SQLite, shared by every worker process on the host"""
+
+    # Expired rows are swept after this many writes
+    PURGE_EVERY = 500
+
+    def __init__(self, path, table='cache'):
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.read_errors = 0
+        self.write_errors = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} '
+                '(key TEXT PRIMARY KEY, value TEXT, expires_at REAL NOT NULL)'
+            )
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _after_fork(self):
+        # A forked worker (e.g. of a preloaded gunicorn master) opens its own connection. The
+        # parent's stays referenced rather than closed, since closing it could checkpoint its WAL
+        self._parent_local, self._local = self._local, threading.local()
+
+    def get_entry(self, key):
+        """Return (value, expires_at), or MISSING if absent, expired or unreadable"""
+        try:
+            row = self._connection().execute(
+                f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self.read_errors += 1
+            logger.warning("Cache read failed", extra={'table': self.table, 'error': str(e)})
+            return MISSING
+        if row is None or row[1] <= time.time():
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry if entry is MISSING else entry[0]
+
+    def set(self, key, value, ttl):
+        expires_at = time.time() + ttl
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(value), expires_at)
+                )
+                self._writes += 1
+                if self._writes % self.PURGE_EVERY == 0:
+                    conn.execute(f'DELETE FROM {self.table} WHERE expires_at <= ?', (time.time(),))
+        except sqlite3.Error as e:
+            self.write_errors += 1
+            logger.warning("Cache write failed", extra={'table': self.table, 'error': str(e)})
+
+    def delete(self, key):
+        try:
+            with self._connection() as conn:
+                conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+        except sqlite3.Error as e:
+            self.write_errors += 1
+            logger.warning("Cache delete failed", extra={'table': self.table, 'error': str(e)})
+
+    def size(self):
+        try:
+            return self._connection().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'size': self.size(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'read_errors': self.read_errors,
+            'write_errors': self.write_errors,
+        }
+
+
+class TieredCache:
+    """In-memory LRU in front of a persistent SQLite tier"""
+
+    def __init__(self, memory, disk):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not MISSING:
+            return value
+        return self.load(key)
+
+    def load(self, key):
+        """Read a key that missed memory from the disk tier (a blocking SQLite read)"""
+        entry = self.disk.get_entry(key)
+        if entry is MISSING:
+            return MISSING
+        # Promote into memory, keeping the expiry the disk tier recorded
+        value, expires_at = entry
+        self.memory.set(key, value, expires_at=expires_at)
+        return value
+
+    def set(self, key, value, ttl):
+        self.memory.set(key, value, ttl)
+        self.disk.set(key, value, ttl)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        self.disk.delete(key)
+
+    def stats(self):
+        memory = self.memory.stats()
+        disk = self.disk.stats()
+        return {
+            'memory': memory,
+            'disk': disk,
+            # A lookup only misses overall when both tiers miss (an unreadable disk tier counts as a miss)
+            'hits': memory['hits'] + disk['hits'],
+            'misses': disk['misses'] + disk['read_errors'],
+            'write_errors': disk['write_errors'],
+        }
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executions = 0
+        self.collapsed = 0
+
+    def do(self, key, func):
+        """Run func once per key at a time; concurrent callers wait for and share its outcome"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+                leader = True
+                self.executions += 1
+            else:
+                leader = False
+                self.collapsed += 1
+
+        if not leader:
+            call['event'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = func()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call['event'].set()
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def stats(self):
+        return {
+            'in_flight': len(self._calls),
+            'executions': self.executions,
+            'collapsed': self.collapsed,
+        }
+
+
+class SharedSingleFlight:
+    """Collapses identical calls across the worker processes on a host
+
+    The first process to lock a key runs the call and stores its JSON result in
+    SQLite; processes that find the key locked wait for the lock, then reuse the
+    result if it was stored while they waited. Keys lock a byte of one lock file
+    chosen by their hash (fcntl record locks), so there is nothing to clean up
+    and a crashed worker's locks are released with it. Record locks belong to the
+    process, so concurrent calls within a process must be collapsed first, e.g.
+    by SingleFlight.
+    """
+
+    POLL_SECONDS = 0.01
+    LOCK_OFFSETS = 2 ** 30
+
+    def __init__(self, lock_path, results, wait_seconds=10, result_ttl=60):
+        if fcntl is None:
+            raise RuntimeError('SharedSingleFlight needs fcntl (POSIX)')
+        self.lock_path = lock_path
+        self.results = results
+        self.wait_seconds = wait_seconds
+        self.result_ttl = result_ttl
+        self._fd = None
+        self._fd_lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+        self.executions = 0
+        self.waited = 0
+        self.reused = 0
+        self.timeouts = 0
+
+    def _after_fork(self):
+        # A forked worker holds none of the parent's locks, and opens the file again
+        self._fd = None
+        self._fd_lock = threading.Lock()
+
+    def _lock_file(self):
+        if self._fd is None:
+            with self._fd_lock:
+                if self._fd is None:
+                    directory = os.path.dirname(self.lock_path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _try_lock(self, fd, offset):
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset)
+            return True
+        except OSError as e:
+            if e.errno in (errno.EACCES, errno.EAGAIN):
+                return False
+            raise
+
+    def do(self, key, func):
+        """Run func, or return the result of the identical call another process finished meanwhile
+
+        A caller that waits longer than wait_seconds runs func itself. Results
+        must be JSON-serializable and come back as JSON (tuples as lists).
+        """
+        fd = self._lock_file()
+        offset = int(hashlib.sha1(key.encode('utf-8')).hexdigest()[:15], 16) % self.LOCK_OFFSETS
+        started = time.time()
+        locked = self._try_lock(fd, offset)
+        waited = not locked
+        if waited:
+            self.waited += 1
+            deadline = time.monotonic() + self.wait_seconds
+            while not locked and time.monotonic() < deadline:
+                time.sleep(self.POLL_SECONDS)
+                locked = self._try_lock(fd, offset)
+            if not locked:
+                self.timeouts += 1
+        try:
+            if locked and waited:
+                entry = self.results.get(key)
+                if entry is not MISSING and entry['finished_at'] >= started:
+                    self.reused += 1
+                    return entry['result']
+            self.executions += 1
+            result = func()
+            if locked:
+                self.results.set(key, {'finished_at': time.time(), 'result': result}, self.result_ttl)
+            return result
+        finally:
+            if locked:
+                fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset)
+
+    def stats(self):
+        return {
+            'executions': self.executions,
+            'waited': self.waited,
+            'reused': self.reused,
+            'timeouts': self.timeouts,
+            'results': self.results.stats(),
+        }
+
+
+class StaleWhileRevalidateCache:
+    """Cache that serves stale entries while refreshing them in the background
+
+    Entries are fresh for ``ttl`` seconds and may then be served for another
+    ``stale_ttl`` seconds while a single background refresh runs. Concurrent
+    misses for the same key share one fetch. ``None`` results are not cached.
+
+    With a ``shared`` SQLiteCache every stored value is also written there, and
+    a lookup that finds nothing fresh in memory takes a newer value from it, so
+    a value fetched by one worker (e.g. by the prefetching one) serves all of
+    them. Keys and values must then be JSON-serializable.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, stale_ttl=900, executor=None, shared=None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.executor = executor
+        self.shared = shared
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl + stale_ttl)
+        self._flights = SingleFlight()
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def lookup(self, key, ttl=None):
+        """Return (value, state) where state is 'fresh', 'stale' or 'miss', counting the lookup"""
+        ttl = self.ttl if ttl is None else ttl
+        entry = self._entries.get(key)
+        if self.shared is not None and (entry is MISSING or time.time() - entry[1] >= ttl):
+            entry = self._newer_shared(key, entry, ttl)
+        if entry is MISSING:
+            self.misses += 1
+            return None, 'miss'
+        value, fetched_at = entry
+        if time.time() - fetched_at < ttl:
+            self.fresh_hits += 1
+            return value, 'fresh'
+        self.stale_hits += 1
+        return value, 'stale'
+
+    def is_fresh(self, key, ttl=None):
+        """Whether memory holds a fresh entry for key, so lookup will not read the shared tier"""
+        entry = self._entries.get(key)
+        return entry is not MISSING and time.time() - entry[1] < (self.ttl if ttl is None else ttl)
+
+    def _newer_shared(self, key, entry, ttl):
+        # A newer value stored by another worker replaces the one in memory
+        stored = self.shared.get(json.dumps(key))
+        if stored is MISSING or (entry is not MISSING and stored['fetched_at'] <= entry[1]):
+            return entry
+        remaining = stored['fetched_at'] + ttl + self.stale_ttl - time.time()
+        if remaining <= 0:
+            return entry
+        self.shared_hits += 1
+        entry = (stored['value'], stored['fetched_at'])
+        self._entries.set(key, entry, ttl=remaining)
+        return entry
+
+    def get_or_fetch(self, key, fetch, ttl=None):
+        """Return the cached value for key, calling fetch() on a miss"""
+        ttl = self.ttl if ttl is None else ttl
+        value, state = self.lookup(key, ttl)
+        if state == 'fresh':
+            return value
+        if state == 'stale':
+            self._schedule_refresh(key, fetch, ttl)
+            return value
+        return self._flights.do(key, lambda: self._fetch_and_store(key, fetch, ttl))
+
+    def refresh(self, key, fetch, ttl=None):
+        """Fetch and store a new value now, sharing any refresh already in flight"""
+        ttl = self.ttl if ttl is None else ttl
+        return self._flights.do(key, lambda: self._fetch_and_store(key, fetch, ttl))
+
+    def peek(self, key):
+        """Return (value, fetched_at) without fetching, or MISSING"""
+        return self._entries.get(key)
+
+    def items(self):
+        """Snapshot of (key, value, fetched_at) for every entry still servable, fresh or stale"""
+        return [(key, value, fetched_at) for key, (value, fetched_at) in self._entries.items()]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        fetched_at = time.time()
+        self._entries.set(key, (value, fetched_at), ttl=ttl + self.stale_ttl)
+        if self.shared is not None:
+            self.shared.set(json.dumps(key), {'value': value, 'fetched_at': fetched_at}, ttl + self.stale_ttl)
+
+    def _fetch_and_store(self, key, fetch, ttl):
+        value = fetch()
+        if value is not None:
+            self.set(key, value, ttl)
+        return value
+
+    def _schedule_refresh(self, key, fetch, ttl):
+        if self._flights.in_flight(key):
+            return
+
+        def run():
+            try:
+                self.refresh(key, fetch, ttl)
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.warning("Background refresh failed", extra={'key': str(key), 'error': str(e)})
+
+        self.refreshes += 1
+        if self.executor is None:
+            threading.Thread(target=run, daemon=True).start()
+        else:
+            self.executor.submit(run)
+
+    def stats(self):
+        lookups = self.fresh_hits + self.stale_hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self._entries.maxsize,
+            'fresh_hits': self.fresh_hits,
+            'stale_hits': self.stale_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_ratio': round((self.fresh_hits + self.stale_hits) / lookups, 4) if lookups else None,
+            'evictions': self._entries.evictions,
+            'background_refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+            'coalesced_fetches': self._flights.collapsed,
+            'shared': self.shared.stats() if self.shared is not None else None,
+        }
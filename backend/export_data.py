@@ -0,0 +1,338 @@
+"""Bulk export of AQI readings and pollution-source breakdowns for a list of locations
+
+Resolves every location in a list file the way /api/pollution-data does
+(geocoding, hedged or fused AQI lookup, city/country source matching) but
+without the news lookup, keeping --workers locations in flight. Rows are
+written to CSV or Parquet in input order as they resolve, so memory stays flat
+however long the list is. A checkpoint next to the output records how far the
+export got, and --resume continues an interrupted run from there:
+
+    python export_data.py export locations.txt --output aqi.csv --workers 8
+    python export_data.py export locations.txt --output aqi-parquet --format parquet --resume
+    python export_data.py import aqi.csv
+
+The list holds one location per line, a name or "lat,lon"; blank lines and
+lines starting with # are skipped. ``import`` loads an export into the AQI
+history store, where /api/pollution-history and /api/pollution-grid serve it.
+Parquet needs pyarrow (requirements-export.txt).
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # CSV needs nothing beyond the standard library
+    pa = pq = None
+
+import app
+from aqi import POLLUTANTS, get_standard
+from history import METRICS
+
+COLUMNS = (
+    'line', 'location', 'status', 'error', 'country', 'state', 'address', 'latitude', 'longitude',
+    'aqi', 'aqi_level', 'aqi_standard', 'dominant_pollutant', *POLLUTANTS, 'fusion_confidence',
+    'source_attribution', 'sources', 'timestamp',
+)
+
+# Everything but the news, which the export never looks up
+EXPORT_FIELDS = frozenset(app.REPORT_FIELDS) - {'pollution_news'}
+
+# History rows written per transaction by import
+IMPORT_BATCH_ROWS = 500
+
+
+def read_locations(path, start_after=0):
+    """(line number, text) for every location line after ``start_after``, read lazily"""
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            text = line.strip()
+            if number > start_after and text and not text.startswith('#'):
+                yield number, text
+
+
+def parse_location(text):
+    """(label, coordinates) for a list entry: "lat,lon" gives coordinates, anything else is a name"""
+    parts = text.split(',')
+    if len(parts) == 2:
+        try:
+            float(parts[0]), float(parts[1])
+        except ValueError:
+            return text, None
+        coordinates = app.parse_coordinates(*parts)
+        return f"{coordinates[0]},{coordinates[1]}", coordinates
+    return text, None
+
+
+def export_row(number, text, options):
+    """Resolve one list entry into a flat output row; failures become rows with an error"""
+    row = dict.fromkeys(COLUMNS)
+    row.update(line=number, location=text)
+    try:
+        label, coordinates = parse_location(text)
+        payload, status = app.build_pollution_report(
+            label, coordinates, options.deadline, options.aqi_standard, options.fusion, EXPORT_FIELDS
+        )
+    except ValueError as e:
+        payload, status = {'error': str(e)}, 400
+    except Exception as e:
+        app.logger.exception("Error exporting location", extra={'location': text})
+        payload, status = {'error': 'Internal error resolving this location'}, 500
+
+    row['status'] = status
+    if status != 200:
+        row['error'] = payload.get('error')
+        return row
+    aqi_data = payload['aqi_data']
+    row.update(
+        country=payload['country'],
+        state=payload['state'],
+        address=payload['address'],
+        latitude=payload['coordinates']['latitude'],
+        longitude=payload['coordinates']['longitude'],
+        aqi=aqi_data.get('aqi'),
+        aqi_level=payload['aqi_level'],
+        aqi_standard=aqi_data.get('aqi_standard'),
+        dominant_pollutant=aqi_data.get('dominant_pollutant'),
+        fusion_confidence=aqi_data.get('fusion', {}).get('confidence'),
+        source_attribution=payload['source_data_attribution'],
+        sources=payload['pollution_sources'],
+        # The report's timestamp is local time without an offset; exports carry UTC
+        timestamp=datetime.fromisoformat(payload['timestamp']).astimezone(timezone.utc).isoformat(),
+    )
+    row.update({pollutant: aqi_data.get(pollutant) for pollutant in POLLUTANTS})
+    return row
+
+
+def resolve_in_order(entries, resolve, workers):
+    """Yield resolve(*entry) for each entry in input order, with at most a few windows of work queued"""
+    window = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export') as executor:
+        for entry in entries:
+            window.append(executor.submit(resolve, *entry))
+            # Rows are emitted in order, so one slow location holds back at most this many
+            if len(window) >= 4 * workers:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+class CsvSink:
+    """CSV output; sources are a JSON array. Resuming truncates back to the last checkpoint"""
+
+    def __init__(self, path, resume=None):
+        self.path = path
+        if resume is None:
+            self._file = open(path, 'w', encoding='utf-8', newline='')
+            self._writer = csv.DictWriter(self._file, COLUMNS)
+            self._writer.writeheader()
+        else:
+            # Rows written after the last checkpoint are dropped and resolved again
+            with open(path, 'r+b') as f:
+                f.truncate(resume['bytes'])
+            self._file = open(path, 'a', encoding='utf-8', newline='')
+            self._writer = csv.DictWriter(self._file, COLUMNS)
+
+    def write(self, row):
+        self._writer.writerow(dict(row, sources=json.dumps(row['sources']) if row['sources'] else None))
+
+    def commit(self):
+        """Make everything written so far durable; returns the state a resume starts from"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {'bytes': self._file.buffer.tell()}
+
+    def close(self):
+        self._file.close()
+
+
+def parquet_schema():
+    """Arrow schema of the Parquet output; sources are a list of (source, percentage, impact) structs"""
+    source = pa.struct([('source', pa.string()), ('percentage', pa.float64()), ('impact', pa.string())])
+    types = dict.fromkeys(COLUMNS, pa.string())
+    types.update(dict.fromkeys(('latitude', 'longitude', 'fusion_confidence', *POLLUTANTS), pa.float64()))
+    types.update(line=pa.int64(), status=pa.int32(), aqi=pa.int32(), sources=pa.list_(source))
+    return pa.schema([(column, types[column]) for column in COLUMNS])
+
+
+class ParquetSink:
+    """Parquet output as a directory of part files, one per checkpoint
+
+    Parquet files cannot be appended to, so rows are buffered until the next
+    checkpoint and written as a new part; readers such as pyarrow.dataset and
+    pandas.read_parquet take the directory as one table.
+    """
+
+    def __init__(self, path, resume=None):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.parts = resume['parts'] if resume else 0
+        # Parts past the checkpoint, and half-written ones, are from an interrupted run
+        for name in glob.glob(os.path.join(path, 'part-*.parquet*')):
+            if name.endswith('.tmp') or int(os.path.basename(name)[5:10]) >= self.parts:
+                os.remove(name)
+        self._rows = []
+
+    def write(self, row):
+        self._rows.append(row)
+
+    def commit(self):
+        if self._rows:
+            part = os.path.join(self.path, f'part-{self.parts:05d}.parquet')
+            pq.write_table(pa.Table.from_pylist(self._rows, schema=parquet_schema()), part + '.tmp')
+            os.replace(part + '.tmp', part)
+            self.parts += 1
+            self._rows = []
+        return {'parts': self.parts}
+
+    def close(self):
+        pass
+
+
+SINKS = {'csv': CsvSink, 'parquet': ParquetSink}
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, state):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+def run_export(args):
+    # Readings reach the history store through `import`, so exporting and then importing on this
+    # host does not store them twice
+    app.HISTORY_ENABLED = False
+    checkpoint_path = args.checkpoint or args.output.rstrip('/\\') + '.checkpoint'
+    checkpoint = load_checkpoint(checkpoint_path) if args.resume else None
+    if checkpoint and (checkpoint['input'] != os.path.abspath(args.locations) or checkpoint['format'] != args.format):
+        sys.exit(f"{checkpoint_path} is for another export ({checkpoint['input']}, {checkpoint['format']})")
+    if checkpoint and checkpoint.get('complete'):
+        print(f"{args.output} is already complete ({checkpoint['rows']} rows)")
+        return
+
+    state = checkpoint or {
+        'input': os.path.abspath(args.locations), 'format': args.format, 'line': 0, 'rows': 0, 'errors': 0,
+    }
+    sink = SINKS[args.format](args.output, checkpoint and checkpoint['sink'])
+    entries = read_locations(args.locations, start_after=state['line'])
+    started = time.monotonic()
+    pending = 0
+    try:
+        for row in resolve_in_order(entries, lambda number, text: export_row(number, text, args), args.workers):
+            sink.write(row)
+            state['line'] = row['line']
+            state['rows'] += 1
+            state['errors'] += row['status'] != 200
+            pending += 1
+            if pending >= args.checkpoint_every:
+                save_checkpoint(checkpoint_path, dict(state, sink=sink.commit()))
+                pending = 0
+                print(f"{state['rows']} rows ({state['errors']} errors), through line {state['line']}", file=sys.stderr)
+        save_checkpoint(checkpoint_path, dict(state, sink=sink.commit(), complete=True))
+    finally:
+        sink.close()
+    print(f"Exported {state['rows']} rows ({state['errors']} errors) to {args.output} "
+          f"in {time.monotonic() - started:.1f}s")
+
+
+def read_export(path):
+    """Rows of a CSV file or Parquet directory written by export, read a batch at a time"""
+    if os.path.isdir(path):
+        if pq is None:
+            sys.exit("Reading Parquet needs pyarrow (pip install -r requirements-export.txt)")
+        for part in sorted(glob.glob(os.path.join(path, 'part-*.parquet'))):
+            for batch in pq.ParquetFile(part).iter_batches(columns=['status', 'latitude', 'longitude', 'aqi',
+                                                                    *POLLUTANTS, 'timestamp']):
+                yield from batch.to_pylist()
+    else:
+        with open(path, encoding='utf-8', newline='') as f:
+            yield from csv.DictReader(f)
+
+
+def history_row(row, provider):
+    """(lat, lon, ts, provider, *METRICS) for an exported row, or None if it has no reading"""
+    if str(row['status']) != '200' or row['latitude'] in (None, '') or row['longitude'] in (None, ''):
+        return None
+    lat, lon = app.snap_to_grid(float(row['latitude']), float(row['longitude']))
+    # Exports carry UTC timestamps; ones without an offset (older exports) are read as local time
+    ts = int(datetime.fromisoformat(row['timestamp']).timestamp())
+    return (lat, lon, ts, provider, *(float(row[m]) if row[m] not in (None, '') else None for m in METRICS))
+
+
+def run_import(args):
+    if not app.HISTORY_ENABLED:
+        sys.exit("The history store is disabled (HISTORY_ENABLED=false)")
+    before = app.history.written
+    rows = skipped = 0
+    batch = []
+    for row in read_export(args.export):
+        reading = history_row(row, args.provider)
+        if reading is None:
+            skipped += 1
+            continue
+        batch.append(reading)
+        rows += 1
+        if len(batch) >= IMPORT_BATCH_ROWS:
+            app.history.write(batch, any_provider=True)
+            batch = []
+    if batch:
+        app.history.write(batch, any_provider=True)
+    imported = app.history.written - before
+    print(f"Imported {imported} of {rows} readings into {app.history.path} "
+          f"({rows - imported} already stored for their cell and time, {skipped} rows without a reading)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help='resolve a location list into CSV or Parquet')
+    export.add_argument('locations', help='file with one location name or "lat,lon" per line')
+    export.add_argument('--output', required=True, help='CSV file, or directory of Parquet parts')
+    export.add_argument('--format', choices=sorted(SINKS), default='csv')
+    export.add_argument('--workers', type=int, default=8, help='locations resolved concurrently')
+    export.add_argument('--deadline', type=float, default=app.REQUEST_DEADLINE_SECONDS,
+                        help='seconds allowed per location')
+    export.add_argument('--aqi-standard', default=app.AQI_STANDARD, help='AQI standard to score readings on')
+    export.add_argument('--fusion', action='store_true', help='fuse every AQI provider instead of the first')
+    export.add_argument('--checkpoint-every', type=int, default=100,
+                        help='rows between checkpoints (and Parquet part files)')
+    export.add_argument('--checkpoint', help='checkpoint file (default <output>.checkpoint)')
+    export.add_argument('--resume', action='store_true',
+                        help='continue from the checkpoint instead of starting over')
+
+    load = commands.add_parser('import', help='load an export into the AQI history store')
+    load.add_argument('export', help='CSV file or Parquet directory written by export')
+    load.add_argument('--provider', default='export', help='provider name recorded with the readings')
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        if args.format == 'parquet' and pa is None:
+            parser.error("Parquet output needs pyarrow (pip install -r requirements-export.txt)")
+        try:
+            args.aqi_standard = get_standard(args.aqi_standard).name
+        except ValueError as e:
+            parser.error(str(e))
+        run_export(args)
+    else:
+        run_import(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import math
+from datetime import datetime
+
+from aqi import POLLUTANTS, US_EPA, Breakpoints
+
+# A value further than this many scaled MADs from the median of its pollutant is an outlier
+# (about three standard deviations for normally distributed readings)
+OUTLIER_THRESHOLD = 3.0
+# Scales the MAD to a standard deviation for normal data
+MAD_SCALE = 1.4826
+# Floor on the outlier scale relative to the median, so close agreement does not make a
+# small difference look like an outlier
+MIN_RELATIVE_SPREAD = 0.1
+
+# WAQI reports each pollutant as a US EPA sub-index; its PM2.5 scale predates the 2024 revision
+WAQI_TABLES = dict(US_EPA.tables, pm25=Breakpoints.bands('pm25', 'ug/m3', [
+    (0.0, 12.0, 0, 50), (12.1, 35.4, 51, 100), (35.5, 55.4, 101, 150),
+    (55.5, 150.4, 151, 200), (150.5, 250.4, 201, 300), (250.5, 500.4, 301, 500),
+], decimals=1))
+
+
+def waqi_concentrations(iaqi):
+    """µg/m³ concentrations from the sub-indices in a WAQI ``iaqi`` block"""
+    concentrations = {}
+    for pollutant in POLLUTANTS:
+        entry = iaqi.get(pollutant)
+        if isinstance(entry, dict) and isinstance(entry.get('v'), (int, float)):
+            concentrations[pollutant] = round(WAQI_TABLES[pollutant].concentration(float(entry['v'])), 2)
+    return concentrations
+
+
+def waqi_observed_at(time_block):
+    """Epoch seconds a WAQI station measured at, from its ``time`` block, or None
+
+    ``iso`` carries the station's UTC offset; ``v`` is used only without it.
+    """
+    if not isinstance(time_block, dict):
+        return None
+    try:
+        if time_block.get('iso'):
+            return int(datetime.fromisoformat(time_block['iso']).timestamp())
+    except ValueError:
+        pass
+    return int(time_block['v']) if isinstance(time_block.get('v'), (int, float)) else None
+
+
+def _median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def reject_outliers(values, threshold=OUTLIER_THRESHOLD):
+    """Split {provider: value} into (kept, rejected) by distance from the median in scaled MADs
+
+    Needs three values to tell which one is off, so smaller sets are kept whole.
+    """
+    if len(values) < 3:
+        return dict(values), {}
+    median = _median(values.values())
+    mad = _median([abs(value - median) for value in values.values()])
+    scale = max(MAD_SCALE * mad, MIN_RELATIVE_SPREAD * abs(median), 1e-9)
+    kept, rejected = {}, {}
+    for provider, value in values.items():
+        (kept if abs(value - median) <= threshold * scale else rejected)[provider] = value
+    return kept, rejected
+
+
+def provider_weight(reliability, age_seconds, half_life):
+    """Reliability discounted by how old the reading is: halved every half_life seconds"""
+    return reliability * 0.5 ** (max(age_seconds, 0.0) / half_life)
+
+
+def fuse_readings(readings, reliability, half_life=3600.0, expected=None, threshold=OUTLIER_THRESHOLD):
+    """Combine several providers' readings for one place into a single reading
+
+    ``readings`` maps provider -> (µg/m³ reading, age in seconds). Per pollutant,
+    outliers are rejected (``reject_outliers``) and the rest averaged, weighted by
+    provider reliability and by how much older than the freshest one a reading
+    is. Zero or missing values count as not reported, since providers fill gaps
+    with 0. ``expected`` names every provider that was asked, including those
+    that did not answer.
+
+    Returns (concentrations, details) where details has the provider weights,
+    rejected providers per pollutant and a confidence per pollutant: the share
+    of the expected reliability that agreed, times 1 / (1 + coefficient of
+    variation).
+    """
+    # Only the weights' ratios matter, so ages count from the freshest reading; otherwise readings
+    # that are all weeks old would underflow to zero weight
+    freshest = min((age for _, age in readings.values()), default=0.0)
+    weights = {
+        provider: provider_weight(reliability.get(provider, 1.0), age - freshest, half_life)
+        for provider, (_, age) in readings.items()
+    }
+    expected_weight = sum(reliability.get(provider, 1.0) for provider in (expected or readings))
+    fused, rejected, confidence = {}, {}, {}
+    for pollutant in POLLUTANTS:
+        values = {
+            provider: float(reading[pollutant]) for provider, (reading, _) in readings.items()
+            if isinstance(reading.get(pollutant), (int, float)) and reading[pollutant] > 0
+        }
+        if not values:
+            continue
+        kept, outliers = reject_outliers(values, threshold)
+        if outliers:
+            rejected[pollutant] = sorted(outliers)
+        total = sum(weights[provider] for provider in kept)
+        if total <= 0:
+            continue
+        mean = sum(weights[provider] * value for provider, value in kept.items()) / total
+        variance = sum(weights[provider] * (value - mean) ** 2 for provider, value in kept.items()) / total
+        variation = math.sqrt(variance) / mean if mean else 0.0
+        support = sum(reliability.get(provider, 1.0) for provider in kept) / expected_weight if expected_weight else 0.0
+        fused[pollutant] = round(mean, 2)
+        confidence[pollutant] = round(min(1.0, support) / (1 + variation), 2)
+    return fused, {
+        'weights': {provider: round(weight, 3) for provider, weight in weights.items()},
+        'rejected': rejected,
+        'pollutant_confidence': confidence,
+    }
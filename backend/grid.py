@@ -0,0 +1,141 @@
+import math
+from bisect import bisect_left, bisect_right
+
+try:
+    import numpy as np
+except ImportError:  # the vectorized path falls back to interpolating cell by cell
+    np = None
+
+from attribution import EARTH_RADIUS_KM
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Grid cells per tile side, and an upper bound on cell x station pairs evaluated at once,
+# which bounds the memory of each step
+TILE_CELLS = 16
+CHUNK_PAIRS = 1_000_000
+
+
+def cell_centers(south, west, north, east, rows, cols):
+    """Latitudes (north to south) and longitudes (west to east) of the cell centres of a rows x cols grid"""
+    lat_step = (north - south) / rows
+    lon_step = (east - west) / cols
+    lats = [north - (row + 0.5) * lat_step for row in range(rows)]
+    lons = [west + (col + 0.5) * lon_step for col in range(cols)]
+    return lats, lons
+
+
+class ReadingIndex:
+    """Station readings sorted by latitude
+
+    A band of grid rows only needs the readings whose latitude is within the
+    search radius of the band, which two binary searches find.
+    """
+
+    def __init__(self, readings):
+        readings = sorted(readings)
+        self.lats = [lat for lat, _, _ in readings]
+        self.lons = [lon for _, lon, _ in readings]
+        self.values = [value for _, _, value in readings]
+
+    def band(self, south, north):
+        """(start, stop) positions of the readings with south <= lat <= north"""
+        return bisect_left(self.lats, south), bisect_right(self.lats, north)
+
+    def __len__(self):
+        return len(self.lats)
+
+
+def idw_grid(readings, lats, lons, radius_km, power=2.0):
+    """Inverse-distance-weighted estimate for every (lat, lon) cell centre
+
+    ``readings`` are (lat, lon, value) stations. A cell takes the average of the
+    stations within ``radius_km``, weighted by 1 / distance ** power; a station
+    in the cell itself dominates it. Cells with no station in range are None.
+    Distances use the equirectangular approximation, which is accurate at the
+    radii used for interpolation. Returns a list of rows.
+    """
+    index = ReadingIndex(readings)
+    if np is None:
+        return _idw_lists(index, lats, lons, radius_km, power)
+
+    grid = np.full((len(lats), len(lons)), np.nan)
+    lats_all = np.asarray(lats, dtype=float)
+    lons_all = np.asarray(lons, dtype=float)
+    station_lats = np.asarray(index.lats)
+    station_lons = np.asarray(index.lons)
+    station_values = np.asarray(index.values, dtype=float)
+    pad = radius_km / KM_PER_DEGREE
+
+    # The grid is processed in tiles, each against only the stations within reach of it
+    for row in range(0, len(lats_all), TILE_CELLS):
+        tile_lats = lats_all[row:row + TILE_CELLS]
+        start, stop = index.band(tile_lats[-1] - pad, tile_lats[0] + pad)
+        if stop == start:
+            continue
+        cos_edge = math.cos(math.radians(min(89.0, max(abs(tile_lats[0]), abs(tile_lats[-1])) + pad)))
+        lon_pad = pad / max(cos_edge, 1e-6)
+        for col in range(0, len(lons_all), TILE_CELLS):
+            tile_lons = lons_all[col:col + TILE_CELLS]
+            centre = (tile_lons[0] + tile_lons[-1]) / 2
+            half_width = (tile_lons[-1] - tile_lons[0]) / 2 + lon_pad
+            near = np.abs((station_lons[start:stop] - centre + 180) % 360 - 180) <= half_width
+            if not near.any():
+                continue
+            # Rows per step keep cells x stations under CHUNK_PAIRS for dense station sets
+            step = max(1, CHUNK_PAIRS // (int(near.sum()) * len(tile_lons)))
+            s_lat, s_lon = station_lats[start:stop][near], station_lons[start:stop][near]
+            s_values = station_values[start:stop][near]
+            for offset in range(0, len(tile_lats), step):
+                block = tile_lats[offset:offset + step]
+                grid[row + offset:row + offset + len(block), col:col + len(tile_lons)] = _idw_block(
+                    block, tile_lons, s_lat, s_lon, s_values, radius_km, power
+                )
+    return _rows(grid)
+
+
+def _idw_block(lats, lons, s_lat, s_lon, values, radius_km, power):
+    # (rows, 1, stations) x (1, cols, stations) -> (rows, cols, stations)
+    cos_lat = np.cos(np.radians((lats[:, None] + s_lat[None, :]) / 2))[:, None, :]
+    dy = ((lats[:, None] - s_lat[None, :]) * KM_PER_DEGREE)[:, None, :]
+    dlon = (lons[:, None] - s_lon[None, :] + 180) % 360 - 180
+    dx = dlon[None, :, :] * KM_PER_DEGREE * cos_lat
+    dist_sq = dx * dx + dy * dy
+    out_of_range = dist_sq > radius_km ** 2
+    # Distances floor at 1 m so a station on a cell centre weighs 1e6x a station 1 km away
+    weights = np.maximum(dist_sq, 1e-6, out=dist_sq)
+    if power == 2:
+        np.reciprocal(weights, out=weights)
+    else:
+        np.power(weights, -power / 2, out=weights)
+    weights[out_of_range] = 0.0
+    total = weights.sum(axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, (weights @ values) / total, np.nan)
+
+
+def _rows(grid):
+    rounded = np.round(grid)
+    return [[None if math.isnan(value) else int(value) for value in row] for row in rounded.tolist()]
+
+
+def _idw_lists(index, lats, lons, radius_km, power):
+    pad = radius_km / KM_PER_DEGREE
+    result = []
+    for lat in lats:
+        start, stop = index.band(lat - pad, lat + pad)
+        row = []
+        for lon in lons:
+            total = weighted = 0.0
+            for i in range(start, stop):
+                cos_lat = math.cos(math.radians((lat + index.lats[i]) / 2))
+                dx = ((lon - index.lons[i] + 180) % 360 - 180) * KM_PER_DEGREE * cos_lat
+                dy = (lat - index.lats[i]) * KM_PER_DEGREE
+                dist_sq = dx * dx + dy * dy
+                if dist_sq <= radius_km ** 2:
+                    weight = max(dist_sq, 1e-6) ** (-power / 2)
+                    total += weight
+                    weighted += weight * index.values[i]
+            row.append(int(round(weighted / total)) if total else None)
+        result.append(row)
+    return result
@@ -0,0 +1,38 @@
+"""Production gunicorn settings: gunicorn -c gunicorn.conf.py app:app
+
+The app is preloaded: the master imports it (libraries, inventory, indexes,
+serialized static bodies) once and forks the workers from it, so they share
+that memory copy-on-write and are ready as soon as they are forked. SQLite
+connections and HTTP sessions are re-created in each worker after the fork,
+and background threads (prefetch, history writer, live polling) are only
+started by the workers, on first use.
+
+GUNICORN_RELOAD=true is for development (docker-compose); it turns preloading
+off, since a preloaded app cannot be reloaded.
+"""
+import os
+import time
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+# Threaded (gthread) workers, so a few open live streams (LIVE_MAX_STREAMS each) do not block the API
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+reload = os.getenv('GUNICORN_RELOAD', 'false').lower() in ('1', 'true', 'yes')
+preload_app = not reload and os.getenv('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+accesslog = '-' if os.getenv('GUNICORN_ACCESS_LOG', 'false').lower() in ('1', 'true', 'yes') else None
+
+
+def when_ready(server):
+    if preload_app:
+        import app
+        server.log.info("App preloaded in %.0f ms (%d modules)",
+                        app.startup.ready_seconds * 1000, len(app.startup.imports.modules))
+
+
+def pre_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s forked in %.1f ms", worker.pid, (time.perf_counter() - worker.forked_at) * 1000)
@@ -0,0 +1,87 @@
+import json
+from types import MappingProxyType
+
+
+class HealthTipsTable:
+    """Read-only health advice per AQI level and locale, with advice for the dominant pollutant
+
+    Tips are written for the six US EPA levels; ``standards`` maps the category
+    labels of the other AQI standards onto those levels. Everything is loaded
+    once and frozen, so every response the table can produce is known up front
+    (``responses``) and can be serialized ahead of time.
+    """
+
+    def __init__(self, levels, locales, standards=None, default_locale='en'):
+        self.levels = tuple(levels)
+        if default_locale not in locales:
+            raise ValueError(f"Default locale {default_locale!r} has no tips")
+        self.default_locale = default_locale
+        self._tips = MappingProxyType({
+            locale: MappingProxyType({level: tuple(tips['levels'][level]) for level in self.levels})
+            for locale, tips in locales.items()
+        })
+        self._advice = MappingProxyType({
+            locale: MappingProxyType(dict(tips.get('pollutants', {}))) for locale, tips in locales.items()
+        })
+        # standard -> {category label: level}; us_epa labels are the levels themselves
+        self._labels = MappingProxyType({
+            name: MappingProxyType(dict(labels)) for name, labels in (standards or {}).items()
+        })
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            table = json.load(f)
+        return cls(table['levels'], table['locales'], table.get('standards'), table.get('default_locale', 'en'))
+
+    @property
+    def locales(self):
+        return tuple(self._tips)
+
+    @property
+    def pollutants(self):
+        return tuple(sorted({pollutant for advice in self._advice.values() for pollutant in advice}))
+
+    def level(self, label, standard=None):
+        """The tip level for a category label of the given standard (US EPA when not mapped), or None"""
+        labels = self._labels.get(standard)
+        level = labels.get(label) if labels is not None else label
+        return level if level in self._tips[self.default_locale] else None
+
+    def locale(self, tag):
+        """Best supported locale for a tag like 'hi' or 'es-MX', falling back to the default"""
+        tag = (tag or '').strip().lower().replace('_', '-')
+        if tag in self._tips:
+            return tag
+        language = tag.split('-')[0]
+        return language if language in self._tips else self.default_locale
+
+    def tips(self, level, locale=None):
+        tips = self._tips.get(locale or self.default_locale, self._tips[self.default_locale])
+        return tips.get(level, tips[self.levels[1]])
+
+    def advice(self, level, pollutant, locale=None):
+        """Advice for the dominant pollutant, or None at the lowest level where there is nothing to avoid"""
+        if pollutant is None or level == self.levels[0]:
+            return None
+        locale = locale or self.default_locale
+        return self._advice.get(locale, {}).get(pollutant) or self._advice[self.default_locale].get(pollutant)
+
+    def payload(self, label, level, locale=None, pollutant=None):
+        """/api/health-tips body for a requested label, its resolved level, locale and pollutant"""
+        locale = locale or self.default_locale
+        payload = {'aqi_level': label, 'locale': locale, 'health_tips': list(self.tips(level, locale))}
+        advice = self.advice(level, pollutant, locale)
+        if advice:
+            payload['pollutant'] = pollutant
+            payload['pollutant_advice'] = advice
+        return payload
+
+    def responses(self):
+        """((label, level, locale, pollutant), payload) for every label ``level`` can resolve"""
+        labels = {(level, level) for level in self.levels}
+        labels.update((label, level) for mapping in self._labels.values() for label, level in mapping.items())
+        for label, level in sorted(labels):
+            for locale in self._tips:
+                for pollutant in (None,) + self.pollutants:
+                    yield (label, level, locale, pollutant), self.payload(label, level, locale, pollutant)
@@ -0,0 +1,274 @@
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from aqi import POLLUTANTS
+
+logger = logging.getLogger(__name__)
+
+# Values kept for every reading and summarised in the rollups
+METRICS = ('aqi',) + POLLUTANTS
+
+RESOLUTIONS = {'hour': 3600, 'day': 86400}
+
+
+class HistoryStore:
+    """Append-only SQLite time series of AQI readings per grid cell, with hourly and daily rollups
+
+    Readings are queued by ``append`` and written in batches by a background
+    thread, so request handlers never wait on the disk. Each batch also folds its
+    readings into the hourly and daily rollup rows (count, and per value its own count,
+    sum, min and max), so long ranges are answered from a few hundred pre-aggregated
+    rows. Values a provider did not report are stored as NULL and left out. Raw readings and
+    rollups are pruned after their retention periods.
+    """
+
+    # Retention is enforced at most this often
+    PURGE_INTERVAL = 3600
+
+    def __init__(self, path, flush_interval=2.0, raw_retention_days=7,
+                 hourly_retention_days=90, daily_retention_days=1825, max_queue=10000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.retention = {
+            'raw': raw_retention_days * 86400,
+            'hour': hourly_retention_days * 86400,
+            'day': daily_retention_days * 86400,
+        }
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+        self._stop = threading.Event()
+        self._thread = None
+        self._next_purge = 0.0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_flush = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._create_tables()
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _after_fork(self):
+        # A forked worker opens its own connection and starts its own writer on its first append.
+        # The parent's connection stays referenced rather than closed, since closing it could
+        # checkpoint its WAL
+        self._parent_local, self._local = self._local, threading.local()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _create_tables(self):
+        metrics = ', '.join(f'{m} REAL' for m in METRICS)
+        summaries = ', '.join(f'{m}_count INTEGER, {m}_sum REAL, {m}_min REAL, {m}_max REAL' for m in METRICS)
+        with self._connection() as conn:
+            # WITHOUT ROWID keeps rows clustered by cell and time, so range scans read contiguous pages
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS readings (lat REAL, lon REAL, ts INTEGER, provider TEXT, {metrics}, '
+                'PRIMARY KEY (lat, lon, ts, provider)) WITHOUT ROWID'
+            )
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS rollups (lat REAL, lon REAL, resolution TEXT, bucket INTEGER, '
+                f'count INTEGER, {summaries}, PRIMARY KEY (lat, lon, resolution, bucket)) WITHOUT ROWID'
+            )
+            # Rollups created before the per-value counts get the columns, filled with the row
+            # count wherever the value was ever recorded
+            existing = {row[1] for row in conn.execute('PRAGMA table_info(rollups)')}
+            for m in METRICS:
+                if f'{m}_count' not in existing:
+                    conn.execute(f'ALTER TABLE rollups ADD COLUMN {m}_count INTEGER')
+                    conn.execute(f'UPDATE rollups SET {m}_count = CASE WHEN {m}_min IS NULL THEN 0 ELSE count END')
+
+    def append(self, provider, lat, lon, reading, ts=None):
+        """Queue one reading for the (already snapped) cell lat, lon; never blocks"""
+        row = (lat, lon, int(ts if ts is not None else time.time()), provider,
+               *(_number(reading.get(m)) for m in METRICS))
+        self._start()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def flush(self):
+        """Write every queued reading and its rollup updates in one transaction"""
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if rows:
+            try:
+                self.write(rows)
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.warning("AQI history write failed", extra={'readings': len(rows), 'error': str(e)})
+        if time.time() >= self._next_purge:
+            self._next_purge = time.time() + self.PURGE_INTERVAL
+            self.purge()
+
+    def write(self, rows, any_provider=False):
+        """Insert (lat, lon, ts, provider, *METRICS) rows and fold them into the rollups
+
+        With any_provider=True a row is skipped when its cell already has a reading
+        at that second from any provider (used for imports, whose provider is a label).
+        """
+        columns = ', '.join(METRICS)
+        placeholders = ', '.join('?' * (4 + len(METRICS)))
+        summary_columns = ', '.join(f'{m}_count, {m}_sum, {m}_min, {m}_max' for m in METRICS)
+        # Each value is counted and summed only where it was reported (not NULL)
+        summary_updates = ', '.join(
+            f'{m}_count = {m}_count + excluded.{m}_count, '
+            f'{m}_sum = COALESCE({m}_sum + excluded.{m}_sum, {m}_sum, excluded.{m}_sum), '
+            f'{m}_min = MIN(COALESCE({m}_min, excluded.{m}_min), COALESCE(excluded.{m}_min, {m}_min)), '
+            f'{m}_max = MAX(COALESCE({m}_max, excluded.{m}_max), COALESCE(excluded.{m}_max, {m}_max))'
+            for m in METRICS
+        )
+        insert = f'INSERT OR IGNORE INTO readings (lat, lon, ts, provider, {columns}) VALUES ({placeholders})'
+        with self._connection() as conn:
+            # Only rows not already stored are folded into the rollups, so writing a reading twice
+            # (a re-imported export, say) does not count it twice
+            if any_provider:
+                rows = [
+                    row for row in rows
+                    if conn.execute('SELECT 1 FROM readings WHERE lat = ? AND lon = ? AND ts = ?', row[:3]).fetchone()
+                    is None
+                ]
+            inserted = [row for row in rows if conn.execute(insert, row).rowcount]
+            rollup_rows = []
+            for lat, lon, ts, _, *values in inserted:
+                summaries = [v for value in values for v in (int(value is not None), value, value, value)]
+                for resolution, seconds in RESOLUTIONS.items():
+                    rollup_rows.append((lat, lon, resolution, ts - ts % seconds, 1, *summaries))
+            conn.executemany(
+                f'INSERT INTO rollups (lat, lon, resolution, bucket, count, {summary_columns}) '
+                f'VALUES ({", ".join("?" * (5 + 4 * len(METRICS)))}) '
+                f'ON CONFLICT (lat, lon, resolution, bucket) DO UPDATE SET count = count + 1, {summary_updates}',
+                rollup_rows
+            )
+        self.written += len(inserted)
+        self.last_flush = time.time()
+
+    def purge(self):
+        now = time.time()
+        try:
+            with self._connection() as conn:
+                conn.execute('DELETE FROM readings WHERE ts < ?', (int(now - self.retention['raw']),))
+                for resolution in RESOLUTIONS:
+                    conn.execute(
+                        'DELETE FROM rollups WHERE resolution = ? AND bucket < ?',
+                        (resolution, int(now - self.retention[resolution]))
+                    )
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning("AQI history prune failed", extra={'error': str(e)})
+
+    def query(self, lat, lon, start, end, resolution='auto'):
+        """Readings for one cell between start and end (epoch seconds)
+
+        resolution is 'raw', 'hour', 'day' or 'auto', which picks raw readings for
+        spans up to two days, hourly rollups up to 60 days and daily ones beyond.
+        Returns (resolution, points).
+        """
+        if resolution == 'auto':
+            span = end - start
+            resolution = 'raw' if span <= 2 * 86400 else 'hour' if span <= 60 * 86400 else 'day'
+        conn = self._connection()
+
+        if resolution == 'raw':
+            cursor = conn.execute(
+                f'SELECT ts, provider, {", ".join(METRICS)} FROM readings '
+                'WHERE lat = ? AND lon = ? AND ts BETWEEN ? AND ? ORDER BY ts',
+                (lat, lon, int(start), int(end))
+            )
+            return resolution, [
+                {'timestamp': ts, 'provider': provider, **dict(zip(METRICS, values))}
+                for ts, provider, *values in cursor
+            ]
+
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be raw, hour, day or auto, not {resolution!r}")
+        cursor = conn.execute(
+            f'SELECT bucket, count, {", ".join(f"{m}_count, {m}_sum, {m}_min, {m}_max" for m in METRICS)} FROM rollups '
+            'WHERE lat = ? AND lon = ? AND resolution = ? AND bucket BETWEEN ? AND ? ORDER BY bucket',
+            (lat, lon, resolution, int(start) - int(start) % RESOLUTIONS[resolution], int(end))
+        )
+        points = []
+        for bucket, count, *summaries in cursor:
+            point = {'timestamp': bucket, 'count': count}
+            for i, metric in enumerate(METRICS):
+                reported, total, low, high = summaries[4 * i:4 * i + 4]
+                point[metric] = {
+                    'count': reported,
+                    'min': low,
+                    'mean': round(total / reported, 2) if reported and total is not None else None,
+                    'max': high,
+                }
+            points.append(point)
+        return resolution, points
+
+    def latest(self, south, west, north, east, since):
+        """Newest AQI reading since ``since`` for every cell inside a bounding box: [(lat, lon, ts, aqi)]"""
+        # The primary key leads with lat, so the latitude range is an index range scan.
+        # SQLite takes the bare aqi column from the row holding MAX(ts)
+        cursor = self._connection().execute(
+            'SELECT lat, lon, MAX(ts), aqi FROM readings '
+            'WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ? AND ts >= ? AND aqi IS NOT NULL '
+            'GROUP BY lat, lon',
+            (south, north, west, east, int(since))
+        )
+        return cursor.fetchall()
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'last_flush': self.last_flush,
+            'retention_days': {name: seconds // 86400 for name, seconds in self.retention.items()},
+        }
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,279 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import UPSTREAM_SECONDS
+from quota import WINDOWS, ProviderQuota
+
+# Upstream statuses worth retrying and counting against a provider's health
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _config(provider, key, default, cast=float):
+    """Read a per-provider setting (e.g. NEWSAPI_READ_TIMEOUT), falling back to HTTP_<KEY>"""
+    value = os.getenv(f'{provider.upper()}_{key}', os.getenv(f'HTTP_{key}'))
+    return cast(value) if value not in (None, '') else default
+
+
+def response_outcome(status_code):
+    """Metrics outcome label for an upstream response: 'ok', '4xx' or '5xx'"""
+    return 'ok' if status_code < 400 else f'{status_code // 100}xx'
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Opens when the failure rate over recent calls crosses a threshold
+
+    While open, calls are rejected for ``reset_timeout`` seconds; then a single
+    probe is let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window_size=20, min_requests=5, failure_threshold=0.5, reset_timeout=30):
+        self.min_requests = min_requests
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._outcomes = deque(maxlen=window_size)
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go upstream right now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    self.rejected += 1
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def release(self):
+        """Hand back a permission from allow() for a call that was not made"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                self._outcomes.clear()
+            self._probe_in_flight = False
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            self._probe_in_flight = False
+            self._outcomes.append(False)
+            if self.state == self.HALF_OPEN or self._failure_rate() >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def _failure_rate(self):
+        if len(self._outcomes) < self.min_requests:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'failure_rate': round(self._failure_rate(), 3),
+                'window': len(self._outcomes),
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+            }
+
+
+class ProviderClient:
+    """Keep-alive HTTP client for one upstream provider with retries, a circuit breaker and a quota
+
+    ``quotas`` gives the default request limits (per_second, per_minute,
+    per_hour, per_day, and max_wait in seconds), each overridable with
+    e.g. NEWSAPI_QUOTA_PER_DAY. The budget is kept in ``quota_store``, shared
+    by every worker; without a store or any limit the provider is unmetered.
+    """
+
+    def __init__(self, name, headers=None, quota_store=None, quotas=None):
+        self.name = name
+        self.headers = headers or {}
+        self.connect_timeout = _config(name, 'CONNECT_TIMEOUT', 3.05)
+        self.read_timeout = _config(name, 'READ_TIMEOUT', 10.0)
+        self.max_retries = _config(name, 'MAX_RETRIES', 2, int)
+        self.backoff = _config(name, 'BACKOFF_SECONDS', 0.25)
+        self.pool_size = _config(name, 'POOL_SIZE', 10, int)
+        self.breaker = CircuitBreaker(
+            window_size=_config(name, 'BREAKER_WINDOW', 20, int),
+            min_requests=_config(name, 'BREAKER_MIN_REQUESTS', 5, int),
+            failure_threshold=_config(name, 'BREAKER_FAILURE_THRESHOLD', 0.5),
+            reset_timeout=_config(name, 'BREAKER_RESET_SECONDS', 30.0),
+        )
+        quotas = quotas or {}
+        limits = {window: _config(name, f'QUOTA_{window.upper()}', quotas.get(window, 0)) for window in WINDOWS}
+        self.quota = None
+        if quota_store is not None and any(limits.values()):
+            self.quota = ProviderQuota(
+                quota_store, name, limits, max_wait=_config(name, 'QUOTA_MAX_WAIT_SECONDS', quotas.get('max_wait', 0.0))
+            )
+        self._session = None
+        self._adapter = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            # Pooled sockets must not be shared with the parent, so a forked worker builds its own session
+            os.register_at_fork(after_in_child=self._after_fork)
+        self._counter_lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    @property
+    def session(self):
+        # Built on first use so importing the app does not open any sockets
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.headers.update(self.headers)
+                    self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('https://', self._adapter)
+                    session.mount('http://', self._adapter)
+                    self._session = session
+        return self._session
+
+    def _after_fork(self):
+        self._session = None
+        self._adapter = None
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, headers=None):
+        """GET through the pooled session
+
+        Raises CircuitOpenError when the provider is tripped and QuotaExceededError
+        when its request budget is used up.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {self.name}, skipping request")
+        if self.quota is not None:
+            try:
+                self.quota.acquire()
+            except BaseException:
+                # Including a failed quota store: no call went upstream
+                self.breaker.release()
+                raise
+
+        self.count('in_flight', 1)
+        started = time.perf_counter()
+        try:
+            response = self._get_with_retries(url, params, headers)
+        except requests.RequestException:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, provider=self.name, outcome='error')
+            self.count('failures', 1)
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Not an upstream failure (a bug, a cancelled request), but a half-open probe is handed back
+            self.breaker.release()
+            raise
+        finally:
+            self.count('in_flight', -1)
+
+        UPSTREAM_SECONDS.observe(
+            time.perf_counter() - started, provider=self.name, outcome=response_outcome(response.status_code)
+        )
+        if response.status_code in RETRYABLE_STATUSES:
+            self.count('failures', 1)
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _get_with_retries(self, url, params, headers):
+        attempt = 0
+        while True:
+            self.count('requests', 1)
+            try:
+                response = self.session.get(
+                    url, params=params, headers=headers,
+                    timeout=(self.connect_timeout, self.read_timeout)
+                )
+                self.check_throttled(response.status_code)
+                if response.status_code not in RETRYABLE_STATUSES or not self.may_retry(attempt):
+                    return response
+                response.close()
+            except requests.ConnectionError:
+                # Covers connect timeouts; read timeouts are not retried because the
+                # provider has already cost us a full read_timeout
+                if not self.may_retry(attempt):
+                    raise
+            attempt += 1
+            self.count('retries', 1)
+            # Exponential backoff with full jitter so workers do not retry in lockstep
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def may_retry(self, attempt):
+        """Whether another attempt is allowed: retries are left and the quota, if any, has a token for it"""
+        return attempt < self.max_retries and (self.quota is None or not self.quota.take())
+
+    def check_throttled(self, status_code):
+        if status_code == 429 and self.quota is not None:
+            # The provider says the budget is gone; stop every worker until the buckets refill
+            self.quota.drain()
+
+    def count(self, counter, delta):
+        """Adjust a usage counter (also used by the async client sharing this provider's stats)"""
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + delta)
+
+    def pool_stats(self):
+        """Connection pool utilisation per upstream host"""
+        if self._adapter is None:
+            return {}
+        pools = {}
+        for key in list(self._adapter.poolmanager.pools.keys()):
+            pool = self._adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            # The pool queue holds one slot per connection not currently checked out
+            available = pool.pool.qsize() if pool.pool is not None else self.pool_size
+            pools[f"{pool.scheme}://{pool.host}"] = {
+                'maxsize': self.pool_size,
+                'in_use': self.pool_size - available,
+                'connections_opened': pool.num_connections,
+                'requests_served': pool.num_requests,
+            }
+        return pools
+
+    def stats(self):
+        return {
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'retries': self.retries,
+            'failures': self.failures,
+            'timeouts': {'connect': self.connect_timeout, 'read': self.read_timeout},
+            'breaker': self.breaker.stats(),
+            'quota': self.quota.stats() if self.quota is not None else None,
+            'pools': self.pool_stats(),
+        }
@@ -0,0 +1,310 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections.abc import Mapping
+
+logger = logging.getLogger(__name__)
+
+# Compiled inventory layout (little endian, every section 4-byte aligned):
+#   header   magic, version, source JSON mtime, counts and section offsets (HEADER)
+#   strings  uint32 offsets[n_strings + 1], then one UTF-8 blob
+#   entities one array per column: kind u8, name u32, country u32, attribution u32,
+#            first_row u32, row_count u32
+#   rows     one array per column: source u32, percentage f32, impact u32
+# Strings are referenced by index; NO_STRING marks an absent value.
+MAGIC = b'PSIV'
+VERSION = 1
+HEADER = struct.Struct('<4sHxxdIIIIII')
+NO_STRING = 0xFFFFFFFF
+
+KIND_DEFAULT, KIND_COUNTRY, KIND_CITY = 0, 1, 2
+KIND_SECTIONS = {KIND_DEFAULT: 'default', KIND_COUNTRY: 'countries', KIND_CITY: 'cities'}
+
+
+class InventoryError(ValueError):
+    """Raised when the emissions inventory is malformed"""
+
+
+def _validate(name, record):
+    # Every shape problem is an InventoryError, so a bad edit never escapes as a KeyError or TypeError
+    if not isinstance(record, dict):
+        raise InventoryError(f"{name}: expected an object")
+    sources = record.get('sources')
+    if not sources or not isinstance(sources, list):
+        raise InventoryError(f"{name}: no sources")
+    for key in ('country', 'source'):
+        if not isinstance(record.get(key, ''), str):
+            raise InventoryError(f"{name}: {key} must be a string")
+    for source in sources:
+        if not isinstance(source, dict) or not isinstance(source.get('source'), str) or not source['source'] \
+                or source.get('impact') not in ('high', 'medium', 'low'):
+            raise InventoryError(f"{name}: every source needs a name and an impact of high, medium or low")
+        percentage = source.get('percentage')
+        if isinstance(percentage, bool) or not isinstance(percentage, (int, float)) or not 0 <= percentage <= 100:
+            raise InventoryError(f"{name}: every source needs a percentage between 0 and 100")
+    total = sum(source['percentage'] for source in sources)
+    if abs(total - 100) > 0.01:
+        raise InventoryError(f"{name}: source percentages sum to {total}, expected 100")
+
+
+def _entities(inventory):
+    """(kind, name, record) for every entity in an inventory JSON document"""
+    if not isinstance(inventory, dict) or 'default' not in inventory:
+        raise InventoryError("inventory needs a default entry")
+    yield KIND_DEFAULT, 'default', inventory['default']
+    for section, kind in (('countries', KIND_COUNTRY), ('cities', KIND_CITY)):
+        records = inventory.get(section, {})
+        if not isinstance(records, dict):
+            raise InventoryError(f"{section} must be an object of name -> record")
+        for name, record in records.items():
+            yield kind, name, record
+
+
+def _pad(blob):
+    return blob + b'\0' * (-len(blob) % 4)
+
+
+def compile_inventory(json_path, bin_path):
+    """Validate the JSON inventory and write the compiled file atomically"""
+    source_mtime = os.path.getmtime(json_path)
+    with open(json_path, encoding='utf-8') as f:
+        inventory = json.load(f)
+
+    strings, string_ids = [], {}
+
+    def intern(value):
+        if value is None:
+            return NO_STRING
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    columns = {name: [] for name in ('kind', 'name', 'country', 'attribution', 'first_row', 'row_count')}
+    rows = {'source': [], 'percentage': [], 'impact': []}
+    for kind, name, record in _entities(inventory):
+        _validate(name, record)
+        columns['kind'].append(kind)
+        columns['name'].append(intern(name))
+        columns['country'].append(intern(record.get('country')))
+        columns['attribution'].append(intern(record.get('source')))
+        columns['first_row'].append(len(rows['source']))
+        columns['row_count'].append(len(record['sources']))
+        for source in record['sources']:
+            rows['source'].append(intern(source['source']))
+            rows['percentage'].append(source['percentage'])
+            rows['impact'].append(intern(source['impact']))
+
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = [0]
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    string_section = _pad(struct.pack(f'<{len(offsets)}I', *offsets) + b''.join(encoded))
+
+    n = len(columns['kind'])
+    entity_section = _pad(bytes(columns['kind'])) + b''.join(
+        struct.pack(f'<{n}I', *columns[name])
+        for name in ('name', 'country', 'attribution', 'first_row', 'row_count')
+    )
+    m = len(rows['source'])
+    row_section = (
+        struct.pack(f'<{m}I', *rows['source'])
+        + struct.pack(f'<{m}f', *rows['percentage'])
+        + struct.pack(f'<{m}I', *rows['impact'])
+    )
+
+    strings_offset = HEADER.size
+    entities_offset = strings_offset + len(string_section)
+    rows_offset = entities_offset + len(entity_section)
+    header = HEADER.pack(
+        MAGIC, VERSION, source_mtime, len(strings), n, m, strings_offset, entities_offset, rows_offset
+    )
+
+    directory = os.path.dirname(bin_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{bin_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header + string_section + entity_section + row_section)
+    # Atomic swap so other workers never map a half-written file
+    os.replace(tmp_path, bin_path)
+
+
+class _CompiledInventory:
+    """Read-only view over one memory-mapped compiled inventory file"""
+
+    def __init__(self, bin_path):
+        with open(bin_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mtime = os.path.getmtime(bin_path)
+        buf = memoryview(self._mmap)
+        magic, version, self.source_mtime, n_strings, n, m, strings_offset, entities_offset, rows_offset = (
+            HEADER.unpack_from(buf)
+        )
+        if magic != MAGIC or version != VERSION:
+            raise InventoryError(f"{bin_path} is not a compiled inventory (version {VERSION})")
+
+        # Zero-copy typed views over the mapped pages
+        blob_start = strings_offset + 4 * (n_strings + 1)
+        self._string_offsets = buf[strings_offset:blob_start].cast('I')
+        self._blob = buf[blob_start:blob_start + self._string_offsets[n_strings]]
+        self._kind = buf[entities_offset:entities_offset + n]
+        column = entities_offset + n + (-n % 4)
+        self._name, self._country, self._attribution, self._first_row, self._row_count = (
+            buf[column + 4 * n * i:column + 4 * n * (i + 1)].cast('I') for i in range(5)
+        )
+        self._source = buf[rows_offset:rows_offset + 4 * m].cast('I')
+        self._percentage = buf[rows_offset + 4 * m:rows_offset + 8 * m].cast('f')
+        self._impact = buf[rows_offset + 8 * m:rows_offset + 12 * m].cast('I')
+
+        # Name -> entity position per kind; records are decoded on first access
+        self.index = {kind: {} for kind in KIND_SECTIONS}
+        for position in range(n):
+            self.index[self._kind[position]][self.string(self._name[position])] = position
+        self._decoded = {}
+        self._validate()
+
+    def string(self, string_id):
+        if string_id == NO_STRING:
+            return None
+        return bytes(self._blob[self._string_offsets[string_id]:self._string_offsets[string_id + 1]]).decode('utf-8')
+
+    def record(self, position):
+        """Decoded record for an entity, in the same shape as the JSON source"""
+        record = self._decoded.get(position)
+        if record is None:
+            first, count = self._first_row[position], self._row_count[position]
+            sources = []
+            for row in range(first, first + count):
+                percentage = self._percentage[row]
+                sources.append({
+                    'source': self.string(self._source[row]),
+                    'percentage': int(percentage) if percentage.is_integer() else round(percentage, 2),
+                    'impact': self.string(self._impact[row]),
+                })
+            record = {'sources': sources}
+            for key, column in (('country', self._country), ('source', self._attribution)):
+                value = self.string(column[position])
+                if value is not None:
+                    record[key] = value
+            self._decoded[position] = record
+        return record
+
+    def _validate(self):
+        for position in range(len(self._kind)):
+            first, count = self._first_row[position], self._row_count[position]
+            total = sum(self._percentage[first:first + count].tolist())
+            if abs(total - 100) > 0.01:
+                name = self.string(self._name[position])
+                raise InventoryError(f"{name}: source percentages sum to {total}, expected 100")
+
+
+class InventoryStore:
+    """Emissions inventory compiled from JSON into a memory-mapped file shared by all workers
+
+    The compiled file is rebuilt whenever the JSON source changes, and the
+    store re-checks both files at most every ``check_interval`` seconds, so
+    edits are picked up without a restart.
+    """
+
+    def __init__(self, json_path, bin_path, check_interval=5.0):
+        self.json_path = json_path
+        self.bin_path = bin_path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._compiled = None
+        self.cities = InventoryView(self, KIND_CITY)
+        self.countries = InventoryView(self, KIND_COUNTRY)
+        self.defaults = InventoryView(self, KIND_DEFAULT)
+        self.reload()
+
+    def on_reload(self, listener):
+        """Call listener() after every reload that swaps in new data"""
+        self._listeners.append(listener)
+
+    def reload(self):
+        with self._lock:
+            compiled = self._open_compiled()
+            if compiled is None or compiled.source_mtime != os.path.getmtime(self.json_path):
+                compile_inventory(self.json_path, self.bin_path)
+                compiled = _CompiledInventory(self.bin_path)
+            self._compiled = compiled
+            self._next_check = time.monotonic() + self.check_interval
+            self.reloads += 1
+        for listener in self._listeners:
+            listener()
+
+    def _open_compiled(self):
+        # A missing, foreign or outdated-format compiled file is simply rebuilt
+        try:
+            return _CompiledInventory(self.bin_path)
+        except (OSError, InventoryError, ValueError, struct.error):
+            return None
+
+    def compiled(self):
+        """Current inventory, reloading first if the source or compiled file changed"""
+        if time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                # The JSON was edited, or another worker recompiled it
+                changed = (
+                    os.path.getmtime(self.json_path) != self._compiled.source_mtime
+                    or os.path.getmtime(self.bin_path) != self._compiled.mtime
+                )
+                if changed:
+                    self.reload()
+            except (OSError, InventoryError, ValueError) as e:
+                # Keep serving the last good inventory if an edit is invalid
+                logger.error("Inventory reload failed, keeping previous data",
+                             extra={'path': self.json_path, 'error': str(e)})
+        return self._compiled
+
+    def stats(self):
+        compiled = self._compiled
+        return {
+            'cities': len(compiled.index[KIND_CITY]),
+            'countries': len(compiled.index[KIND_COUNTRY]),
+            'compiled_bytes': len(compiled._mmap),
+            'reloads': self.reloads,
+        }
+
+
+class InventoryView(Mapping):
+    """Read-only name -> record mapping over one kind of inventory entity"""
+
+    def __init__(self, store, kind):
+        self._store = store
+        self._kind = kind
+
+    def __getitem__(self, name):
+        compiled = self._store.compiled()
+        return compiled.record(compiled.index[self._kind][name])
+
+    def __contains__(self, name):
+        return name in self._store.compiled().index[self._kind]
+
+    def __iter__(self):
+        return iter(list(self._store.compiled().index[self._kind]))
+
+    def __len__(self):
+        return len(self._store.compiled().index[self._kind])
+
+    def to_dict(self):
+        return {name: self[name] for name in self}
+
+
+if __name__ == '__main__':
+    # Validate and compile an inventory ahead of time:
+    #   python inventory.py data/inventory.json inventory.bin
+    if len(sys.argv) != 3:
+        sys.exit('usage: python inventory.py INVENTORY_JSON OUTPUT_BIN')
+    compile_inventory(sys.argv[1], sys.argv[2])
+    print(f"Compiled {sys.argv[1]} -> {sys.argv[2]}")
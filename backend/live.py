@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def reading_changes(previous, current):
+    """Fields of current that differ from previous (all of them if there is no previous reading)"""
+    if previous is None:
+        return dict(current)
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+
+class Subscription:
+    """One client's interest in a set of grid cells; deliver(cell, event) is called for each update"""
+
+    def __init__(self, cells, deliver):
+        self.cells = set(cells)
+        self.deliver = deliver
+
+
+class LiveHub:
+    """Pushes AQI changes for grid cells to every subscriber of the cell from one shared poll
+
+    Every ``interval`` seconds the hub reads each subscribed cell once through
+    ``fetch(lat, lon)``, which goes through the AQI cache, and sends only the fields
+    that changed to every subscriber of that cell. Upstream calls therefore follow
+    the cache TTL per cell, however many clients are listening.
+    """
+
+    def __init__(self, fetch, interval=60, executor=None):
+        self.fetch = fetch
+        self.interval = interval
+        self.executor = executor
+        self._cells = {}
+        self._readings = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.polls = 0
+        self.updates = 0
+        self.deliveries = 0
+        self.errors = 0
+
+    def subscribe(self, cells, deliver):
+        subscription = Subscription(cells, deliver)
+        with self._lock:
+            for cell in subscription.cells:
+                self._cells.setdefault(cell, set()).add(subscription)
+        self._start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for cell in subscription.cells:
+                subscribers = self._cells.get(cell)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._cells[cell]
+                    self._readings.pop(cell, None)
+
+    def current(self, cell):
+        """Latest reading for a cell, fetching it if the hub has not read it yet"""
+        reading = self._readings.get(cell)
+        if reading is None:
+            reading = self.fetch(*cell)
+            if reading is not None:
+                with self._lock:
+                    if cell in self._cells:
+                        self._readings.setdefault(cell, reading)
+        return reading
+
+    def _start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='live-hub', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                self.errors += 1
+                logger.exception("Live update poll failed")
+
+    def poll(self):
+        """Read every subscribed cell once and publish the changes"""
+        with self._lock:
+            cells = list(self._cells)
+        if not cells:
+            return
+        if self.executor is None:
+            readings = [self._fetch(cell) for cell in cells]
+        else:
+            readings = list(self.executor.map(self._fetch, cells))
+        self.polls += 1
+
+        for cell, reading in zip(cells, readings):
+            if reading is None:
+                continue
+            with self._lock:
+                subscribers = list(self._cells.get(cell, ()))
+                previous = self._readings.get(cell)
+                if subscribers:
+                    self._readings[cell] = reading
+            changes = reading_changes(previous, reading)
+            if not subscribers or not changes:
+                continue
+            self.updates += 1
+            event = {'changes': changes, 'updated_at': time.time()}
+            for subscription in subscribers:
+                subscription.deliver(cell, event)
+                self.deliveries += 1
+
+    def _fetch(self, cell):
+        try:
+            return self.fetch(*cell)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Live update fetch failed", extra={'cell': cell, 'error': str(e)})
+            return None
+
+    def stats(self):
+        with self._lock:
+            cells = len(self._cells)
+            subscriptions = len({s for subscribers in self._cells.values() for s in subscribers})
+        return {
+            'cells': cells,
+            'subscriptions': subscriptions,
+            'interval_seconds': self.interval,
+            'polls': self.polls,
+            'updates': self.updates,
+            'deliveries': self.deliveries,
+            'errors': self.errors,
+        }
@@ -0,0 +1,186 @@
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from cache hits to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, '') for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name + '_total', _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Bucketed distribution of observations (e.g. latencies) per label combination"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then sum
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(values)) for key, values in self._series.items()]
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), values):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                yield self.name + '_bucket', labels, cumulative
+            yield self.name + '_sum', _format_labels(self.labelnames, key), round(values[-1], 6)
+            yield self.name + '_count', _format_labels(self.labelnames, key), cumulative
+
+
+class Registry:
+    """Metrics plus scrape-time collectors, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect):
+        """Add collect() -> iterable of (name, type, help, labelnames, [(label_values, value)])
+
+        Collectors read existing stats (cache sizes, hit ratios) only when scraped,
+        so they cost nothing on the request path.
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(f'{name}{labels} {_format_value(value)}' for name, labels, value in metric.samples())
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                logger.warning("Metrics collector failed: %s", e)
+                continue
+            for name, metric_type, help, labelnames, samples in families:
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for label_values, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f'{name}{_format_labels(labelnames, label_values)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'pollution_stage_duration_seconds',
+    'Time spent in each stage of building a pollution report',
+    ('stage', 'outcome'),
+)
+UPSTREAM_SECONDS = registry.histogram(
+    'pollution_upstream_request_duration_seconds',
+    'Upstream provider call latency, including retries',
+    ('provider', 'outcome'),
+)
+HTTP_SECONDS = registry.histogram(
+    'pollution_http_request_duration_seconds',
+    'Request latency per endpoint and status',
+    ('endpoint', 'method', 'status'),
+)
+REPORTS_COALESCED = registry.counter(
+    'pollution_report_requests_coalesced',
+    'Report requests answered with the result of an identical request in flight, in this worker or another',
+    ('scope',),
+)
+
+
+@contextmanager
+def span(stage, **fields):
+    """Time a block as a pipeline stage, recording its outcome ('ok' or 'error')
+
+    The yielded dict may be updated by the block (e.g. outcome='no_data'); every
+    field is included in the debug log line for the span.
+    """
+    record = {'outcome': 'ok'}
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        record['outcome'] = 'error'
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage, outcome=record['outcome'])
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("span", extra={'stage': stage, 'elapsed_ms': round(elapsed * 1000, 2), **fields, **record})
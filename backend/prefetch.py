@@ -0,0 +1,180 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from cache import normalize_key
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, where every process prefetches
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchTask:
+    """One kind of refresh for the hot set, paced on its own
+
+    Each cycle calls ``refresh(location)`` once for every hot location, spacing
+    the calls evenly across ``interval`` seconds and at least ``min_spacing``
+    apart. While ``allowed()`` returns False (e.g. the provider's quota is
+    running low) refreshes are skipped rather than made.
+    """
+
+    def __init__(self, name, refresh, interval=600, min_spacing=1.0, allowed=None):
+        self.name = name
+        self.refresh = refresh
+        self.interval = interval
+        self.min_spacing = min_spacing
+        self.allowed = allowed
+        self.next_at = 0.0
+        self._pending = []
+        self._spacing = min_spacing
+        self._cycle_started = None
+        self.cycles = 0
+        self.refreshed = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_cycle_seconds = None
+
+    def stats(self):
+        return {
+            'interval_seconds': self.interval,
+            'cycles': self.cycles,
+            'refreshed': self.refreshed,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'last_cycle_seconds': self.last_cycle_seconds,
+        }
+
+
+class PrefetchScheduler:
+    """Keeps caches warm for the most requested locations
+
+    The hot set is the seed locations plus the ``max_observed`` locations most
+    requested recently. Each task (one per provider, say) refreshes every hot
+    location once per cycle at its own pace, so a provider with a small quota
+    can be refreshed far less often than the others. Request counts decay after
+    every cycle of the first task.
+
+    With ``lock_path`` only the process holding an exclusive lock on that file
+    refreshes; the others retry every ``LEADER_RETRY_SECONDS`` and take over
+    if the leader exits. The leader's refreshes have to reach the other
+    processes through shared caches, and its hot set is built from the
+    requests it served itself.
+    """
+
+    LEADER_RETRY_SECONDS = 30
+
+    def __init__(self, tasks, seeds=(), max_observed=50, lock_path=None):
+        self.tasks = list(tasks)
+        self.seeds = list(seeds)
+        self.max_observed = max_observed
+        self.lock_path = lock_path
+        self._lock_file = None
+        self.leader = False
+        self._counts = Counter()
+        self._labels = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    def record(self, location):
+        """Count a request for a location so frequently requested ones join the hot set"""
+        key = normalize_key(location)
+        with self._lock:
+            self._counts[key] += 1
+            self._labels[key] = location.strip()
+
+    def hot_set(self):
+        """Seed locations followed by the most requested observed ones"""
+        locations = {normalize_key(seed): seed for seed in self.seeds}
+        with self._lock:
+            for key, _ in self._counts.most_common(self.max_observed):
+                locations.setdefault(key, self._labels[key])
+        return list(locations.values())
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='prefetch', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _take_leadership(self):
+        """Whether this process may refresh: it holds the lock, or there is none to hold"""
+        if self.lock_path is None or fcntl is None:
+            return True
+        if self._lock_file is None:
+            directory = os.path.dirname(self.lock_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        logger.info("Prefetch leader", extra={'pid': os.getpid()})
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.leader:
+                self.leader = self._take_leadership()
+                if not self.leader:
+                    self._stop.wait(self.LEADER_RETRY_SECONDS)
+                    continue
+            task = min(self.tasks, key=lambda t: t.next_at)
+            if not self._stop.wait(max(0.0, task.next_at - time.monotonic())):
+                self.step(task)
+
+    def step(self, task):
+        """Run a task's next refresh, starting a new cycle over the hot set when the last one is done"""
+        now = time.monotonic()
+        if not task._pending:
+            task._pending = self.hot_set()
+            task._cycle_started = now
+            task._spacing = max(task.min_spacing, task.interval / max(len(task._pending), 1))
+        if task._pending:
+            location = task._pending.pop(0)
+            if task.allowed is not None and not task.allowed():
+                task.skipped += 1
+            else:
+                try:
+                    task.refresh(location)
+                    task.refreshed += 1
+                except Exception as e:
+                    task.errors += 1
+                    logger.warning("Prefetch failed", extra={'task': task.name, 'location': location, 'error': str(e)})
+        if task._pending:
+            task.next_at = now + task._spacing
+            return
+        task.cycles += 1
+        task.last_cycle_seconds = round(time.monotonic() - task._cycle_started, 2)
+        task.next_at = task._cycle_started + task.interval
+        if task is self.tasks[0]:
+            self._decay()
+
+    def _decay(self):
+        # Halve counts each cycle so the hot set follows current traffic
+        with self._lock:
+            for key in list(self._counts):
+                self._counts[key] //= 2
+                if not self._counts[key]:
+                    del self._counts[key]
+                    del self._labels[key]
+
+    def stats(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'leader': self.leader,
+            'hot_set': self.hot_set(),
+            'tasks': {task.name: task.stats() for task in self.tasks},
+        }
@@ -0,0 +1,178 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Quota window -> seconds. A limit of N per window is a bucket holding up to N
+# tokens that refills at N / seconds tokens per second.
+WINDOWS = {'per_second': 1, 'per_minute': 60, 'per_hour': 3600, 'per_day': 86400}
+
+
+class QuotaExceededError(requests.RequestException):
+    """Raised instead of calling a provider whose request budget is used up"""
+
+
+class QuotaStore:
+    """Token bucket levels in a SQLite file, so every worker on the host draws from the same budgets"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS buckets (provider TEXT, bucket TEXT, tokens REAL NOT NULL, '
+            'updated REAL NOT NULL, PRIMARY KEY (provider, bucket))'
+        )
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads, so keep one per thread.
+        # Autocommit mode, so take() controls its own transaction.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _after_fork(self):
+        # A forked worker (e.g. of a preloaded gunicorn master) opens its own connection. The
+        # parent's stays referenced rather than closed, since closing it could checkpoint its WAL
+        self._parent_local, self._local = self._local, threading.local()
+
+    def _levels(self, conn, provider, limits, now):
+        rows = {
+            bucket: (tokens, updated) for bucket, tokens, updated in conn.execute(
+                'SELECT bucket, tokens, updated FROM buckets WHERE provider = ?', (provider,)
+            )
+        }
+        levels = {}
+        for bucket, limit in limits.items():
+            # A bucket seen for the first time starts full
+            tokens, updated = rows.get(bucket, (limit, now))
+            levels[bucket] = min(limit, tokens + max(0.0, now - updated) * limit / WINDOWS[bucket])
+        return levels
+
+    def _write(self, conn, provider, levels, now):
+        conn.executemany(
+            'INSERT OR REPLACE INTO buckets (provider, bucket, tokens, updated) VALUES (?, ?, ?, ?)',
+            [(provider, bucket, tokens, now) for bucket, tokens in levels.items()]
+        )
+
+    def take(self, provider, limits, cost=1.0):
+        """Take cost tokens from every bucket of a provider, or none if any bucket is short
+
+        Returns 0.0 when granted, otherwise the seconds until the request could be.
+        """
+        now = time.time()
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front, so concurrent workers serialize here
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            levels = self._levels(conn, provider, limits, now)
+            wait = max(
+                ((cost - tokens) * WINDOWS[bucket] / limits[bucket]
+                 for bucket, tokens in levels.items() if tokens < cost),
+                default=0.0,
+            )
+            if not wait:
+                self._write(conn, provider, {bucket: tokens - cost for bucket, tokens in levels.items()}, now)
+            conn.execute('COMMIT')
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        return wait
+
+    def levels(self, provider, limits):
+        """Tokens currently left in each bucket"""
+        return self._levels(self._connection(), provider, limits, time.time())
+
+    def drain(self, provider, limits):
+        """Empty every bucket of a provider, e.g. after it answered 429"""
+        conn = self._connection()
+        with conn:
+            self._write(conn, provider, dict.fromkeys(limits, 0.0), time.time())
+
+
+class ProviderQuota:
+    """One provider's request budget: a token bucket per configured window, held in a QuotaStore
+
+    ``acquire`` waits up to ``max_wait`` seconds for a token (enough to pace a
+    1 request/second API) and otherwise raises QuotaExceededError, which provider
+    lookups handle like any other request failure by falling back to cached or
+    alternative data.
+    """
+
+    def __init__(self, store, provider, limits, max_wait=0.0):
+        self.store = store
+        self.provider = provider
+        self.limits = {bucket: float(limit) for bucket, limit in limits.items() if limit and limit > 0}
+        self.max_wait = max_wait
+        self.granted = 0
+        self.rejected = 0
+        self.waited = 0
+        self.errors = 0
+
+    def take(self):
+        """Take a token now: 0.0 if granted, otherwise seconds until one is available"""
+        try:
+            wait = self.store.take(self.provider, self.limits)
+        except sqlite3.Error as e:
+            # An unusable quota store must not take the providers down with it
+            self.errors += 1
+            logger.warning("Quota store unavailable, allowing request",
+                           extra={'provider': self.provider, 'error': str(e)})
+            return 0.0
+        if not wait:
+            self.granted += 1
+        return wait
+
+    def exceeded(self, wait):
+        """Count a rejected call and build the error to raise for it"""
+        self.rejected += 1
+        return QuotaExceededError(f"{self.provider} quota exhausted, next request allowed in {wait:.1f}s")
+
+    def acquire(self):
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = self.take()
+            if not wait:
+                return
+            if time.monotonic() + wait > deadline:
+                raise self.exceeded(wait)
+            self.waited += 1
+            time.sleep(wait)
+
+    def drain(self):
+        try:
+            self.store.drain(self.provider, self.limits)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning("Quota store unavailable, could not drain",
+                           extra={'provider': self.provider, 'error': str(e)})
+
+    def remaining(self):
+        try:
+            return {bucket: int(tokens) for bucket, tokens in self.store.levels(self.provider, self.limits).items()}
+        except sqlite3.Error:
+            return {}
+
+    def stats(self):
+        return {
+            'limits': {bucket: int(limit) for bucket, limit in self.limits.items()},
+            'remaining': self.remaining(),
+            'granted': self.granted,
+            'rejected': self.rejected,
+            'waited': self.waited,
+            'errors': self.errors,
+        }
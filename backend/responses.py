@@ -0,0 +1,138 @@
+import gzip
+import hashlib
+import threading
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli to serve br alongside gzip
+    brotli = None
+
+# Preferred content codings, best first
+CODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _compress(data, coding):
+    if coding == 'br':
+        # Quality 5 compresses about as fast as gzip level 6 and noticeably smaller
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+class Body:
+    """One serialized response body with its ETag and compressed variants, each built on first use
+
+    Static bodies are kept and reused, so serving them again costs no
+    serialization, hashing or compression. A weak ETag (``weak=True``) marks
+    bodies that are only semantically equal between requests; it is shared by
+    every content coding, while a strong ETag gets a per-coding suffix.
+    """
+
+    def __init__(self, data, etag=None, weak=False):
+        self.data = data
+        self.weak = weak
+        self._etag = etag
+        self._encoded = {}
+
+    @property
+    def etag(self):
+        if self._etag is None:
+            self._etag = hashlib.blake2b(self.data, digest_size=16).hexdigest()
+        return self._etag
+
+    def etag_for(self, coding):
+        return f'{self.etag}-{coding}' if coding and not self.weak else self.etag
+
+    def encoded(self, coding):
+        if coding is None:
+            return self.data
+        data = self._encoded.get(coding)
+        if data is None:
+            data = self._encoded[coding] = _compress(self.data, coding)
+        return data
+
+
+def negotiate(accept_encoding, size, min_size):
+    """Content coding to send for an Accept-Encoding header value, or None for identity"""
+    if size < min_size or not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for coding in CODINGS:
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def not_modified(if_none_match, etag):
+    """Whether an If-None-Match header value matches etag, using weak comparison"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag.strip('"') == etag:
+            return True
+    return False
+
+
+def prepare(body, accept_encoding, if_none_match, min_size, conditional=True):
+    """Pick the representation of body to send: (data, headers)
+
+    data is None when the request's If-None-Match already names the current
+    representation, so the caller answers 304 with the returned headers.
+    """
+    coding = negotiate(accept_encoding, len(body.data), min_size)
+    headers = {}
+    if len(body.data) >= min_size:
+        headers['Vary'] = 'Accept-Encoding'
+    if conditional:
+        tag = body.etag_for(coding)
+        headers['ETag'] = f'W/"{tag}"' if body.weak else f'"{tag}"'
+        if not_modified(if_none_match, tag):
+            return None, headers
+    if coding:
+        headers['Content-Encoding'] = coding
+    return body.encoded(coding), headers
+
+
+class BodyCache:
+    """Precomputed Bodies for responses that only change when their source data is reloaded"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def get(self, key, build):
+        body = self._bodies.get(key)
+        if body is not None:
+            self.hits += 1
+            return body
+        body = build()
+        with self._lock:
+            self.builds += 1
+            if len(self._bodies) >= self.maxsize:
+                self._bodies.pop(next(iter(self._bodies)))
+            self._bodies[key] = body
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._bodies.clear()
+
+    def stats(self):
+        return {'size': len(self._bodies), 'hits': self.hits, 'builds': self.builds, 'codings': list(CODINGS)}
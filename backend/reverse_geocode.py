@@ -0,0 +1,90 @@
+import json
+
+from attribution import SpatialGrid
+
+
+def point_in_polygon(lat, lon, ring):
+    """Ray casting test for a point against a closed ring of [lon, lat] vertices"""
+    inside = False
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if (y1 > lat) != (y2 > lat) and lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+class ReverseGeocoder:
+    """Offline coordinates -> place lookup over bundled city points and country outlines
+
+    The nearest city within ``radius_km`` gives the city, state and country; a
+    point away from every city takes its country from the outline containing it.
+    Lookups are in-memory, so coordinate requests need no Nominatim round trip.
+    """
+
+    def __init__(self, radius_km=50, cell_degrees=1.0):
+        self.radius_km = radius_km
+        self._grid = SpatialGrid(cell_degrees)
+        # (name, (min_lon, min_lat, max_lon, max_lat), ring) per outline
+        self._outlines = []
+        self.lookups = 0
+        self.city_matches = 0
+        self.country_matches = 0
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path, encoding='utf-8') as f:
+            regions = json.load(f)
+        geocoder = cls(**kwargs)
+        for city in regions.get('cities', []):
+            geocoder.add_city(city['name'], city.get('state'), city['country'], city['lat'], city['lon'])
+        for country in regions.get('countries', []):
+            for ring in country['polygons']:
+                geocoder.add_outline(country['name'], ring)
+        return geocoder
+
+    def add_city(self, name, state, country, lat, lon):
+        self._grid.add(lat, lon, (name, state, country))
+
+    def add_outline(self, country, ring):
+        lons = [point[0] for point in ring]
+        lats = [point[1] for point in ring]
+        self._outlines.append((country, (min(lons), min(lats), max(lons), max(lats)), ring))
+
+    def country_at(self, lat, lon):
+        """Country whose outline contains the point, or None"""
+        for country, (min_lon, min_lat, max_lon, max_lat), ring in self._outlines:
+            if min_lon <= lon <= max_lon and min_lat <= lat <= max_lat and point_in_polygon(lat, lon, ring):
+                return country
+        return None
+
+    def resolve(self, lat, lon):
+        """Location details for a coordinate, shaped like a geocoding result; unknown parts are None"""
+        self.lookups += 1
+        city = state = country = None
+        place, _ = self._grid.nearest(lat, lon, self.radius_km)
+        if place:
+            city, state, country = place
+            self.city_matches += 1
+        else:
+            country = self.country_at(lat, lon)
+        if country:
+            self.country_matches += 1
+        return {
+            'country': country,
+            'state': state,
+            'city': city,
+            'address': ', '.join(part for part in (city, state, country) if part) or f"{lat},{lon}",
+            'lat': lat,
+            'lon': lon,
+        }
+
+    def stats(self):
+        return {
+            'city_points': len(self._grid),
+            'country_outlines': len(self._outlines),
+            'radius_km': self.radius_km,
+            'lookups': self.lookups,
+            'city_matches': self.city_matches,
+            'country_matches': self.country_matches,
+        }
@@ -0,0 +1,123 @@
+"""Startup cost of this process: time spent importing each module and in named boot phases
+
+Imported first by app.py, it times every module imported until ``finish()``
+through a meta path finder (the same self/cumulative split as ``python -X
+importtime``), plus the phases app.py wraps in ``phase()``, such as loading
+the inventory. The report is logged once the app is ready and served under
+``startup`` in /api/stats.
+"""
+import sys
+import time
+from contextlib import contextmanager
+from importlib.abc import Loader, MetaPathFinder
+from importlib.util import find_spec
+
+STARTED = time.perf_counter()
+
+
+class _TimedLoader(Loader):
+    """Wraps a module's loader to time its execution, then hands the module its real loader"""
+
+    def __init__(self, loader, timer):
+        self.loader = loader
+        self.timer = timer
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        # Modules and tools that inspect __loader__ see the real one
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+        self.timer.enter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.timer.leave(module.__name__)
+
+
+class ImportTimer(MetaPathFinder):
+    """Meta path finder that times the execution of every module imported while it is installed"""
+
+    def __init__(self):
+        # name -> (own seconds, cumulative seconds); top_level only has the modules imported
+        # directly by the importing code rather than by another timed module
+        self.modules = {}
+        self.top_level = {}
+        # Cumulative seconds of the children of each module being executed
+        self._children = []
+        self._finding = set()
+
+    def find_spec(self, name, path=None, target=None):
+        if name in self._finding:
+            return None
+        self._finding.add(name)
+        try:
+            spec = find_spec(name)
+        except (ImportError, ValueError):
+            return None
+        finally:
+            self._finding.discard(name)
+        if spec is None or spec.loader is None or not hasattr(spec.loader, 'exec_module'):
+            return spec
+        spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def enter(self):
+        self._children.append([time.perf_counter(), 0.0])
+
+    def leave(self, name):
+        started, children = self._children.pop()
+        cumulative = time.perf_counter() - started
+        self.modules[name] = (cumulative - children, cumulative)
+        if self._children:
+            self._children[-1][1] += cumulative
+        else:
+            self.top_level[name] = cumulative
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+class StartupReport:
+    def __init__(self):
+        self.imports = ImportTimer()
+        self.phases = {}
+        self.ready_seconds = None
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def finish(self):
+        """Stop timing imports and record how long the process took to get ready"""
+        self.imports.uninstall()
+        self.ready_seconds = time.perf_counter() - STARTED
+
+    def report(self, top=10):
+        """Boot time, phase times, each direct import's total cost and the modules slowest on their own"""
+        direct = sorted(self.imports.top_level.items(), key=lambda item: item[1], reverse=True)
+        slowest = sorted(self.imports.modules.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        return {
+            'ready_ms': None if self.ready_seconds is None else round(self.ready_seconds * 1000, 1),
+            'modules_imported': len(self.imports.modules),
+            'phases_ms': {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()},
+            'imports_ms': {name: round(seconds * 1000, 1) for name, seconds in direct[:top]},
+            'slowest_imports_ms': [
+                {'module': name, 'self': round(own * 1000, 1), 'cumulative': round(cumulative * 1000, 1)}
+                for name, (own, cumulative) in slowest
+            ],
+        }
+
+
+startup = StartupReport()
+startup.imports.install()
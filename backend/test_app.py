@@ -0,0 +1,86 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from werkzeug.test import EnvironBuilder
+
+# The app reads its settings at import; keep its caches and history out of the source tree
+os.environ.setdefault('CACHE_DIR', tempfile.mkdtemp(prefix='pollution-test-'))
+os.environ.setdefault('HISTORY_ENABLED', 'false')
+os.environ.setdefault('QUOTA_ENABLED', 'false')
+
+import app as backend  # noqa: E402
+from quota import ProviderQuota, QuotaStore  # noqa: E402
+
+
+class TestPollutionData(unittest.TestCase):
+    def setUp(self):
+        self.client = backend.app.test_client()
+
+    def test_polar_coordinates_answer_quickly(self):
+        for lat in ('90', '-90', '89.99'):
+            started = time.perf_counter()
+            response = self.client.get(f'/api/pollution-data?lat={lat}&lon=0&fields=pollution_sources')
+            self.assertLess(time.perf_counter() - started, 1.0)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('pollution_sources', response.get_json())
+
+    def test_out_of_range_coordinates_are_rejected(self):
+        response = self.client.get('/api/pollution-data?lat=90.5&lon=0')
+        self.assertEqual(response.status_code, 400)
+
+
+class TestReportMaxAge(unittest.TestCase):
+    def setUp(self):
+        self.cell = backend.snap_to_grid(10.0, 20.0)
+        ttls = {'weatherapi': 100, 'openweather': 1000, 'waqi': 2000}
+        for patcher in (mock.patch.dict(backend.AQI_CACHE_TTL_SECONDS, ttls),
+                        mock.patch.object(backend, 'POLLUTION_DATA_MAX_AGE_SECONDS', 3600)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for provider in ttls:
+            backend.aqi_cache.set((provider,) + self.cell, {'aqi': 100}, ttls[provider])
+
+    def payload(self, aqi_data):
+        return {
+            'coordinates': {'latitude': self.cell[0], 'longitude': self.cell[1]},
+            'aqi_data': aqi_data,
+            'providers': {name: {'status': 'ok', 'elapsed_ms': 1.0} for name in ('weatherapi', 'openweather', 'waqi')},
+        }
+
+    def test_fused_report_follows_the_fused_providers(self):
+        aqi_data = {'aqi': 100, 'fusion': {'providers': ['openweather', 'waqi']}}
+        self.assertAlmostEqual(backend.report_max_age(self.payload(aqi_data)), 1000, delta=2)
+
+    def test_single_provider_report_follows_the_providers_that_answered(self):
+        self.assertAlmostEqual(backend.report_max_age(self.payload({'aqi': 100})), 100, delta=2)
+
+
+class TestPollutionStream(unittest.TestCase):
+    def test_stream_closed_before_it_starts_leaves_no_subscription(self):
+        # Called as a WSGI app, since the test client already reads the first event
+        environ = EnvironBuilder('/api/pollution-stream', query_string={'lat': '10', 'lon': '20'}).get_environ()
+        statuses = []
+        stream = backend.app(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        self.assertEqual(statuses, ['200 OK'])
+        self.assertEqual(backend.live_streams_open, 1)
+        stream.close()
+        self.assertEqual(backend.live_streams_open, 0)
+        self.assertEqual(backend.live_hub.stats()['subscriptions'], 0)
+
+class TestNewsPrefetchBudget(unittest.TestCase):
+    def test_news_prefetch_stops_at_the_reserved_share_of_the_quota(self):
+        store = QuotaStore(os.path.join(backend.CACHE_DIR, 'test-quota.sqlite3'))
+        quota = ProviderQuota(store, 'newsapi-test', {'per_day': 100})
+        with mock.patch.object(backend.PROVIDER_CLIENTS['newsapi'], 'quota', quota):
+            for _ in range(49):
+                quota.take()
+            self.assertTrue(backend.news_prefetch_allowed())
+            quota.take()
+            self.assertFalse(backend.news_prefetch_allowed())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import time
+import unittest
+
+from attribution import SourceAttributionIndex, SpatialGrid
+
+
+class TestMatchCity(unittest.TestCase):
+    def setUp(self):
+        self.index = SourceAttributionIndex(radius_km=50)
+        self.index.add_city('Paris', 48.8566, 2.3522, aliases=('Paris, France',), country='France')
+        self.index.add_city('London', 51.5074, -0.1278, country='United Kingdom')
+        self.index.add_country('United Kingdom', aliases=('UK',))
+
+    def test_name_in_geocoded_country(self):
+        location_data = {'city': 'Paris', 'country': 'France', 'lat': 48.85, 'lon': 2.35}
+        self.assertEqual(self.index.match_city('Paris', location_data), 'Paris')
+
+    def test_same_name_city_in_another_country(self):
+        texas = {'city': 'Paris', 'country': 'United States', 'lat': 33.6609, 'lon': -95.5555}
+        self.assertIsNone(self.index.match_city('Paris, Texas', texas))
+        ontario = {'city': 'London', 'country': 'Canada', 'lat': 42.9849, 'lon': -81.2453}
+        self.assertIsNone(self.index.match_city('London', ontario))
+
+    def test_country_alias_counts_as_same_country(self):
+        location_data = {'city': 'London', 'country': 'UK'}
+        self.assertEqual(self.index.match_city('London', location_data), 'London')
+
+    def test_coordinates_near_city_without_country(self):
+        self.assertEqual(self.index.match_city('Paris', {'lat': 48.9, 'lon': 2.4}), 'Paris')
+        self.assertIsNone(self.index.match_city('Paris', {'lat': 33.66, 'lon': -95.55}))
+
+    def test_name_match_kept_when_geocoding_failed(self):
+        self.assertEqual(self.index.match_city('Paris, France', {}), 'Paris')
+
+    def test_falls_back_to_nearest_city(self):
+        location_data = {'city': 'Montmartre', 'country': 'France', 'lat': 48.8867, 'lon': 2.3431}
+        self.assertEqual(self.index.match_city('Montmartre', location_data), 'Paris')
+
+
+class TestSpatialGrid(unittest.TestCase):
+    def setUp(self):
+        self.grid = SpatialGrid()
+        self.grid.add(89.9, 10.0, 'north')
+        self.grid.add(-89.9, -170.0, 'south')
+        self.grid.add(0.0, 179.9, 'east')
+
+    def assertFound(self, lat, lon, expected):
+        started = time.perf_counter()
+        item, distance = self.grid.nearest(lat, lon, 50)
+        self.assertLess(time.perf_counter() - started, 0.1)
+        self.assertEqual(item, expected)
+        return distance
+
+    def test_poles_scan_each_column_once(self):
+        self.assertLess(self.assertFound(90, 0, 'north'), 12)
+        self.assertFound(89.99, -170.0, 'north')
+        self.assertFound(-90, 0, 'south')
+        self.assertFound(-89.99, 10.0, 'south')
+
+    def test_search_wraps_at_antimeridian(self):
+        self.assertFound(0.0, -179.9, 'east')
+        self.assertFound(45.0, 0.0, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
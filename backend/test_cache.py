@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from cache import (MISSING, SharedSingleFlight, SingleFlight, SQLiteCache, StaleWhileRevalidateCache, TieredCache,
+                   TTLCache, fcntl)
+
+
+class CacheDirTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def sqlite_cache(self, name='cache'):
+        return SQLiteCache(os.path.join(self.directory, f'{name}.sqlite3'), table=name)
+
+
+class TestTieredCache(CacheDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = TieredCache(TTLCache(maxsize=16, ttl=60), self.sqlite_cache())
+
+    def test_disk_hit_is_promoted_into_memory(self):
+        self.cache.disk.set('delhi', {'lat': 28.6}, 60)
+        self.assertEqual(self.cache.get('delhi'), {'lat': 28.6})
+        self.assertEqual(self.cache.get('delhi'), {'lat': 28.6})
+        stats = self.cache.stats()
+        self.assertEqual((stats['memory']['hits'], stats['disk']['hits'], stats['hits']), (1, 1, 2))
+
+    def test_read_error_counts_as_miss(self):
+        failing = mock.patch.object(self.cache.disk, '_connection', side_effect=sqlite3.OperationalError('locked'))
+        with failing:
+            self.assertIs(self.cache.get('delhi'), MISSING)
+        stats = self.cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['disk']['read_errors'], 1)
+        self.assertEqual(stats['write_errors'], 0)
+
+    def test_write_error_is_not_a_miss(self):
+        failing = mock.patch.object(self.cache.disk, '_connection', side_effect=sqlite3.OperationalError('locked'))
+        with failing:
+            self.cache.set('delhi', {'lat': 28.6}, 60)
+        self.assertEqual(self.cache.get('delhi'), {'lat': 28.6})
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['write_errors']), (1, 0, 1))
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_callers_share_one_execution(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'reading'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flights.do('delhi', fetch)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flights.do('delhi', fetch))) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        while flights.stats()['collapsed'] < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+        self.assertEqual(results, ['reading'] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.stats(), {'in_flight': 0, 'executions': 1, 'collapsed': 3})
+
+    def test_error_is_raised_and_not_kept(self):
+        flights = SingleFlight()
+
+        def fail():
+            raise ValueError('upstream')
+
+        with self.assertRaises(ValueError):
+            flights.do('delhi', fail)
+        self.assertEqual(flights.do('delhi', lambda: 'reading'), 'reading')
+
+
+class TestStaleWhileRevalidateCache(CacheDirTestCase):
+    def test_fresh_then_stale_then_miss(self):
+        cache = StaleWhileRevalidateCache(ttl=10, stale_ttl=20)
+        now = [1000.0]
+        with mock.patch('cache.time.time', lambda: now[0]):
+            cache.set('delhi', 'reading')
+            self.assertEqual(cache.lookup('delhi'), ('reading', 'fresh'))
+            now[0] += 15
+            self.assertEqual(cache.lookup('delhi'), ('reading', 'stale'))
+            self.assertEqual(cache.lookup('mumbai'), (None, 'miss'))
+
+    def test_value_stored_by_another_worker_is_served_from_shared_tier(self):
+        shared = self.sqlite_cache('aqi')
+        prefetching = StaleWhileRevalidateCache(ttl=60, shared=shared)
+        serving = StaleWhileRevalidateCache(ttl=60, shared=SQLiteCache(shared.path, table='aqi'))
+        prefetching.set(('weatherapi', 28.6, 77.2), {'aqi': 150})
+        self.assertEqual(serving.lookup(('weatherapi', 28.6, 77.2)), ({'aqi': 150}, 'fresh'))
+        self.assertEqual(serving.stats()['shared_hits'], 1)
+        self.assertTrue(serving.is_fresh(('weatherapi', 28.6, 77.2)))
+
+    def test_older_shared_value_does_not_replace_memory(self):
+        shared = self.sqlite_cache('aqi')
+        other = StaleWhileRevalidateCache(ttl=10, shared=SQLiteCache(shared.path, table='aqi'))
+        cache = StaleWhileRevalidateCache(ttl=10, stale_ttl=60, shared=shared)
+        now = [1000.0]
+        with mock.patch('cache.time.time', lambda: now[0]):
+            other.set('delhi', 'older')
+            now[0] += 1
+            cache.set('delhi', 'newer')
+            now[0] += 15
+            self.assertEqual(cache.lookup('delhi'), ('newer', 'stale'))
+        self.assertEqual(cache.stats()['shared_hits'], 0)
+
+
+def run_shared_flight(lock_path, results_path, calls_path, barrier, queue):
+    flights = SharedSingleFlight(lock_path, SQLiteCache(results_path, table='flights'))
+
+    def build():
+        with open(calls_path, 'a') as calls:
+            calls.write(f'{os.getpid()}\n')
+        time.sleep(1.0)
+        return {'aqi': 150, 'built_by': os.getpid()}
+
+    barrier.wait(10)
+    queue.put((flights.do('["Delhi"]', build), flights.stats()['reused']))
+
+
+@unittest.skipIf(fcntl is None, 'SharedSingleFlight needs fcntl (POSIX)')
+class TestSharedSingleFlight(CacheDirTestCase):
+    def test_identical_calls_in_several_processes_run_once(self):
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(4)
+        queue = context.Queue()
+        calls_path = os.path.join(self.directory, 'calls')
+        args = (os.path.join(self.directory, 'flights.lock'), os.path.join(self.directory, 'flights.sqlite3'),
+                calls_path, barrier, queue)
+        processes = [context.Process(target=run_shared_flight, args=args) for _ in range(4)]
+        for process in processes:
+            process.start()
+        outcomes = [queue.get(timeout=30) for _ in processes]
+        for process in processes:
+            process.join(10)
+
+        with open(calls_path) as calls:
+            self.assertEqual(len(calls.read().split()), 1)
+        results = [result for result, _ in outcomes]
+        self.assertEqual(len({result['built_by'] for result in results}), 1)
+        self.assertEqual(sum(reused for _, reused in outcomes), 3)
+
+    def test_later_call_runs_again(self):
+        flights = SharedSingleFlight(os.path.join(self.directory, 'flights.lock'), self.sqlite_cache('flights'))
+        self.assertEqual(flights.do('delhi', lambda: 1), 1)
+        self.assertEqual(flights.do('delhi', lambda: 2), 2)
+        self.assertEqual(flights.stats()['executions'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
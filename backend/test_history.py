@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from history import METRICS, HistoryStore
+
+HOUR = 1704067200
+
+
+def row(ts, provider, **values):
+    return (28.61, 77.21, ts, provider, *(values.get(m) for m in METRICS))
+
+
+class TestRollups(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'history.sqlite3')
+        self.store = HistoryStore(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def hourly(self):
+        resolution, points = self.store.query(28.61, 77.21, HOUR, HOUR + 3599, resolution='hour')
+        self.assertEqual(resolution, 'hour')
+        self.assertEqual(len(points), 1)
+        return points[0]
+
+    def test_unreported_values_do_not_skew_mean_or_min(self):
+        self.store.write([
+            row(HOUR + 60, 'weatherapi', aqi=150, pm25=60.0, so2=10.0),
+            row(HOUR + 120, 'openweather', aqi=170, pm25=80.0),
+            row(HOUR + 180, 'waqi', aqi=160, pm25=70.0),
+        ])
+        point = self.hourly()
+        self.assertEqual(point['count'], 3)
+        self.assertEqual(point['aqi'], {'count': 3, 'min': 150.0, 'mean': 160.0, 'max': 170.0})
+        self.assertEqual(point['so2'], {'count': 1, 'min': 10.0, 'mean': 10.0, 'max': 10.0})
+        self.assertEqual(point['co'], {'count': 0, 'min': None, 'mean': None, 'max': None})
+
+    def test_batches_fold_into_the_same_bucket(self):
+        self.store.write([row(HOUR + 60, 'weatherapi', aqi=100)])
+        self.store.write([row(HOUR + 120, 'weatherapi', pm10=40.0)])
+        self.store.write([row(HOUR + 180, 'weatherapi', aqi=200, pm10=20.0)])
+        point = self.hourly()
+        self.assertEqual(point['count'], 3)
+        self.assertEqual(point['aqi'], {'count': 2, 'min': 100.0, 'mean': 150.0, 'max': 200.0})
+        self.assertEqual(point['pm10'], {'count': 2, 'min': 20.0, 'mean': 30.0, 'max': 40.0})
+
+    def test_rewritten_reading_is_counted_once(self):
+        reading = row(HOUR + 60, 'weatherapi', aqi=100)
+        self.store.write([reading])
+        self.store.write([reading])
+        self.store.write([row(HOUR + 60, 'import', aqi=100)], any_provider=True)
+        self.assertEqual(self.hourly()['aqi']['count'], 1)
+
+    def test_rollups_from_before_value_counts_are_migrated(self):
+        self.directory.cleanup()
+        os.makedirs(self.directory.name)
+        summaries = ', '.join(f'{m}_sum REAL, {m}_min REAL, {m}_max REAL' for m in METRICS)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(
+                f'CREATE TABLE rollups (lat REAL, lon REAL, resolution TEXT, bucket INTEGER, count INTEGER, '
+                f'{summaries}, PRIMARY KEY (lat, lon, resolution, bucket)) WITHOUT ROWID'
+            )
+            conn.execute(
+                "INSERT INTO rollups (lat, lon, resolution, bucket, count, aqi_sum, aqi_min, aqi_max) "
+                "VALUES (28.61, 77.21, 'hour', ?, 2, 300, 140, 160)", (HOUR,)
+            )
+        conn.close()
+        self.store = HistoryStore(self.path)
+        self.store.write([row(HOUR + 60, 'weatherapi', aqi=180, pm25=50.0)])
+        point = self.hourly()
+        self.assertEqual(point['aqi'], {'count': 3, 'min': 140.0, 'mean': 160.0, 'max': 180.0})
+        self.assertEqual(point['pm25']['mean'], 50.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from unittest import mock
+
+import requests
+
+from http_client import CircuitBreaker, ProviderClient
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('http_client.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(window_size=10, min_requests=4, failure_threshold=0.5, reset_timeout=30)
+
+    def trip(self):
+        for _ in range(4):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_opens_once_failure_rate_reaches_threshold(self):
+        for record in (self.breaker.record_success, self.breaker.record_success, self.breaker.record_failure):
+            self.breaker.allow()
+            record()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.times_opened, 1)
+
+    def test_stays_closed_below_min_requests(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_rejects_until_reset_timeout(self):
+        self.trip()
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.rejected, 1)
+
+    def test_half_open_lets_one_probe_through(self):
+        self.trip()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_probe_closes(self):
+        self.trip()
+        self.now += 30
+        self.breaker.allow()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.stats()['window'], 1)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        self.trip()
+        self.now += 30
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+
+    def test_released_probe_can_be_taken_again(self):
+        self.trip()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertTrue(self.breaker.allow())
+
+
+class TestProviderClientBreaker(unittest.TestCase):
+    def setUp(self):
+        self.client = ProviderClient('test')
+        self.breaker = self.client.breaker
+        self.breaker.state = CircuitBreaker.HALF_OPEN
+
+    def test_probe_failing_upstream_reopens(self):
+        with mock.patch.object(self.client, '_get_with_retries', side_effect=requests.ConnectionError()):
+            with self.assertRaises(requests.ConnectionError):
+                self.client.get('http://example.invalid')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_probe_raising_anything_else_is_handed_back(self):
+        with mock.patch.object(self.client, '_get_with_retries', side_effect=ValueError('bad payload')):
+            with self.assertRaises(ValueError):
+                self.client.get('http://example.invalid')
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+import unittest
+
+from inventory import InventoryError, InventoryStore, compile_inventory
+
+SOURCES = [
+    {'source': 'Vehicle Emissions', 'percentage': 60, 'impact': 'high'},
+    {'source': 'Construction & Dust', 'percentage': 40, 'impact': 'medium'},
+]
+INVENTORY = {
+    'default': {'sources': SOURCES},
+    'countries': {'India': {'sources': SOURCES, 'source': 'Example survey'}},
+    'cities': {'Delhi': {'country': 'India', 'sources': SOURCES}},
+}
+
+
+class InventoryTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.json_path = os.path.join(directory.name, 'inventory.json')
+        self.bin_path = os.path.join(directory.name, 'inventory.bin')
+        self.mtime = 1700000000
+
+    def write(self, inventory):
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump(inventory, f)
+        # A distinct mtime per edit, however fast the test runs
+        self.mtime += 10
+        os.utime(self.json_path, (self.mtime, self.mtime))
+
+
+class TestCompile(InventoryTestCase):
+    def test_malformed_documents_raise_inventory_error(self):
+        malformed = {
+            'missing default': {'cities': {}},
+            'missing percentage': dict(INVENTORY, default={'sources': [{'source': 'Dust', 'impact': 'low'}]}),
+            'text percentage': dict(INVENTORY, default={'sources': [{'source': 'Dust', 'percentage': '100',
+                                                                     'impact': 'low'}]}),
+            'record not an object': dict(INVENTORY, cities={'Delhi': ['Vehicle Emissions']}),
+            'cities not an object': dict(INVENTORY, cities=[]),
+            'numeric source name': dict(INVENTORY, default={'sources': [{'source': 7, 'percentage': 100,
+                                                                         'impact': 'low'}]}),
+            'percentages off': dict(INVENTORY, default={'sources': SOURCES[:1]}),
+            'not an object': [],
+        }
+        for label, inventory in malformed.items():
+            with self.subTest(label):
+                self.write(inventory)
+                with self.assertRaises(InventoryError):
+                    compile_inventory(self.json_path, self.bin_path)
+
+
+class TestInventoryStore(InventoryTestCase):
+    def test_malformed_edit_keeps_previous_data_in_service(self):
+        self.write(INVENTORY)
+        store = InventoryStore(self.json_path, self.bin_path, check_interval=0)
+        self.assertEqual(store.cities['Delhi']['country'], 'India')
+
+        broken_city = dict(INVENTORY, cities={'Delhi': {'sources': [{'source': 'Dust', 'impact': 'low'}]}})
+        for inventory in ({'cities': {}}, broken_city, 'not an inventory'):
+            self.write(inventory)
+            self.assertEqual(store.cities['Delhi']['sources'], SOURCES)
+            self.assertEqual(store.countries['India']['source'], 'Example survey')
+
+        self.write(dict(INVENTORY, cities={}))
+        self.assertNotIn('Delhi', store.cities)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from unittest import mock
+
+from prefetch import PrefetchScheduler, PrefetchTask
+
+SEEDS = [f'City {i}' for i in range(20)]
+
+
+class TestPrefetchScheduler(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        patcher = mock.patch('prefetch.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = {'aqi': [], 'news': []}
+        self.aqi = PrefetchTask('aqi', self.calls['aqi'].append, interval=600, min_spacing=1.0)
+        self.news = PrefetchTask('news', self.calls['news'].append, interval=6 * 3600, min_spacing=1.0)
+        self.scheduler = PrefetchScheduler([self.aqi, self.news], seeds=SEEDS)
+
+    def run_for(self, seconds):
+        # What _run does, with the clock advanced instead of waited on
+        while True:
+            task = min(self.scheduler.tasks, key=lambda t: t.next_at)
+            if task.next_at > seconds:
+                return
+            self.now = max(self.now, task.next_at)
+            self.scheduler.step(task)
+
+    def test_each_task_refreshes_at_its_own_pace(self):
+        self.run_for(24 * 3600 - 1)
+        self.assertEqual(len(self.calls['aqi']), 20 * 144)
+        self.assertEqual(len(self.calls['news']), 20 * 4)
+        self.assertEqual(self.news.cycles, 4)
+
+    def test_refreshes_are_spread_over_the_interval(self):
+        self.scheduler.step(self.aqi)
+        self.assertEqual(self.aqi.next_at, 30.0)
+        self.run_for(599)
+        self.assertEqual(self.calls['aqi'], SEEDS)
+        self.assertEqual(self.aqi.next_at, 600.0)
+
+    def test_spacing_never_drops_below_min_spacing(self):
+        task = PrefetchTask('aqi', lambda location: None, interval=5, min_spacing=1.0)
+        scheduler = PrefetchScheduler([task], seeds=SEEDS)
+        scheduler.step(task)
+        self.assertEqual(task.next_at, 1.0)
+
+    def test_refreshes_are_skipped_while_not_allowed(self):
+        self.news.allowed = lambda: len(self.calls['news']) < 3
+        self.run_for(6 * 3600 - 1)
+        self.assertEqual(len(self.calls['news']), 3)
+        self.assertEqual(self.news.stats()['skipped'], 17)
+
+    def test_counts_decay_after_first_task_cycle(self):
+        for _ in range(3):
+            self.scheduler.record('Springfield')
+        self.assertIn('Springfield', self.scheduler.hot_set())
+        self.run_for(1199)
+        self.assertNotIn('Springfield', self.scheduler.hot_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
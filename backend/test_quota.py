@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from quota import ProviderQuota, QuotaExceededError, QuotaStore
+
+
+class TestQuotaStore(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'quota.sqlite3')
+        self.store = QuotaStore(self.path)
+        self.now = 1000.0
+        patcher = mock.patch('quota.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bucket_starts_full_and_refills_over_its_window(self):
+        limits = {'per_minute': 2.0}
+        self.assertEqual(self.store.take('newsapi', limits), 0.0)
+        self.assertEqual(self.store.take('newsapi', limits), 0.0)
+        self.assertAlmostEqual(self.store.take('newsapi', limits), 30.0)
+        self.now += 15
+        self.assertAlmostEqual(self.store.take('newsapi', limits), 15.0)
+        self.now += 15
+        self.assertEqual(self.store.take('newsapi', limits), 0.0)
+
+    def test_refill_is_capped_at_the_limit(self):
+        limits = {'per_minute': 2.0}
+        self.store.take('newsapi', limits)
+        self.now += 3600
+        self.assertEqual(self.store.levels('newsapi', limits), {'per_minute': 2.0})
+
+    def test_short_bucket_blocks_and_takes_from_none(self):
+        limits = {'per_second': 5.0, 'per_day': 1.0}
+        self.assertEqual(self.store.take('nominatim', limits), 0.0)
+        self.assertAlmostEqual(self.store.take('nominatim', limits), 86400.0)
+        self.assertAlmostEqual(self.store.levels('nominatim', limits)['per_second'], 4.0)
+
+    def test_workers_draw_from_one_budget(self):
+        limits = {'per_hour': 1.0}
+        self.assertEqual(self.store.take('waqi', limits), 0.0)
+        self.assertAlmostEqual(QuotaStore(self.path).take('waqi', limits), 3600.0)
+
+    def test_drain_empties_every_bucket(self):
+        limits = {'per_minute': 60.0}
+        self.store.drain('weatherapi', limits)
+        self.assertAlmostEqual(self.store.take('weatherapi', limits), 1.0)
+
+
+class TestProviderQuota(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = QuotaStore(os.path.join(directory.name, 'quota.sqlite3'))
+
+    def test_acquire_raises_when_wait_exceeds_max_wait(self):
+        quota = ProviderQuota(self.store, 'newsapi', {'per_day': 1, 'per_hour': 0}, max_wait=1.0)
+        self.assertEqual(quota.limits, {'per_day': 1.0})
+        quota.acquire()
+        with self.assertRaises(QuotaExceededError):
+            quota.acquire()
+        self.assertEqual((quota.granted, quota.rejected), (1, 1))
+
+    def test_acquire_waits_for_a_token_within_max_wait(self):
+        quota = ProviderQuota(self.store, 'nominatim', {'per_second': 1}, max_wait=2.0)
+        quota.acquire()
+        with mock.patch('quota.time.sleep') as sleep, \
+                mock.patch.object(self.store, 'take', side_effect=[0.5, 0.0]):
+            quota.acquire()
+        sleep.assert_called_once_with(0.5)
+        self.assertEqual(quota.waited, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import axios from 'axios';
 import './App.css';
 import SearchBar from './components/SearchBar';
@@ -15,6 +15,32 @@ function App() {
   const [error, setError] = useState(null);
 
   const API_BASE_URL = process.env.REACT_APP_API_BASE_URL || 'http://localhost:5001';
+  // Each open stream holds a connection on the backend, so live updates are opt-in
+  const LIVE_UPDATES = process.env.REACT_APP_LIVE_UPDATES === 'true';
+
+  // Keep the AQI on screen current with changes pushed by the backend
+  const liveLocation = pollutionData?.location;
+  useEffect(() => {
+    if (!LIVE_UPDATES || !liveLocation || typeof EventSource === 'undefined') {
+      return undefined;
+    }
+    const source = new EventSource(
+      `${API_BASE_URL}/api/pollution-stream?location=${encodeURIComponent(liveLocation)}`
+    );
+    source.addEventListener('update', (event) => {
+      const update = JSON.parse(event.data);
+      setPollutionData((current) => (
+        current && current.location.trim() === update.location
+          ? {
+              ...current,
+              aqi_data: { ...current.aqi_data, ...update.changes },
+              aqi_level: update.aqi_level || current.aqi_level,
+            }
+          : current
+      ));
+    });
+    return () => source.close();
+  }, [API_BASE_URL, LIVE_UPDATES, liveLocation]);
 
   const handleSearch = async (location) => {
     if (!location.trim()) {
@@ -69,7 +95,11 @@ function App() {
               <AQIDisplay data={pollutionData} />
               <PollutionSources sources={pollutionData.pollution_sources} />
               {pollutionData.aqi_level && (
-                <HealthTips aqiLevel={pollutionData.aqi_level} />
+                <HealthTips
+                  aqiLevel={pollutionData.aqi_level}
+                  aqiStandard={pollutionData.aqi_data.aqi_standard}
+                  pollutant={pollutionData.aqi_data.dominant_pollutant}
+                />
               )}
             </div>
 
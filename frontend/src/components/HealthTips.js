@@ -2,25 +2,33 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import './HealthTips.css';
 
-function HealthTips({ aqiLevel }) {
+function HealthTips({ aqiLevel, aqiStandard, pollutant }) {
   const [tips, setTips] = useState([]);
+  const [advice, setAdvice] = useState(null);
   const API_BASE_URL = process.env.REACT_APP_API_BASE_URL || 'http://localhost:5000';
 
   useEffect(() => {
     const fetchTips = async () => {
       try {
         const response = await axios.get(`${API_BASE_URL}/api/health-tips`, {
-          params: { aqi_level: aqiLevel }
+          params: {
+            aqi_level: aqiLevel,
+            aqi_standard: aqiStandard,
+            pollutant: pollutant,
+            locale: navigator.language
+          }
         });
         setTips(response.data.health_tips);
+        setAdvice(response.data.pollutant_advice || null);
       } catch (error) {
         console.error('Error fetching health tips:', error);
         setTips([]);
+        setAdvice(null);
       }
     };
 
     fetchTips();
-  }, [aqiLevel, API_BASE_URL]);
+  }, [aqiLevel, aqiStandard, pollutant, API_BASE_URL]);
 
   return (
     <div className="health-tips">
@@ -32,6 +40,12 @@ function HealthTips({ aqiLevel }) {
             <p>{tip}</p>
           </div>
         ))}
+        {advice && (
+          <div className="tip-item">
+            <span className="tip-icon">!</span>
+            <p>{advice}</p>
+          </div>
+        )}
       </div>
     </div>
   );